@@ -0,0 +1,56 @@
+'''
+Pull requests archive.
+
+Revision ID: 5778c0b92876
+Revises: 4b97ff694bc5
+Create Date: 2026-10-18 20:04:07.488115
+
+'''
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5778c0b92876'
+down_revision: str | Sequence[str] | None = '4b97ff694bc5'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    '''Upgrade schema.'''
+    op.create_table('pull_requests_archive',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('author_id', sa.String(), nullable=False),
+    sa.Column('status', sa.String(length=6), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('merged_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['author_id'], ['users.user_id']),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_pull_requests_archive_author_id', 'pull_requests_archive', ['author_id'], unique=False)
+    op.create_table('pr_reviewers_archive',
+    sa.Column('pr_id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.ForeignKeyConstraint(['pr_id'], ['pull_requests_archive.id']),
+    sa.ForeignKeyConstraint(['user_id'], ['users.user_id']),
+    sa.PrimaryKeyConstraint('pr_id', 'user_id')
+    )
+    op.create_index('ix_pr_reviewers_archive_user_id_pr_id', 'pr_reviewers_archive', ['user_id', 'pr_id'], unique=False)
+    op.create_index(
+        'ix_pull_requests_merged_at', 'pull_requests', ['merged_at'],
+        unique=False, postgresql_where=sa.text("status = 'MERGED'"),
+    )
+
+
+def downgrade() -> None:
+    '''Downgrade schema.'''
+    op.drop_index('ix_pull_requests_merged_at', table_name='pull_requests', postgresql_where=sa.text("status = 'MERGED'"))
+    op.drop_index('ix_pr_reviewers_archive_user_id_pr_id', table_name='pr_reviewers_archive')
+    op.drop_table('pr_reviewers_archive')
+    op.drop_index('ix_pull_requests_archive_author_id', table_name='pull_requests_archive')
+    op.drop_table('pull_requests_archive')
@@ -0,0 +1,48 @@
+'''
+Lookup indexes.
+
+Revision ID: 5b2f9d1c7e43
+Revises: 3cc06476a787
+Create Date: 2026-10-18 12:10:31.482117
+
+'''
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b2f9d1c7e43'
+down_revision: str | Sequence[str] | None = '3cc06476a787'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    '''Upgrade schema.'''
+    # Indexes are built CONCURRENTLY so the hot tables stay writable during the migration.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_pr_reviewers_user_id_pr_id', 'pr_reviewers', ['user_id', 'pr_id'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            'ix_pull_requests_author_id', 'pull_requests', ['author_id'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index('ix_users_team_name', 'users', ['team_name'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index(
+            'ix_users_team_name_active', 'users', ['team_name', 'user_id'],
+            unique=False, postgresql_where=sa.text('is_active'), postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    '''Downgrade schema.'''
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_users_team_name_active', table_name='users', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_users_team_name', table_name='users', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_pull_requests_author_id', table_name='pull_requests', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_pr_reviewers_user_id_pr_id', table_name='pr_reviewers', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,57 @@
+'''
+Reviewer assigned at.
+
+Revision ID: 8c5e2f7a9d31
+Revises: e3a1c6f08d24
+Create Date: 2026-10-19 01:04:38.517290
+
+'''
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c5e2f7a9d31'
+down_revision: str | Sequence[str] | None = 'e3a1c6f08d24'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    '''Upgrade schema.'''
+    for table in ('pr_reviewers', 'pr_reviewers_archive'):
+        op.add_column(table, sa.Column('assigned_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False))
+    # The real assignment time of existing rows is unknown; most reviewers are assigned when the PR is created.
+    op.execute('''
+        UPDATE pr_reviewers AS r SET assigned_at = p.created_at
+        FROM pull_requests AS p
+        WHERE p.id = r.pr_id
+    ''')
+    op.execute('''
+        UPDATE pr_reviewers_archive AS r SET assigned_at = p.created_at
+        FROM pull_requests_archive AS p
+        WHERE p.id = r.pr_id
+    ''')
+    # Recompute from the new column, the definition that ReviewStatsRepository.rebuild uses.
+    op.execute('''
+        UPDATE user_review_stats AS s SET last_assigned_at = reviews.last_assigned_at
+        FROM (
+            SELECT user_id, max(assigned_at) AS last_assigned_at
+            FROM (
+                SELECT user_id, assigned_at FROM pr_reviewers
+                UNION ALL
+                SELECT user_id, assigned_at FROM pr_reviewers_archive
+            ) AS assignments
+            GROUP BY user_id
+        ) AS reviews
+        WHERE reviews.user_id = s.user_id
+    ''')
+
+
+def downgrade() -> None:
+    '''Downgrade schema.'''
+    op.drop_column('pr_reviewers_archive', 'assigned_at')
+    op.drop_column('pr_reviewers', 'assigned_at')
@@ -0,0 +1,67 @@
+'''
+Review stats.
+
+Revision ID: 9e4a7c2b1d58
+Revises: 5b2f9d1c7e43
+Create Date: 2026-10-18 14:02:17.903561
+
+'''
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e4a7c2b1d58'
+down_revision: str | Sequence[str] | None = '5b2f9d1c7e43'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    '''Upgrade schema.'''
+    op.create_table('team_review_stats',
+    sa.Column('team_name', sa.String(), nullable=False),
+    sa.Column('assigned_count', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.Column('open_count', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.Column('merged_count', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.ForeignKeyConstraint(['team_name'], ['teams.name']),
+    sa.PrimaryKeyConstraint('team_name')
+    )
+    op.create_table('user_review_stats',
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('assigned_count', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.Column('open_count', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.Column('merged_count', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.Column('last_assigned_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.user_id']),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    # Backfill from the existing assignments; afterwards the service layer keeps the counters up to date.
+    op.execute('''
+        INSERT INTO user_review_stats (user_id, assigned_count, open_count, merged_count, last_assigned_at)
+        SELECT
+            r.user_id,
+            count(*),
+            count(*) FILTER (WHERE p.status = 'OPEN'),
+            count(*) FILTER (WHERE p.status = 'MERGED'),
+            max(p.created_at)
+        FROM pr_reviewers AS r
+        JOIN pull_requests AS p ON p.id = r.pr_id
+        GROUP BY r.user_id
+    ''')
+    op.execute('''
+        INSERT INTO team_review_stats (team_name, assigned_count, open_count, merged_count)
+        SELECT u.team_name, sum(s.assigned_count), sum(s.open_count), sum(s.merged_count)
+        FROM user_review_stats AS s
+        JOIN users AS u ON u.user_id = s.user_id
+        GROUP BY u.team_name
+    ''')
+
+
+def downgrade() -> None:
+    '''Downgrade schema.'''
+    op.drop_table('user_review_stats')
+    op.drop_table('team_review_stats')
@@ -0,0 +1,30 @@
+'''
+Pull request version.
+
+Revision ID: bb76aee04ff7
+Revises: 5778c0b92876
+Create Date: 2026-10-18 20:21:13.836604
+
+'''
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bb76aee04ff7'
+down_revision: str | Sequence[str] | None = '5778c0b92876'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    '''Upgrade schema.'''
+    op.add_column('pull_requests', sa.Column('version', sa.Integer(), server_default=sa.text('1'), nullable=False))
+
+
+def downgrade() -> None:
+    '''Downgrade schema.'''
+    op.drop_column('pull_requests', 'version')
@@ -0,0 +1,38 @@
+'''
+Resource versions.
+
+Revision ID: c41d8e0a6f27
+Revises: 9e4a7c2b1d58
+Create Date: 2026-10-18 20:05:42.118305
+
+'''
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41d8e0a6f27'
+down_revision: str | Sequence[str] | None = '9e4a7c2b1d58'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    '''Upgrade schema.'''
+    op.create_table('resource_versions',
+    sa.Column('kind', sa.String(), nullable=False),
+    sa.Column('key', sa.String(), nullable=False),
+    sa.Column('version', sa.BigInteger(), server_default=sa.text('0'), nullable=False),
+    sa.PrimaryKeyConstraint('kind', 'key')
+    )
+    # Existing teams start at 1, so version 0 always means a team that does not exist (yet).
+    # Review queues need no backfill: a missing row is version 0 and gets a row on the first change.
+    op.execute("INSERT INTO resource_versions (kind, key, version) SELECT 'team', name, 1 FROM teams")
+
+
+def downgrade() -> None:
+    '''Downgrade schema.'''
+    op.drop_table('resource_versions')
@@ -0,0 +1,34 @@
+'''
+Outbox claim index.
+
+Revision ID: e3a1c6f08d24
+Revises: bb76aee04ff7
+Create Date: 2026-10-18 23:12:47.301845
+
+'''
+from collections.abc import Sequence
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3a1c6f08d24'
+down_revision: str | Sequence[str] | None = 'bb76aee04ff7'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    '''Upgrade schema.'''
+    # Dispatchers claim ready events (available_at <= now()) in id order; built CONCURRENTLY so writers are not blocked.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_outbox_events_available_at_id', 'outbox_events', ['available_at', 'id'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    '''Downgrade schema.'''
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_outbox_events_available_at_id', table_name='outbox_events', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,94 @@
+'''
+Замер массовой деактивации с переназначением открытых ревью.
+
+Скрипт берет набор данных `scripts.explain_queries` (и засевает его, если база
+пустая), выбирает по два пользователя из `--teams` команд и прогоняет
+`UserService.deactivate_users` в транзакции, которая затем откатывается, так
+что данные между раундами не меняются. Печатается медиана полного времени
+вызова и времени в SQL. Если медиана больше `--budget-ms`, скрипт
+завершается с кодом 1.
+
+    EXPLAIN_DATABASE_URL=postgresql+asyncpg://... python -m scripts.bench_deactivation
+'''
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from scripts.explain_queries import Dataset, seed
+from src.db.query_stats import instrument_engine, track_queries
+from src.services.users import UserService
+
+
+DEACTIVATION_BUDGET_MS = 100.0
+WARMUP_ROUNDS = 2
+
+
+def pick_users(data: Dataset, teams: int, round_: int) -> list[str]:
+    '''По два пользователя из каждой из `teams` команд, в каждом раунде другие.'''
+    first = 2 * round_ % (data.members_per_team - 1)
+    return [
+        f'user-{team * data.members_per_team + member + 1}'
+        for team in range(teams)
+        for member in (first, first + 1)
+    ]
+
+
+async def deactivate_once(engine: AsyncEngine, user_ids: list[str]) -> tuple[float, float, int]:
+    '''Полное время, время в SQL и число снятых ревью; commit сервиса фиксирует только SAVEPOINT.'''
+    async with engine.connect() as connection:
+        transaction = await connection.begin()
+        db = AsyncSession(bind=connection, join_transaction_mode='create_savepoint', expire_on_commit=False)
+        try:
+            with track_queries(reset=True) as stats:
+                started = time.perf_counter()
+                result = await UserService(db).deactivate_users(user_ids)
+                elapsed = time.perf_counter() - started
+        finally:
+            await db.close()
+            await transaction.rollback()
+    return elapsed, stats.sql_time, len(result.released)
+
+
+async def main(args: argparse.Namespace) -> int:
+    url = os.getenv('EXPLAIN_DATABASE_URL')
+    if not url:
+        print('EXPLAIN_DATABASE_URL is not set. Point it at a scratch database with migrations applied.')
+        return 2
+
+    data = Dataset()
+    engine = create_async_engine(url)
+    instrument_engine(engine)
+    try:
+        await seed(async_sessionmaker(engine, expire_on_commit=False), data)
+
+        samples = []
+        for round_ in range(WARMUP_ROUNDS + args.rounds):
+            sample = await deactivate_once(engine, pick_users(data, args.teams, round_))
+            if round_ >= WARMUP_ROUNDS:
+                samples.append(sample)
+    finally:
+        await engine.dispose()
+
+    total = statistics.median(elapsed for elapsed, _, _ in samples) * 1000
+    sql = statistics.median(sql_time for _, sql_time, _ in samples) * 1000
+    released = statistics.median(count for _, _, count in samples)
+    print(f'Deactivating {2 * args.teams} users, {released:.0f} open reviews reassigned (median of {args.rounds} rounds):')
+    print(f'    total {total:.1f} ms, SQL {sql:.1f} ms, Python {total - sql:.1f} ms; budget {args.budget_ms:.0f} ms')
+    if total > args.budget_ms:
+        print(f'[FAIL] over budget by {total - args.budget_ms:.1f} ms')
+        return 1
+    print('[ok] within budget')
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--teams', type=int, default=100, help='teams to take two users from')
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=DEACTIVATION_BUDGET_MS)
+    sys.exit(asyncio.run(main(parser.parse_args())))
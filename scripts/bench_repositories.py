@@ -0,0 +1,145 @@
+'''
+Микробенчмарк накладных расходов на построение запросов в репозиториях.
+
+Для каждого запроса сервисов сравнивается прежний вызов (новый select/update/
+insert на каждый вызов, IN со списком, диалектный insert, который SQLAlchemy
+не кеширует) с шаблоном из `BaseRepository._statements`. Печатается время
+вызова без учета времени в Postgres, то есть то, что тратит Python на
+построение, ключ кеша и компиляцию, и число разных текстов SQL: столько
+prepared statements asyncpg держит на каждом соединении. Все изменения
+откатываются.
+
+    DATABASE_URL=postgresql+asyncpg://... python -m scripts.bench_repositories --repeat 2000
+'''
+import argparse
+import asyncio
+import itertools
+import statistics
+import sys
+import time
+from collections.abc import Awaitable, Callable
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from src.config import DATABASE
+from src.db.database import init_db
+from src.db.models import PullRequest, Team, User
+from src.db.query_stats import track_queries
+from src.db.repositories.pull_requests import PullRequestRepository
+from src.db.repositories.teams import TeamRepository
+from src.db.repositories.users import UserRepository
+
+
+Call = Callable[[AsyncSession, int], Awaitable[object]]
+
+
+async def legacy_get_pull_request(db: AsyncSession, pr_id: str) -> PullRequest | None:
+    stmt = select(PullRequest).where(PullRequest.id == pr_id).options(joinedload(PullRequest.assigned_reviewers))
+    result = await db.execute(stmt)
+    return result.unique().scalar_one_or_none()
+
+
+async def legacy_list_users(db: AsyncSession, user_ids: list[str]) -> list[User]:
+    result = await db.execute(select(User).where(User.user_id.in_(user_ids)))
+    return list(result.scalars().all())
+
+
+async def legacy_get_user(db: AsyncSession, user_id: str) -> User | None:
+    result = await db.execute(select(User).where(User.user_id == user_id))
+    return result.scalar_one_or_none()
+
+
+async def legacy_set_is_active(db: AsyncSession, user_id: str, is_active: bool) -> User:
+    result = await db.execute(update(User).where(User.user_id == user_id).values(is_active=is_active).returning(User))
+    return result.scalar_one()
+
+
+async def legacy_create_team(db: AsyncSession, name: str) -> Team:
+    result = await db.execute(postgresql.insert(Team).values(name=name).returning(Team))
+    return result.scalar_one()
+
+
+def make_cases(pr_id: str, user_ids: list[str]) -> dict[str, tuple[Call, Call]]:
+    def some_users(i: int) -> list[str]:
+        # A varying number of ids: with IN every length is a different SQL text.
+        return user_ids[:1 + i % len(user_ids)]
+
+    return {
+        'pull request + reviewers': (
+            lambda db, _i: legacy_get_pull_request(db, pr_id),
+            lambda db, _i: PullRequestRepository(db).get_by(id=pr_id, join_=[PullRequest.assigned_reviewers]),
+        ),
+        'users by ids': (
+            lambda db, i: legacy_list_users(db, some_users(i)),
+            lambda db, i: UserRepository(db).list_in('user_id', some_users(i)),
+        ),
+        'user by id': (
+            lambda db, i: legacy_get_user(db, user_ids[i % len(user_ids)]),
+            lambda db, i: UserRepository(db).get_by(user_id=user_ids[i % len(user_ids)]),
+        ),
+        'set is_active': (
+            lambda db, i: legacy_set_is_active(db, user_ids[0], bool(i % 2)),
+            lambda db, i: UserRepository(db).update_one_by({'user_id': user_ids[0]}, is_active=bool(i % 2)),
+        ),
+        'create team': (
+            lambda db, i: legacy_create_team(db, f'bench-legacy-{i}'),
+            lambda db, i: TeamRepository(db).create(name=f'bench-cached-{i}'),
+        ),
+    }
+
+
+async def bench(db: AsyncSession, call: Call, repeat: int, rounds: int) -> tuple[float, int]:
+    '''Медиана по раундам: мкс Python на вызов и число разных текстов SQL, то есть prepared statements.'''
+    calls = itertools.count()
+    await call(db, next(calls))
+
+    samples = []
+    sql_texts = set()
+    for _ in range(rounds):
+        with track_queries() as stats:
+            started = time.perf_counter()
+            for _ in range(repeat):
+                await call(db, next(calls))
+            elapsed = time.perf_counter() - started
+        samples.append((elapsed - stats.sql_time) / repeat)
+        sql_texts.update(stats.statements)
+        db.expunge_all()
+    return statistics.median(samples) * 1e6, len(sql_texts)
+
+
+async def main(args: argparse.Namespace) -> int:
+    if DATABASE.url is None:
+        print('DATABASE_URL is not set.')
+        return 2
+
+    session_factory, engine = await init_db()
+    try:
+        async with session_factory() as db:
+            pr_id = await db.scalar(select(PullRequest.id).join(PullRequest.assigned_reviewers).limit(1))
+            user_ids = list(await db.scalars(select(User.user_id).order_by(User.user_id).limit(5)))
+            if pr_id is None or not user_ids:
+                print('The database has no pull requests with reviewers; run a load test or seed it first.')
+                return 2
+
+            print(f'{"query":<26}{"legacy us":>11}{"cached us":>11}{"saved":>8}{"prepared":>12}')
+            for name, (legacy, cached) in make_cases(pr_id, user_ids).items():
+                legacy_time, legacy_prepared = await bench(db, legacy, args.repeat, args.rounds)
+                cached_time, cached_prepared = await bench(db, cached, args.repeat, args.rounds)
+                print(
+                    f'{name:<26}{legacy_time:>11.1f}{cached_time:>11.1f}'
+                    f'{1 - cached_time / legacy_time:>8.0%}{f"{legacy_prepared} -> {cached_prepared}":>12}'
+                )
+            await db.rollback()
+    finally:
+        await engine.dispose()
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=500, help='calls per round')
+    parser.add_argument('--rounds', type=int, default=5)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,172 @@
+'''
+Микробенчмарк сериализации больших ответов API.
+
+Сравнивает прежний путь FastAPI (модель на каждую строку, ctime() в
+field_serializer, повторная валидация возвращенной модели, dict и стандартный
+json) с тем, что делают эндпоинты сейчас: заранее построенные TypeAdapter и
+ORJSONResponse. Заодно проверяет, что оба пути дают одинаковые байты. База
+данных не нужна.
+
+    python -m scripts.bench_serialization --rows 1000
+'''
+import argparse
+import sys
+import time
+from collections.abc import Callable
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from pydantic import BaseModel, TypeAdapter, field_serializer
+from starlette.responses import JSONResponse
+
+from src.api.pull_requests import _pull_requests
+from src.api.responses import ORJSONResponse
+from src.api.teams import _team
+from src.api.users import _short_pull_requests
+from src.schemas.pull_requests import PullRequestBulkCreateError, PullRequestShortSchema
+from src.schemas.teams import TeamMemberSchema, TeamSchema
+from src.schemas.users import UserGetReviewResponse
+
+
+class LegacyPullRequest(PullRequestShortSchema):
+    assigned_reviewers: list[str]
+    created_at: datetime | None = None
+    merged_at: datetime | None = None
+
+    @field_serializer('created_at')
+    def serialize_created_at(self, created_at: datetime | None) -> str | None:
+        return created_at.ctime() if created_at else None
+
+    @field_serializer('merged_at')
+    def serialize_merged_at(self, merged_at: datetime | None) -> str | None:
+        return merged_at.ctime() if merged_at else None
+
+
+class LegacyBulkCreateResponse(BaseModel):
+    created: list[LegacyPullRequest]
+    errors: list[PullRequestBulkCreateError]
+
+
+LEGACY_ADAPTERS = {model: TypeAdapter(model) for model in (LegacyBulkCreateResponse, TeamSchema, UserGetReviewResponse)}
+
+
+def fastapi_render(value: BaseModel) -> bytes:
+    '''То, что FastAPI делает с возвращенной моделью при response_model.'''
+    adapter = LEGACY_ADAPTERS[type(value)]
+    return JSONResponse(adapter.dump_python(adapter.validate_python(value), mode='json')).body
+
+
+def bench(fn: Callable[[], bytes], repeat: int) -> tuple[float, bytes]:
+    body = fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat, body
+
+
+def pull_requests_case(rows: int) -> tuple[Callable[[], bytes], Callable[[], bytes]]:
+    created_at = datetime(2025, 10, 24, 12, 0, tzinfo=timezone.utc)
+    prs = [
+        SimpleNamespace(
+            id=f'pr-{i}',
+            name=f'Pull request №{i}',
+            author_id=f'user-{i % 50}',
+            status='MERGED' if i % 3 else 'OPEN',
+            created_at=created_at + timedelta(seconds=i),
+            merged_at=created_at + timedelta(hours=1, seconds=i) if i % 3 else None,
+        )
+        for i in range(rows)
+    ]
+    reviewers = [[f'user-{(i + 1) % 50}', f'user-{(i + 2) % 50}'] for i in range(rows)]
+
+    def legacy() -> bytes:
+        return fastapi_render(LegacyBulkCreateResponse(
+            created=[
+                LegacyPullRequest(
+                    pull_request_id=pr.id,
+                    pull_request_name=pr.name,
+                    author_id=pr.author_id,
+                    assigned_reviewers=reviewer_ids,
+                    status=pr.status,
+                    created_at=pr.created_at,
+                    merged_at=pr.merged_at
+                )
+                for pr, reviewer_ids in zip(prs, reviewers, strict=True)
+            ],
+            errors=[]
+        ))
+
+    def current() -> bytes:
+        return ORJSONResponse({'created': _pull_requests(prs, reviewers), 'errors': []}).body
+
+    return legacy, current
+
+
+def team_case(rows: int) -> tuple[Callable[[], bytes], Callable[[], bytes]]:
+    team = SimpleNamespace(
+        name='team-1',
+        members=[SimpleNamespace(user_id=f'user-{i}', username=f'Пользователь {i}', is_active=i % 7 != 0) for i in range(rows)],
+    )
+
+    def legacy() -> bytes:
+        return fastapi_render(TeamSchema(
+            name=team.name,
+            members=[TeamMemberSchema.model_validate(member) for member in team.members]
+        ))
+
+    def current() -> bytes:
+        return ORJSONResponse(_team(team)).body
+
+    return legacy, current
+
+
+def review_page_case(rows: int) -> tuple[Callable[[], bytes], Callable[[], bytes]]:
+    page = [
+        SimpleNamespace(id=f'pr-{i}', name=f'PR {i}', author_id=f'user-{i % 50}', status='OPEN')
+        for i in range(rows)
+    ]
+
+    def legacy() -> bytes:
+        return fastapi_render(UserGetReviewResponse(
+            user_id='user-1',
+            pull_requests=[
+                PullRequestShortSchema(pull_request_id=row.id, pull_request_name=row.name, author_id=row.author_id, status=row.status)
+                for row in page
+            ],
+            next_cursor='cursor'
+        ))
+
+    def current() -> bytes:
+        return ORJSONResponse({'user_id': 'user-1', 'pull_requests': _short_pull_requests(page), 'next_cursor': 'cursor'}).body
+
+    return legacy, current
+
+
+CASES = {
+    'pullRequests/bulkCreate': pull_requests_case,
+    'teams/get': team_case,
+    'users/getReview': review_page_case,
+}
+
+
+def main(args: argparse.Namespace) -> int:
+    print(f'{"response":<26}{"legacy ms":>12}{"current ms":>12}{"speedup":>10}')
+    mismatches = []
+    for name, make_case in CASES.items():
+        legacy, current = make_case(args.rows)
+        legacy_time, legacy_body = bench(legacy, args.repeat)
+        current_time, current_body = bench(current, args.repeat)
+        if legacy_body != current_body:
+            mismatches.append(name)
+        print(f'{name:<26}{legacy_time * 1000:>12.2f}{current_time * 1000:>12.2f}{legacy_time / current_time:>9.1f}x')
+
+    for name in mismatches:
+        print(f'{name}: serialized bodies differ')
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=50)
+    sys.exit(main(parser.parse_args()))
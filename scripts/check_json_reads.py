@@ -0,0 +1,155 @@
+'''
+Контрактная проверка чтений, которые собирает Postgres (SQL_JSON_READS).
+
+Для каждой проверяемой команды и пользователя скрипт строит ответ двумя
+путями - через ORM и Pydantic и через JSON из `JsonReadRepository` - и
+сравнивает разобранный JSON, включая курсоры всех страниц. Перед проверкой
+в транзакцию добавляются граничные случаи (пустая команда, кавычки и не-ASCII
+в именах, одинаковые created_at, ровно целое число страниц); в конце
+транзакция откатывается, так что базу можно брать любую с примененными
+миграциями. При расхождениях скрипт печатает их и завершается с кодом 1.
+
+    DATABASE_URL=postgresql+asyncpg://... python -m scripts.check_json_reads
+'''
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+from datetime import datetime, timezone
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from src.config import DATABASE
+from src.db.models import Team, User, pr_reviewers
+from src.schemas.pull_requests import PullRequestShortSchema
+from src.schemas.teams import TeamSchema
+from src.schemas.users import UserGetReviewResponse
+from src.services.teams import TeamService
+from src.services.users import UserService
+
+
+FIXTURE_PREFIX = 'json-contract-'
+FIXTURE_SQL = '''
+INSERT INTO teams (name) VALUES (:empty_team), (:team);
+
+INSERT INTO users (user_id, username, is_active, team_name) VALUES
+    (:prefix || 'author', 'Автор "кавычки" \\ и слеш', true, :team),
+    (:prefix || 'reviewer', 'Ревьювер ✓', false, :team);
+
+INSERT INTO pull_requests (id, name, author_id, status, created_at)
+SELECT :prefix || 'pr-' || p, 'PR «' || p || '»', :prefix || 'author',
+       CASE WHEN p % 3 = 0 THEN 'MERGED' ELSE 'OPEN' END, :created_at
+FROM generate_series(1, :pull_requests) AS p;
+
+INSERT INTO pr_reviewers (pr_id, user_id)
+SELECT :prefix || 'pr-' || p, :prefix || 'reviewer'
+FROM generate_series(1, :pull_requests) AS p
+'''
+
+
+def _sorted_members(team: dict) -> dict:
+    return {**team, 'members': sorted(team['members'], key=lambda member: member['user_id'])}
+
+
+async def add_fixtures(db: AsyncSession, page_size: int) -> None:
+    params = {
+        'prefix': FIXTURE_PREFIX,
+        'empty_team': f'{FIXTURE_PREFIX}empty',
+        'team': f'{FIXTURE_PREFIX}команда "{{}}"',
+        # All on the same timestamp, so pages are split only by the id tie-breaker.
+        'created_at': datetime(2020, 1, 1, tzinfo=timezone.utc),
+        'pull_requests': page_size * 2,
+    }
+    for statement in FIXTURE_SQL.split(';'):
+        await db.execute(text(statement), params)
+
+
+async def check_team(db: AsyncSession, team_name: str) -> list[str]:
+    service = TeamService(db)
+    team = await service.get_team_with_members(team_name)
+    body = await service.get_team_json(team_name)
+    if team is None or body is None:
+        return [] if team is None and body is None else [f'team {team_name!r}: found by only one path']
+
+    expected = _sorted_members(TeamSchema.model_validate(team).model_dump(mode='json'))
+    actual = json.loads(body)
+    if actual != expected:
+        return [f'team {team_name!r}:\n    orm:  {expected}\n    json: {actual}']
+    return []
+
+
+async def check_reviews(db: AsyncSession, user_id: str, page_size: int) -> list[str]:
+    service = UserService(db)
+    cursor = None
+    problems = []
+    for page_number in itertools.count(1):
+        page = await service.get_user_pull_requests_to_review(user_id, page_size, cursor)
+        expected = UserGetReviewResponse(
+            user_id=user_id,
+            pull_requests=[
+                PullRequestShortSchema(
+                    pull_request_id=row.id,
+                    pull_request_name=row.name,
+                    author_id=row.author_id,
+                    status=row.status
+                )
+                for row in page.pull_requests
+            ],
+            next_cursor=page.next_cursor
+        ).model_dump(mode='json')
+        actual = json.loads(await service.get_user_pull_requests_to_review_json(user_id, page_size, cursor))
+        if actual != expected:
+            problems.append(f'reviews of {user_id!r}, page {page_number}:\n    orm:  {expected}\n    json: {actual}')
+            break
+
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+    return problems
+
+
+async def main(args: argparse.Namespace) -> int:
+    if DATABASE.url is None:
+        print('DATABASE_URL is not set.')
+        return 2
+
+    engine = create_async_engine(DATABASE.url)
+    try:
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            await add_fixtures(db, args.page_size)
+            team_names = list(await db.scalars(
+                select(Team.name).where(Team.name.startswith(FIXTURE_PREFIX)).union_all(
+                    select(Team.name).order_by(Team.name).limit(args.sample)
+                )
+            ))
+            user_ids = list(await db.scalars(
+                select(User.user_id).where(User.user_id.startswith(FIXTURE_PREFIX)).union_all(
+                    select(pr_reviewers.c.user_id)
+                    .group_by(pr_reviewers.c.user_id)
+                    .order_by(text('count(*) DESC'))
+                    .limit(args.sample)
+                )
+            ))
+
+            problems = await check_team(db, f'{FIXTURE_PREFIX}missing')
+            for team_name in team_names:
+                problems += await check_team(db, team_name)
+            for user_id in [*user_ids, f'{FIXTURE_PREFIX}missing']:
+                problems += await check_reviews(db, user_id, args.page_size)
+            await db.rollback()
+    finally:
+        await engine.dispose()
+
+    print(f'Checked {len(team_names) + 1} teams and {len(user_ids) + 1} review lists')
+    for problem in problems:
+        print(problem)
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sample', type=int, default=20, help='number of existing teams and reviewers to check')
+    parser.add_argument('--page-size', type=int, default=7)
+    sys.exit(asyncio.run(main(parser.parse_args())))
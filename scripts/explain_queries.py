@@ -0,0 +1,467 @@
+'''
+Регрессионная проверка планов запросов репозиториев.
+
+Скрипт засевает отдельную базу (EXPLAIN_DATABASE_URL, с примененными
+миграциями) большим синтетическим набором данных, прогоняет каждый сценарий
+репозиториев в транзакции с откатом, перехватывает все выполненные запросы и
+делает для них EXPLAIN с теми же параметрами. Если хотя бы в одном плане есть
+Seq Scan по таблицам приложения, скрипт печатает отчет и завершается с кодом 1.
+
+    EXPLAIN_DATABASE_URL=postgresql+asyncpg://... python -m scripts.explain_queries
+'''
+import argparse
+import asyncio
+import json
+import os
+import sys
+import textwrap
+from collections.abc import Awaitable, Callable, Iterator
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from src.db.models import PullRequest, Team
+from src.db.repositories.export import EXPORT_KEYS, ExportRepository
+from src.db.repositories.json_reads import REVIEWS_FIRST_PAGE_SQL, REVIEWS_NEXT_PAGE_SQL, TEAM_JSON_SQL
+from src.db.repositories.outbox import OutboxRepository
+from src.db.repositories.pull_requests import PullRequestRepository
+from src.db.repositories.stats import ReviewStatsRepository
+from src.db.repositories.teams import TeamRepository
+from src.db.repositories.users import UserRepository
+from src.db.repositories.versions import ResourceVersionRepository
+from src.services.reviewer_selection import STRATEGIES
+from src.type_defs import ExportDataset, ResourceKind
+
+
+APP_TABLES = {
+    'teams',
+    'users',
+    'pull_requests',
+    'pr_reviewers',
+    'pull_requests_archive',
+    'pr_reviewers_archive',
+    'user_review_stats',
+    'team_review_stats',
+    'resource_versions',
+    'outbox_events',
+}
+# A table that fits in a few pages is legitimately cheaper to scan than to probe through an index.
+MIN_TABLE_PAGES = 16
+SQL_PREVIEW_WIDTH = 400
+
+
+@dataclass
+class Dataset:
+    teams: int = 2000
+    members_per_team: int = 25
+    pull_requests: int = 300_000
+
+    @property
+    def users(self) -> int:
+        return self.teams * self.members_per_team
+
+
+# The archive gets a copy of the merged history shifted a year back, so the hot tables keep the same data as without archiving.
+# The outbox holds a backlog left by a failing sink: one event in a hundred is ready, the rest are postponed.
+SEED_SQL = '''
+INSERT INTO teams (name)
+SELECT 'team-' || t FROM generate_series(1, :teams) AS t;
+
+INSERT INTO users (user_id, username, is_active, team_name)
+SELECT 'user-' || u, 'User ' || u, u % 10 <> 0, 'team-' || ((u - 1) / :members_per_team + 1)
+FROM generate_series(1, :users) AS u;
+
+INSERT INTO pull_requests (id, name, author_id, status, created_at, merged_at)
+SELECT
+    'pr-' || p,
+    'PR ' || p,
+    'user-' || ((p::bigint * 7919) % :users + 1),
+    CASE WHEN p % 4 = 0 THEN 'OPEN' ELSE 'MERGED' END,
+    now() - make_interval(mins => :pull_requests - p),
+    CASE WHEN p % 4 = 0 THEN NULL ELSE now() - make_interval(mins => :pull_requests - p) + interval '30 minutes' END
+FROM generate_series(1, :pull_requests) AS p;
+
+INSERT INTO pr_reviewers (pr_id, user_id)
+SELECT pr.id, reviewer.user_id
+FROM pull_requests AS pr
+JOIN users AS author ON author.user_id = pr.author_id
+CROSS JOIN LATERAL (
+    SELECT u.user_id
+    FROM users AS u
+    WHERE u.team_name = author.team_name AND u.user_id <> author.user_id
+    ORDER BY hashtext(pr.id || u.user_id)
+    LIMIT 2
+) AS reviewer;
+
+INSERT INTO pull_requests_archive (id, name, author_id, status, created_at, merged_at)
+SELECT 'archived-' || id, name, author_id, status, created_at - interval '1 year', merged_at - interval '1 year'
+FROM pull_requests
+WHERE status = 'MERGED';
+
+INSERT INTO pr_reviewers_archive (pr_id, user_id)
+SELECT 'archived-' || r.pr_id, r.user_id
+FROM pr_reviewers AS r
+JOIN pull_requests AS pr ON pr.id = r.pr_id
+WHERE pr.status = 'MERGED';
+
+INSERT INTO resource_versions (kind, key, version)
+SELECT 'team', name, 1 FROM teams
+UNION ALL
+SELECT 'user_reviews', user_id, 1 FROM users;
+
+INSERT INTO outbox_events (event_type, aggregate_id, payload, created_at, available_at, attempts)
+SELECT
+    'pull_request.created',
+    'pr-' || p,
+    jsonb_build_object('pull_request_id', 'pr-' || p),
+    now() - make_interval(mins => :pull_requests - p),
+    CASE WHEN p % 100 = 0 THEN now() - interval '1 minute' ELSE now() + interval '5 minutes' END,
+    CASE WHEN p % 100 = 0 THEN 0 ELSE 3 END
+FROM generate_series(1, :pull_requests) AS p;
+
+ANALYZE;
+'''
+
+
+@dataclass
+class CapturedStatement:
+    sql: str
+    parameters: tuple
+
+
+@dataclass
+class CaseReport:
+    name: str
+    statements: int = 0
+    violations: list[tuple[str, list[str]]] = field(default_factory=list)
+
+
+Case = Callable[[AsyncSession, Dataset], Awaitable[object]]
+CASES: dict[str, Case] = {}
+
+
+def case(name: str) -> Callable[[Case], Case]:
+    def register(fn: Case) -> Case:
+        CASES[name] = fn
+        return fn
+    return register
+
+
+@case('pull_requests.get_by(id) + assigned_reviewers')
+async def _get_pr(db: AsyncSession, _data: Dataset) -> object:
+    return await PullRequestRepository(db).get_by(id='pr-1000', join_=[PullRequest.assigned_reviewers])
+
+
+@case('pull_requests.create_many')
+async def _create_many(db: AsyncSession, _data: Dataset) -> object:
+    return await PullRequestRepository(db).create_many([
+        {'id': f'explain-pr-{i}', 'name': 'explain', 'author_id': f'user-{i}'}
+        for i in range(1, 201)
+    ])
+
+
+@case('pull_requests.create_unless_archived')
+async def _create_unless_archived(db: AsyncSession, _data: Dataset) -> object:
+    return await PullRequestRepository(db).create_unless_archived(id='explain-pr', name='explain', author_id='user-42')
+
+
+@case('pull_requests.is_archived + get_archived')
+async def _get_archived(db: AsyncSession, _data: Dataset) -> object:
+    repo = PullRequestRepository(db)
+    return await repo.is_archived('archived-pr-1001'), await repo.get_archived('archived-pr-1001')
+
+
+@case('pull_requests.archive_merged')
+async def _archive_merged(db: AsyncSession, data: Dataset) -> object:
+    merged_before = datetime.now(timezone.utc) - timedelta(minutes=data.pull_requests // 2)
+    return await PullRequestRepository(db).archive_merged(merged_before, limit=1000)
+
+
+@case('pull_requests.fill_reviewer_slots')
+async def _fill_reviewer_slots(db: AsyncSession, _data: Dataset) -> object:
+    pr_ids = [f'pr-{i}' for i in range(4, 801, 4)]
+    return await PullRequestRepository(db).fill_reviewer_slots(pr_ids, [1] * len(pr_ids), STRATEGIES['least_loaded'])
+
+
+@case('pull_requests.update_if_version + swap_reviewer')
+async def _swap_reviewer(db: AsyncSession, _data: Dataset) -> object:
+    repo = PullRequestRepository(db)
+    pr = await repo.get_by(id='pr-1000', join_=[PullRequest.assigned_reviewers])
+    await repo.update_if_version(pr.id, pr.version)
+    return await repo.swap_reviewer(
+        pr_id=pr.id,
+        author_id=pr.author_id,
+        old_reviewer_id=pr.assigned_reviewers[0].user_id,
+        ordering=STRATEGIES['least_loaded'],
+    )
+
+
+@case('pull_requests.release_open_reviews')
+async def _release_open_reviews(db: AsyncSession, _data: Dataset) -> object:
+    return await PullRequestRepository(db).release_open_reviews([f'user-{i}' for i in range(1, 201)])
+
+
+@case('pull_requests.list_reviews_page')
+async def _list_reviews_page(db: AsyncSession, _data: Dataset) -> object:
+    repo = PullRequestRepository(db)
+    first_page = await repo.list_reviews_page('user-42', limit=50)
+    if not first_page:
+        return first_page
+    return await repo.list_reviews_page('user-42', limit=50, after=(first_page[-1].created_at, first_page[-1].id))
+
+
+@case('users.pick_review_candidates_among')
+async def _pick_review_candidates_among(db: AsyncSession, _data: Dataset) -> object:
+    return [
+        await UserRepository(db).pick_review_candidates_among([f'user-{i}' for i in range(26, 51)], ordering=ordering, limit=2)
+        for ordering in STRATEGIES.values()
+    ]
+
+
+@case('users.team_roster')
+async def _team_roster(db: AsyncSession, _data: Dataset) -> object:
+    return await UserRepository(db).team_roster(UserRepository.team_of('user-42'))
+
+
+@case('users.existing_ids')
+async def _existing_ids(db: AsyncSession, _data: Dataset) -> object:
+    return await UserRepository(db).existing_ids([f'user-{i}' for i in range(1, 201)])
+
+
+@case('users.deactivate(user_ids)')
+async def _deactivate_users(db: AsyncSession, _data: Dataset) -> object:
+    return await UserRepository(db).deactivate([f'user-{i}' for i in range(1, 201)])
+
+
+@case('users.deactivate(team_name)')
+async def _deactivate_team(db: AsyncSession, _data: Dataset) -> object:
+    return await UserRepository(db).deactivate(team_name='team-7')
+
+
+@case('users.list_in(user_id)')
+async def _list_users(db: AsyncSession, _data: Dataset) -> object:
+    return await UserRepository(db).list_in('user_id', ['user-42', 'user-43', 'user-44'])
+
+
+@case('users.update_one_by(user_id)')
+async def _update_user(db: AsyncSession, _data: Dataset) -> object:
+    return await UserRepository(db).update_one_by({'user_id': 'user-42'}, is_active=False)
+
+
+@case('users.set_is_active_many')
+async def _set_is_active_many(db: AsyncSession, _data: Dataset) -> object:
+    return await UserRepository(db).set_is_active_many([(f'user-{i}', i % 2 == 0) for i in range(1, 201)])
+
+
+@case('users.upsert')
+async def _upsert_users(db: AsyncSession, _data: Dataset) -> object:
+    return await UserRepository(db).upsert([
+        {'user_id': f'user-{i}', 'username': f'User {i}', 'is_active': True, 'team_name': 'team-1'}
+        for i in range(1, 51)
+    ])
+
+
+@case('teams.get_by(name) + members')
+async def _get_team(db: AsyncSession, _data: Dataset) -> object:
+    return await TeamRepository(db).get_by(name='team-7', join_=[Team.members])
+
+
+@case('stats.get_user_stats')
+async def _get_user_stats(db: AsyncSession, _data: Dataset) -> object:
+    return await ReviewStatsRepository(db).get_user_stats('user-42')
+
+
+@case('stats.get_team_stats')
+async def _get_team_stats(db: AsyncSession, _data: Dataset) -> object:
+    return await ReviewStatsRepository(db).get_team_stats('team-7')
+
+
+@case('stats.apply_review_changes')
+async def _apply_review_changes(db: AsyncSession, _data: Dataset) -> object:
+    return await ReviewStatsRepository(db).apply_review_changes(
+        assigned=[f'user-{i}' for i in range(1, 201)],
+        unassigned=[f'user-{i}' for i in range(201, 401)],
+        merged=[f'user-{i}' for i in range(401, 601)],
+    )
+
+
+@case('stats.move_users_between_teams')
+async def _move_users_between_teams(db: AsyncSession, _data: Dataset) -> object:
+    return await ReviewStatsRepository(db).move_users_between_teams([
+        (f'user-{i}', 'team-1', 'team-2')
+        for i in range(1, 26)
+    ])
+
+
+@case('users.teams_of')
+async def _teams_of(db: AsyncSession, _data: Dataset) -> object:
+    return await UserRepository(db).teams_of([f'user-{i}' for i in range(1, 201)])
+
+
+@case('versions.get_version')
+async def _get_version(db: AsyncSession, _data: Dataset) -> object:
+    repo = ResourceVersionRepository(db)
+    return await repo.get_version(ResourceKind.TEAM, 'team-7'), await repo.get_version(ResourceKind.USER_REVIEWS, 'user-42')
+
+
+@case('versions.bump')
+async def _bump_versions(db: AsyncSession, _data: Dataset) -> object:
+    return await ResourceVersionRepository(db).bump(
+        teams=[f'team-{i}' for i in range(1, 11)],
+        user_reviews=[f'user-{i}' for i in range(1, 201)],
+    )
+
+
+@case('outbox.claim + postpone + delete')
+async def _dispatch_outbox(db: AsyncSession, _data: Dataset) -> object:
+    repo = OutboxRepository(db)
+    ids = [event.id for event in await repo.claim(100, lease_seconds=30)]
+    await repo.postpone(ids[:50], error='explain')
+    return await repo.delete(ids[50:])
+
+
+@case('export.stream (first and next window)')
+async def _export_stream(db: AsyncSession, _data: Dataset) -> object:
+    repo = ExportRepository(db)
+    windows = []
+    for dataset in ExportDataset:
+        first = [row async for chunk in repo.stream(dataset, limit=1000) for row in chunk]
+        after = tuple(getattr(first[-1], key) for key in EXPORT_KEYS[dataset])
+        windows.append([row async for chunk in repo.stream(dataset, limit=1000, after=after) for row in chunk])
+    return windows
+
+
+# JsonReadRepository talks to asyncpg directly, which bypasses the engine events used for capturing,
+# so its statements are replayed through the engine here.
+@case('json_reads.team')
+async def _team_json(db: AsyncSession, _data: Dataset) -> object:
+    connection = await db.connection()
+    return await connection.exec_driver_sql(TEAM_JSON_SQL, ('team-7',))
+
+
+@case('json_reads.reviews_page')
+async def _reviews_page_json(db: AsyncSession, _data: Dataset) -> object:
+    connection = await db.connection()
+    result = await connection.exec_driver_sql(REVIEWS_FIRST_PAGE_SQL, ('user-42', 50))
+    page = result.one()
+    return await connection.exec_driver_sql(REVIEWS_NEXT_PAGE_SQL, ('user-42', 50, page.last_created_at, page.last_id))
+
+
+def iter_plan_nodes(node: dict) -> Iterator[dict]:
+    yield node
+    for child in node.get('Plans', []):
+        yield from iter_plan_nodes(child)
+
+
+def find_seq_scans(plan: list[dict], tables: set[str]) -> list[str]:
+    return [
+        node['Relation Name']
+        for root in plan
+        for node in iter_plan_nodes(root['Plan'])
+        if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in tables
+    ]
+
+
+async def large_tables(engine: AsyncEngine) -> set[str]:
+    async with engine.connect() as connection:
+        result = await connection.execute(
+            text('SELECT relname FROM pg_class WHERE relname = ANY(:tables) AND relpages >= :min_pages'),
+            {'tables': list(APP_TABLES), 'min_pages': MIN_TABLE_PAGES},
+        )
+        return set(result.scalars().all())
+
+
+async def seed(session_factory: async_sessionmaker, data: Dataset) -> None:
+    async with session_factory() as db:
+        if await db.scalar(text('SELECT count(*) FROM teams')):
+            print('Database is already seeded, reusing existing data')
+            return
+
+        print(f'Seeding {data.teams} teams, {data.users} users, {data.pull_requests} pull requests...')
+        params = {
+            'teams': data.teams,
+            'members_per_team': data.members_per_team,
+            'users': data.users,
+            'pull_requests': data.pull_requests,
+        }
+        for statement in SEED_SQL.split(';'):
+            if statement.strip():
+                await db.execute(text(statement), params)
+        await ReviewStatsRepository(db).rebuild()
+        await db.execute(text('ANALYZE user_review_stats, team_review_stats'))
+        await db.commit()
+
+
+async def explain_case(engine: AsyncEngine, name: str, fn: Case, data: Dataset, tables: set[str]) -> CaseReport:
+    report = CaseReport(name)
+    captured: list[CapturedStatement] = []
+    sync_engine = engine.sync_engine
+
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        connection = await db.connection()
+
+        def capture(_conn: object, _cursor: object, statement: str, parameters: tuple, _context: object, _many: bool) -> None:
+            if not statement.startswith('EXPLAIN'):
+                captured.append(CapturedStatement(statement, parameters))
+
+        event.listen(sync_engine, 'before_cursor_execute', capture)
+        try:
+            await fn(db, data)
+            for statement in captured:
+                result = await connection.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {statement.sql}', statement.parameters)
+                plan = result.scalar_one()
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+
+                report.statements += 1
+                seq_scans = find_seq_scans(plan, tables)
+                if seq_scans:
+                    report.violations.append((statement.sql, seq_scans))
+        finally:
+            event.remove(sync_engine, 'before_cursor_execute', capture)
+            await db.rollback()
+
+    return report
+
+
+async def main(args: argparse.Namespace) -> int:
+    url = os.getenv('EXPLAIN_DATABASE_URL')
+    if not url:
+        print('EXPLAIN_DATABASE_URL is not set. Point it at a scratch database with migrations applied.')
+        return 2
+
+    data = Dataset(teams=args.teams, members_per_team=args.members_per_team, pull_requests=args.pull_requests)
+    engine = create_async_engine(url)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    try:
+        await seed(session_factory, data)
+        tables = await large_tables(engine)
+        print(f'Checking for sequential scans on: {", ".join(sorted(tables))}')
+
+        failed = False
+        for name, fn in CASES.items():
+            if args.only and args.only not in name:
+                continue
+
+            report = await explain_case(engine, name, fn, data, tables)
+            status = 'FAIL' if report.violations else 'ok'
+            print(f'[{status}] {name} ({report.statements} statements)')
+            for sql, seq_scanned in report.violations:
+                failed = True
+                print(f'    Seq Scan on {", ".join(sorted(set(seq_scanned)))}:')
+                print('        ' + textwrap.shorten(sql, width=SQL_PREVIEW_WIDTH))
+    finally:
+        await engine.dispose()
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--teams', type=int, default=Dataset.teams)
+    parser.add_argument('--members-per-team', type=int, default=Dataset.members_per_team)
+    parser.add_argument('--pull-requests', type=int, default=Dataset.pull_requests)
+    parser.add_argument('--only', help='run only cases whose name contains this substring')
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,405 @@
+'''
+Нагрузочный тест HTTP API.
+
+Скрипт засевает через API набор команд, пользователей и PR (с уникальным
+префиксом запуска), затем гоняет выбранный сценарий из N параллельных
+keep-alive соединений и печатает пропускную способность и p50/p95/p99 по
+каждому маршруту. Результаты пишутся в JSON, два таких файла можно сравнить.
+
+    python -m scripts.loadtest run --scenario read-heavy --duration 30 --output results/read.json
+    python -m scripts.loadtest compare results/before.json results/after.json
+
+Приложение и Postgres должны быть уже запущены (например, `docker compose up`).
+'''
+import argparse
+import asyncio
+import json
+import math
+import random
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from http import HTTPStatus
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+import h11
+
+
+PERCENTILES = (50, 95, 99)
+SEED_BATCH_SIZE = 500
+
+
+class ConnectionClosedError(ConnectionResetError):
+    def __init__(self) -> None:
+        super().__init__('Server closed the connection')
+
+
+class SeedError(RuntimeError):
+    def __init__(self, route: str, status: int, body: bytes) -> None:
+        super().__init__(f'Cannot seed data through {route}: {status} {body[:200]!r}')
+
+
+class HTTPConnection:
+    '''Минимальный HTTP/1.1 клиент поверх одного keep-alive соединения.'''
+
+    def __init__(self, host: str, port: int) -> None:
+        self.host = host
+        self.port = port
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._conn: h11.Connection | None = None
+
+    async def _connect(self) -> None:
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        self._conn = h11.Connection(h11.CLIENT)
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+        self._reader = self._writer = self._conn = None
+
+    async def request(self, method: str, target: str, payload: object = None) -> tuple[int, bytes]:
+        if self._conn is None:
+            await self._connect()
+
+        body = b'' if payload is None else json.dumps(payload).encode()
+        headers = [('Host', self.host), ('Content-Length', str(len(body)))]
+        if payload is not None:
+            headers.append(('Content-Type', 'application/json'))
+
+        try:
+            data = self._conn.send(h11.Request(method=method, target=target, headers=headers))
+            data += self._conn.send(h11.Data(data=body)) + self._conn.send(h11.EndOfMessage())
+            self._writer.write(data)
+            await self._writer.drain()
+            status, response_body = await self._read_response()
+        except (OSError, h11.ProtocolError):
+            await self.close()
+            raise
+
+        if self._conn.our_state is h11.DONE and self._conn.their_state is h11.DONE:
+            self._conn.start_next_cycle()
+        else:
+            await self.close()
+        return status, response_body
+
+    async def _read_response(self) -> tuple[int, bytes]:
+        status = 0
+        chunks = []
+        while True:
+            event = self._conn.next_event()
+            if event is h11.NEED_DATA:
+                data = await self._reader.read(65536)
+                if not data:
+                    raise ConnectionClosedError
+                self._conn.receive_data(data)
+            elif isinstance(event, h11.Response):
+                status = event.status_code
+            elif isinstance(event, h11.Data):
+                chunks.append(bytes(event.data))
+            elif isinstance(event, h11.EndOfMessage):
+                return status, b''.join(chunks)
+
+
+@dataclass
+class Dataset:
+    run_tag: str
+    teams: int = 20
+    members_per_team: int = 10
+    pull_requests: int = 2000
+
+    def team(self, index: int) -> str:
+        return f'{self.run_tag}-team-{index}'
+
+    def user(self, team_index: int, member_index: int) -> str:
+        return f'{self.run_tag}-u-{team_index}-{member_index}'
+
+
+@dataclass
+class State:
+    '''Общее для всех воркеров знание о засеянных данных.'''
+    data: Dataset
+    open_prs: list[str] = field(default_factory=list)
+    reviewers: dict[str, list[str]] = field(default_factory=dict)
+    created: int = 0
+
+    def random_user(self, rng: random.Random) -> str:
+        return self.data.user(rng.randrange(self.data.teams), rng.randrange(self.data.members_per_team))
+
+
+Operation = Callable[[HTTPConnection, State, random.Random], Awaitable[tuple[str, int]]]
+
+
+async def create_pr(client: HTTPConnection, state: State, rng: random.Random) -> tuple[str, int]:
+    state.created += 1
+    pr_id = f'{state.data.run_tag}-load-pr-{state.created}'
+    status, body = await client.request('POST', '/pullRequests/create', {
+        'pull_request_id': pr_id,
+        'pull_request_name': 'load test',
+        'author_id': state.random_user(rng),
+    })
+    if status == HTTPStatus.CREATED:
+        state.open_prs.append(pr_id)
+        state.reviewers[pr_id] = json.loads(body)['assigned_reviewers']
+    return '/pullRequests/create', status
+
+
+async def merge_pr(client: HTTPConnection, state: State, rng: random.Random) -> tuple[str, int]:
+    if not state.open_prs:
+        return await create_pr(client, state, rng)
+
+    pr_id = state.open_prs.pop(rng.randrange(len(state.open_prs)))
+    state.reviewers.pop(pr_id, None)
+    status, _ = await client.request('POST', '/pullRequests/merge', {'pull_request_id': pr_id})
+    return '/pullRequests/merge', status
+
+
+async def get_review(client: HTTPConnection, state: State, rng: random.Random) -> tuple[str, int]:
+    status, _ = await client.request('GET', '/users/getReview?' + urlencode({'user_id': state.random_user(rng)}))
+    return '/users/getReview', status
+
+
+async def get_team(client: HTTPConnection, state: State, rng: random.Random) -> tuple[str, int]:
+    status, _ = await client.request('GET', '/teams/get?' + urlencode({'team_name': state.data.team(rng.randrange(state.data.teams))}))
+    return '/teams/get', status
+
+
+async def get_user_stats(client: HTTPConnection, state: State, rng: random.Random) -> tuple[str, int]:
+    status, _ = await client.request('GET', '/stats/user?' + urlencode({'user_id': state.random_user(rng)}))
+    return '/stats/user', status
+
+
+HOT_PRS = 10
+
+
+async def reassign(client: HTTPConnection, state: State, rng: random.Random) -> tuple[str, int]:
+    # Concentrate on a handful of PRs so concurrent requests contend for the same rows.
+    hot = [pr_id for pr_id in state.open_prs[:HOT_PRS] if state.reviewers.get(pr_id)]
+    if not hot:
+        return await create_pr(client, state, rng)
+
+    pr_id = rng.choice(hot)
+    old_user_id = rng.choice(state.reviewers[pr_id])
+    status, body = await client.request('POST', '/pullRequests/reassign', {
+        'pull_request_id': pr_id,
+        'old_user_id': old_user_id,
+    })
+    if status == HTTPStatus.OK:
+        state.reviewers[pr_id] = json.loads(body)['pr']['assigned_reviewers']
+    return '/pullRequests/reassign', status
+
+
+SCENARIOS: dict[str, list[tuple[Operation, int]]] = {
+    'create-heavy': [(create_pr, 70), (get_review, 20), (merge_pr, 10)],
+    'read-heavy': [(get_review, 60), (get_team, 25), (get_user_stats, 15)],
+    'reassign-storm': [(reassign, 80), (get_review, 20)],
+}
+
+
+async def seed(client: HTTPConnection, state: State, rng: random.Random) -> None:
+    data = state.data
+    for team_index in range(data.teams):
+        status, body = await client.request('POST', '/teams/add', {
+            'name': data.team(team_index),
+            'members': [
+                {'user_id': data.user(team_index, member_index), 'username': f'Member {member_index}', 'is_active': True}
+                for member_index in range(data.members_per_team)
+            ],
+        })
+        if status not in (HTTPStatus.OK, HTTPStatus.CREATED):
+            raise SeedError('/teams/add', status, body)
+
+    for start in range(0, data.pull_requests, SEED_BATCH_SIZE):
+        batch = [
+            {'pull_request_id': f'{data.run_tag}-pr-{i}', 'pull_request_name': 'seed', 'author_id': state.random_user(rng)}
+            for i in range(start, min(start + SEED_BATCH_SIZE, data.pull_requests))
+        ]
+        status, body = await client.request('POST', '/pullRequests/bulkCreate', {'pull_requests': batch})
+        if status != HTTPStatus.OK:
+            raise SeedError('/pullRequests/bulkCreate', status, body)
+        for pr in json.loads(body)['created']:
+            state.open_prs.append(pr['pull_request_id'])
+            state.reviewers[pr['pull_request_id']] = pr['assigned_reviewers']
+
+
+@dataclass
+class RouteSamples:
+    latencies: list[float] = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    '''Процентиль методом ближайшего ранга.'''
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples: RouteSamples, elapsed: float) -> dict:
+    latencies = sorted(samples.latencies)
+    summary = {
+        'count': len(latencies),
+        'rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'errors': sum(count for status, count in samples.statuses.items() if status == 0 or status >= HTTPStatus.INTERNAL_SERVER_ERROR),
+        'statuses': {str(status): count for status, count in sorted(samples.statuses.items())},
+        'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        'max_ms': round(latencies[-1], 3) if latencies else 0.0,
+    }
+    for q in PERCENTILES:
+        summary[f'p{q}_ms'] = round(percentile(latencies, q), 3)
+    return summary
+
+
+async def worker(
+    client: HTTPConnection,
+    state: State,
+    rng: random.Random,
+    mix: list[tuple[Operation, int]],
+    deadline: float,
+    samples: dict[str, RouteSamples],
+) -> None:
+    operations = [operation for operation, _ in mix]
+    weights = [weight for _, weight in mix]
+    while time.perf_counter() < deadline:
+        operation = rng.choices(operations, weights)[0]
+        started = time.perf_counter()
+        try:
+            route, status = await operation(client, state, rng)
+        except (OSError, h11.ProtocolError):
+            route, status = operation.__name__, 0
+        route_samples = samples[route]
+        route_samples.latencies.append((time.perf_counter() - started) * 1000)
+        route_samples.statuses[status] += 1
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True, stderr=subprocess.DEVNULL).strip()  # noqa: S607
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report: dict) -> None:
+    meta = report['meta']
+    print(f"\n{meta['scenario']}: {meta['concurrency']} connections, {meta['duration_s']} s, revision {meta['revision']}")
+    print(f"{'route':<28}{'count':>8}{'rps':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'errors':>8}")
+    for route, summary in [*report['routes'].items(), ('total', report['total'])]:
+        print(
+            f"{route:<28}{summary['count']:>8}{summary['rps']:>10.1f}"
+            f"{summary['p50_ms']:>10.2f}{summary['p95_ms']:>10.2f}{summary['p99_ms']:>10.2f}{summary['errors']:>8}"
+        )
+
+
+async def run(args: argparse.Namespace) -> int:
+    url = urlsplit(args.base_url)
+    host, port = url.hostname, url.port or 80
+    # Deterministic load generation, not cryptography.
+    rng = random.Random(args.seed)  # noqa: S311
+    data = Dataset(
+        run_tag=args.run_tag or f'lt{args.seed}-{int(time.time())}',
+        teams=args.teams,
+        members_per_team=args.members_per_team,
+        pull_requests=args.pull_requests,
+    )
+    state = State(data)
+
+    seed_client = HTTPConnection(host, port)
+    print(f'Seeding {data.teams} teams x {data.members_per_team} users and {data.pull_requests} PRs as {data.run_tag}...')
+    try:
+        await seed(seed_client, state, rng)
+    finally:
+        await seed_client.close()
+
+    samples: dict[str, RouteSamples] = defaultdict(RouteSamples)
+    clients = [HTTPConnection(host, port) for _ in range(args.concurrency)]
+    worker_rngs = [random.Random(args.seed * 1000 + i) for i in range(args.concurrency)]  # noqa: S311
+    started = time.perf_counter()
+    deadline = started + args.duration
+    try:
+        await asyncio.gather(*(
+            worker(client, state, rng, SCENARIOS[args.scenario], deadline, samples)
+            for client, rng in zip(clients, worker_rngs, strict=True)
+        ))
+    finally:
+        await asyncio.gather(*(client.close() for client in clients))
+    elapsed = time.perf_counter() - started
+
+    total = RouteSamples()
+    for route_samples in samples.values():
+        total.latencies.extend(route_samples.latencies)
+        total.statuses.update(route_samples.statuses)
+
+    report = {
+        'meta': {
+            'scenario': args.scenario,
+            'base_url': args.base_url,
+            'concurrency': args.concurrency,
+            'duration_s': round(elapsed, 3),
+            'seed': args.seed,
+            'dataset': asdict(data),
+            'revision': git_revision(),
+            'started_at': datetime.now(timezone.utc).isoformat(),
+        },
+        'routes': {route: summarize(samples[route], elapsed) for route in sorted(samples)},
+        'total': summarize(total, elapsed),
+    }
+    print_report(report)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f'\nResults written to {args.output}')
+    return 1 if report['total']['errors'] else 0
+
+
+def change(before: float, after: float) -> str:
+    if not before:
+        return 'n/a'
+    return f'{(after - before) / before * 100:+.1f}%'
+
+
+def compare(args: argparse.Namespace) -> int:
+    baseline = json.loads(Path(args.baseline).read_text())
+    candidate = json.loads(Path(args.candidate).read_text())
+
+    print(f"baseline {baseline['meta']['revision']} vs candidate {candidate['meta']['revision']} ({candidate['meta']['scenario']})")
+    print(f"{'route':<28}{'rps':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    routes = [*sorted(set(baseline['routes']) & set(candidate['routes'])), 'total']
+    for route in routes:
+        before = baseline['total'] if route == 'total' else baseline['routes'][route]
+        after = candidate['total'] if route == 'total' else candidate['routes'][route]
+        print(
+            f"{route:<28}{change(before['rps'], after['rps']):>10}{change(before['p50_ms'], after['p50_ms']):>10}"
+            f"{change(before['p95_ms'], after['p95_ms']):>10}{change(before['p99_ms'], after['p99_ms']):>10}"
+        )
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='seed data and run a scenario')
+    run_parser.add_argument('--base-url', default='http://127.0.0.1:8080')
+    run_parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='read-heavy')
+    run_parser.add_argument('--duration', type=float, default=30.0, help='seconds')
+    run_parser.add_argument('--concurrency', type=int, default=32)
+    run_parser.add_argument('--seed', type=int, default=1)
+    run_parser.add_argument('--run-tag', help='prefix for seeded ids (defaults to a per-run value)')
+    run_parser.add_argument('--teams', type=int, default=Dataset.teams)
+    run_parser.add_argument('--members-per-team', type=int, default=Dataset.members_per_team)
+    run_parser.add_argument('--pull-requests', type=int, default=Dataset.pull_requests)
+    run_parser.add_argument('--output', help='write JSON results to this file')
+
+    compare_parser = commands.add_parser('compare', help='compare two JSON results')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)) if args.command == 'run' else compare(args))
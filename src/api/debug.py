@@ -0,0 +1,50 @@
+import os
+
+from fastapi import APIRouter
+from starlette.requests import Request
+
+from src.db.pool import InstrumentedQueuePool
+from src.schemas.debug import PoolStatsSchema, PoolWaitSchema
+
+from .tags import APITags
+
+
+# Mounted only with DEBUG_ENDPOINTS and kept out of the public OpenAPI schema.
+router = APIRouter(prefix='/debug', tags=[APITags.DEBUG], include_in_schema=False)
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+@router.get(
+    '/pool',
+    summary='Состояние пула соединений текущего воркера',
+    description='Счетчики относятся к процессу, обработавшему запрос: при нескольких воркерах у каждого свой пул.',  # noqa: RUF001
+)
+async def get_pool_stats(request: Request) -> PoolStatsSchema:
+    pool = request.app.state.db_engine.pool
+
+    wait = None
+    if isinstance(pool, InstrumentedQueuePool):
+        stats = pool.wait_stats
+        wait = PoolWaitSchema(
+            checkouts=stats.checkouts,
+            timeouts=stats.timeouts,
+            mean_ms=_ms(stats.total_wait / stats.checkouts) if stats.checkouts else 0.0,
+            p50_ms=_ms(stats.percentile(50)),
+            p99_ms=_ms(stats.percentile(99)),
+            max_ms=_ms(stats.max_wait),
+        )
+
+    return PoolStatsSchema(
+        pid=os.getpid(),
+        pool_class=type(pool).__name__,
+        size=pool.size(),
+        checked_in=pool.checkedin(),
+        checked_out=pool.checkedout(),
+        overflow=pool.overflow(),
+        max_overflow=pool._max_overflow,
+        timeout=pool.timeout(),
+        wait=wait,
+    )
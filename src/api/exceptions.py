@@ -17,3 +17,10 @@ class BadRequestError(HTTPException):
         self, detail: ErrorDetailSchema | Any | None = None, headers: dict[str, Any] | None = None  # noqa: ANN401
     ) -> None:
         super().__init__(status.HTTP_400_BAD_REQUEST, detail, headers)
+
+
+class ConflictError(HTTPException):
+    def __init__(
+        self, detail: ErrorDetailSchema | Any | None = None, headers: dict[str, Any] | None = None  # noqa: ANN401
+    ) -> None:
+        super().__init__(status.HTTP_409_CONFLICT, detail, headers)
@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.database import get_read_db_connection
+from src.middleware import query_budget
+from src.services.export import ExportService
+from src.type_defs import ExportDataset, ExportFormat
+
+from .tags import APITags
+
+
+router = APIRouter(prefix='/export', tags=[APITags.EXPORT])
+
+MEDIA_TYPES = {
+    ExportFormat.NDJSON: 'application/x-ndjson',
+    ExportFormat.CSV: 'text/csv; charset=utf-8',
+}
+
+
+@router.get(
+    '/{dataset}',
+    summary='Выгрузить все строки набора потоком в NDJSON или CSV',
+    description=(
+        'PR и назначения ревьюверов выгружаются вместе с архивом. Ответ пишется по мере чтения, '  # noqa: RUF001
+        'так что размер выгрузки не ограничен памятью сервиса.'
+    ),
+    response_class=StreamingResponse,
+    responses={200: {'content': {MEDIA_TYPES[ExportFormat.NDJSON]: {}, 'text/csv': {}}}},
+)
+# Each window of EXPORT_TRANSACTION_ROWS runs one statement and yields at least one chunk;
+# the base statement covers the last, empty window.
+@query_budget(1, per_chunk=1)
+async def export(
+        dataset: ExportDataset,
+        export_format: ExportFormat = Query(ExportFormat.NDJSON, alias='format'),
+        db: AsyncSession = Depends(get_read_db_connection),
+        ) -> StreamingResponse:
+    return StreamingResponse(
+        ExportService(db).stream(dataset, export_format),
+        media_type=MEDIA_TYPES[export_format],
+        headers={'Content-Disposition': f'attachment; filename="{dataset.value}.{export_format.value}"'},
+    )
@@ -0,0 +1,55 @@
+from fastapi import APIRouter, status
+from starlette.requests import Request
+
+from src.db.health import PRIMARY_DATABASE
+
+from .responses import ORJSONResponse
+from .tags import APITags
+
+
+router = APIRouter(tags=[APITags.HEALTH])
+
+
+def _readiness(request: Request) -> tuple[bool, dict, dict]:
+    '''Готовность по primary и отдельно состояние реплик: больная реплика только выводится из чтения.'''
+    health_check = request.app.state.db_health
+    databases = {
+        name: {'ok': health_check.healthy(name), 'checked_at': database.checked_at, 'error': database.error}
+        for name, database in health_check.statuses.items()
+    }
+    primary = databases.pop(PRIMARY_DATABASE, None)
+    return health_check.ready(), primary, databases
+
+
+@router.get('/livez', summary='Процесс жив; база не проверяется')
+async def livez() -> dict:
+    return {'status': 'alive'}
+
+
+@router.get(
+    '/readyz',
+    summary='Готовность принимать трафик',
+    description=(
+        'Результат фоновой проверки баз, которая выполняется раз в READINESS_CHECK_INTERVAL секунд; сам зонд в базу не ходит. '
+        'Готовность зависит только от primary, реплики перечислены отдельно.'
+    ),
+)
+async def readyz(request: Request) -> ORJSONResponse:
+    ready, primary, replicas = _readiness(request)
+    return ORJSONResponse(
+        {
+            'status': 'ready' if ready else 'not ready',
+            'primary': primary,
+            'replicas': replicas,
+            'startup_seconds': request.app.state.startup_seconds,
+        },
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+
+
+@router.get('/health', summary='Совместимый с прежним контрактом вариант /readyz')  # noqa: RUF001
+async def health_check(request: Request) -> ORJSONResponse:
+    ready, _, _ = _readiness(request)
+    if ready:
+        return ORJSONResponse({'status': 'healthy'})
+    return ORJSONResponse({'status': 'unhealthy'}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from starlette.responses import Response
+
+from src.metrics import CONTENT_TYPE, REGISTRY
+
+
+router = APIRouter()
+
+
+@router.get('/metrics', include_in_schema=False)
+async def metrics() -> Response:
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
@@ -1,37 +1,82 @@
-from fastapi import APIRouter, Depends
+from collections.abc import Iterable, Sequence
+
+from fastapi import APIRouter, Depends, status
+from pydantic import TypeAdapter
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.responses import Response
 
+from src.db import models
 from src.db.database import get_db_connection
-from src.schemas.base import ErrorDetailSchema
-from src.schemas.pull_requests import MergePRRequest, PullRequest, PullRequestCreateRequestSchema
-from src.services.exceptions import PRAlreadyExistsError, PRDoesNotExistError
+from src.middleware import query_budget
+from src.schemas.base import ErrorDetailSchema, ErrorResponseSchema
+from src.schemas.pull_requests import (
+    MergePRRequest,
+    PullRequest,
+    PullRequestBulkCreateRequestSchema,
+    PullRequestBulkCreateResponse,
+    PullRequestCreateRequestSchema,
+    PullRequestData,
+    PullRequestReassignRequestSchema,
+    PullRequestReassignResponse,
+    format_ctimes,
+)
+from src.services.exceptions import (
+    ConcurrentModificationError,
+    NoReplacementCandidateError,
+    PRAlreadyExistsError,
+    PRDoesNotExistError,
+    PRNotModifiableError,
+    ReviewerNotAssignedError,
+    UserDoesNotExistError,
+)
 from src.services.pull_requests import PullRequestService
 from src.type_defs import ErrorCode
 
-from .exceptions import NotFoundError
+from .exceptions import ConflictError, NotFoundError
+from .responses import ORJSONResponse
 from .tags import APITags
 
 
 router = APIRouter(prefix='/pullRequests', tags=[APITags.PULL_REQUESTS])
 
 
-@router.post('/create', status_code=201)
-async def create_pr(request: PullRequestCreateRequestSchema, db: AsyncSession = Depends(get_db_connection)) -> PullRequest:
+PULL_REQUESTS = TypeAdapter(list[PullRequestData])
+
+
+def _pull_requests(prs: Sequence[models.PullRequest], reviewer_ids: Iterable[list[str]]) -> list[PullRequestData]:
+    '''PR в форме ответа API, проверенные одним вызовом TypeAdapter на всю выдачу.'''
+    created_at = format_ctimes([pr.created_at for pr in prs])
+    merged_at = format_ctimes([pr.merged_at for pr in prs])
+    return PULL_REQUESTS.validate_python([
+        {
+            'pull_request_id': pr.id,
+            'pull_request_name': pr.name,
+            'author_id': pr.author_id,
+            'status': pr.status,
+            'assigned_reviewers': reviewers,
+            'created_at': created,
+            'merged_at': merged
+        }
+        for pr, reviewers, created, merged in zip(prs, reviewer_ids, created_at, merged_at, strict=True)
+    ])
+
+
+def _pull_request(pr: models.PullRequest, reviewer_ids: list[str] | None = None) -> PullRequestData:
+    if reviewer_ids is None:
+        reviewer_ids = [r.user_id for r in pr.assigned_reviewers]
+    return _pull_requests([pr], [reviewer_ids])[0]
+
+
+@router.post('/create', status_code=201, response_model=PullRequest)
+@query_budget(8)
+async def create_pr(request: PullRequestCreateRequestSchema, db: AsyncSession = Depends(get_db_connection)) -> Response:
     try:
         pr = await PullRequestService(db).create_pr_with_auto_reviewers(
             id=request.pull_request_id,
             name=request.pull_request_name,
             author_id=request.author_id
         )
-        return PullRequest(
-            pull_request_id=pr.id,
-            pull_request_name=pr.name,
-            author_id=pr.author_id,
-            assigned_reviewers=[r.user_id for r in pr.assigned_reviewers],
-            status=pr.status,
-            created_at=pr.created_at,
-            merged_at=pr.merged_at
-        )
+        return ORJSONResponse(_pull_request(pr), status_code=201)
     except PRAlreadyExistsError as e:
         raise NotFoundError(
             detail=ErrorDetailSchema(
@@ -41,8 +86,45 @@ async def create_pr(request: PullRequestCreateRequestSchema, db: AsyncSession =
         ) from e
 
 
+BULK_CREATE_ERROR_CODES = {
+    PRAlreadyExistsError: ErrorCode.PR_EXISTS,
+    UserDoesNotExistError: ErrorCode.NOT_FOUND,
+}
+
+
+@router.post(
+    '/bulkCreate',
+    summary='Создать пачку PR и назначить ревьюверов одной транзакцией',
+    response_model=PullRequestBulkCreateResponse,
+)
+@query_budget(7)
+async def bulk_create_prs(
+        request: PullRequestBulkCreateRequestSchema,
+        db: AsyncSession = Depends(get_db_connection),
+        ) -> Response:
+    result = await PullRequestService(db).bulk_create_prs_with_auto_reviewers([
+        {
+            'id': pr.pull_request_id,
+            'name': pr.pull_request_name,
+            'author_id': pr.author_id
+        }
+        for pr in request.pull_requests
+    ])
+    return ORJSONResponse({
+        'created': _pull_requests(result.created, [result.reviewers[pr.id] for pr in result.created]),
+        'errors': [
+            {
+                'pull_request_id': pr_id,
+                'error': {'code': BULK_CREATE_ERROR_CODES[type(error)], 'message': str(error)}
+            }
+            for pr_id, error in result.failed
+        ]
+    })
+
+
 @router.post(
     '/merge',
+    response_model=PullRequest,
     responses={
         200: {
             'description': 'PR в состоянии MERGED',
@@ -68,26 +150,27 @@ async def create_pr(request: PullRequestCreateRequestSchema, db: AsyncSession =
                     'schema': {'$ref': '#/components/schemas/ErrorResponse'}
                 }
             }
+        },
+        409: {
+            'description': 'PR одновременно изменяли другие запросы, повторы не помогли',
+            'content': {
+                'application/json': {
+                    'schema': {'$ref': '#/components/schemas/ErrorResponse'}
+                }
+            }
         }
     }
 )
+@query_budget(6)
 async def merge_pull_request(
         request: MergePRRequest,
         db: AsyncSession = Depends(get_db_connection),
-        ) -> PullRequest:
+        ) -> Response:
     pr_service = PullRequestService(db)
     try:
         pr = await pr_service.merge_pr(request.pull_request_id)
 
-        return PullRequest(
-            pull_request_id=pr.id,
-            pull_request_name=pr.name,
-            author_id=pr.author_id,
-            assigned_reviewers=[r.user_id for r in pr.assigned_reviewers],
-            status=pr.status,
-            created_at=pr.created_at,
-            merged_at=pr.merged_at
-        )
+        return ORJSONResponse(_pull_request(pr))
     except PRDoesNotExistError as e:
         raise NotFoundError(
             detail=ErrorDetailSchema(
@@ -95,3 +178,61 @@ async def merge_pull_request(
                 message=str(e)
             )
         ) from e
+    except ConcurrentModificationError as e:
+        raise ConflictError(
+            detail=ErrorDetailSchema(
+                code=ErrorCode.CONCURRENT_MODIFICATION,
+                message=str(e)
+            )
+        ) from e
+
+
+REASSIGN_CONFLICT_CODES = {
+    PRNotModifiableError: ErrorCode.PR_MERGED,
+    ReviewerNotAssignedError: ErrorCode.NOT_ASSIGNED,
+    NoReplacementCandidateError: ErrorCode.NO_CANDIDATE,
+    ConcurrentModificationError: ErrorCode.CONCURRENT_MODIFICATION,
+}
+
+
+@router.post(
+    '/reassign',
+    summary='Переназначить конкретного ревьювера на другого из его команды',  # noqa: RUF001
+    response_model=PullRequestReassignResponse,
+    responses={
+        status.HTTP_404_NOT_FOUND: {
+            'description': 'PR или пользователь не найден',
+            'model': ErrorResponseSchema
+        },
+        status.HTTP_409_CONFLICT: {
+            'description': 'Нарушение доменных правил переназначения или одновременное изменение PR',
+            'model': ErrorResponseSchema
+        }
+    }
+)
+@query_budget(6)
+async def reassign_reviewer(
+        request: PullRequestReassignRequestSchema,
+        db: AsyncSession = Depends(get_db_connection),
+        ) -> Response:
+    try:
+        result = await PullRequestService(db).replace_reviewer(request.pull_request_id, request.old_user_id)
+    except (PRDoesNotExistError, UserDoesNotExistError) as e:
+        raise NotFoundError(
+            detail=ErrorDetailSchema(
+                code=ErrorCode.NOT_FOUND,
+                message=str(e)
+            )
+        ) from e
+    except (PRNotModifiableError, ReviewerNotAssignedError, NoReplacementCandidateError, ConcurrentModificationError) as e:
+        raise ConflictError(
+            detail=ErrorDetailSchema(
+                code=REASSIGN_CONFLICT_CODES[type(e)],
+                message=str(e)
+            )
+        ) from e
+
+    return ORJSONResponse({
+        'pr': _pull_request(result.pull_request, result.reviewer_ids),
+        'replaced_by': result.replaced_by
+    })
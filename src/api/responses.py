@@ -0,0 +1,61 @@
+'''
+Ответы API, сериализуемые без лишних проходов по данным.
+
+По умолчанию FastAPI повторно валидирует возвращенную модель, превращает ее
+в dict и кодирует стандартным json. Эндпоинты с большими ответами вместо
+этого собирают dict сами, проверяют строки заранее построенным TypeAdapter
+(по TypedDict, без создания моделей) и отдают их через `ORJSONResponse`;
+для небольших моделей есть `schema_response`. Вывод совпадает побайтно:
+компактный JSON в UTF-8 без экранирования не-ASCII символов.
+
+orjson не обязателен: без него `ORJSONResponse` пишет те же байты через json.
+
+GET-эндпоинты с версией ресурса отдают ETag из счетчика версии и отвечают
+304 на совпавший If-None-Match, не собирая тело.
+'''
+from typing import Any, TypeVar
+
+from pydantic import TypeAdapter
+from starlette.responses import JSONResponse, Response
+
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+T = TypeVar('T')
+
+JSON_MEDIA_TYPE = 'application/json'
+NOT_MODIFIED_RESPONSE = {'description': 'Not modified since the ETag passed in If-None-Match'}
+
+
+class ORJSONResponse(JSONResponse):
+    '''JSONResponse на orjson, если он установлен; иначе стандартная реализация с тем же выводом.'''
+
+    def render(self, content: Any) -> bytes:  # noqa: ANN401
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content)
+
+
+def schema_response(adapter: TypeAdapter[T], value: T, status_code: int = 200) -> Response:
+    return Response(adapter.dump_json(value), status_code=status_code, media_type=JSON_MEDIA_TYPE)
+
+
+def etag(version: int) -> str:
+    # Weak: the ORM and SQL_JSON_READS bodies differ in whitespace but carry the same data.
+    return f'W/"{version}"'
+
+
+def etag_matches(if_none_match: str | None, tag: str) -> bool:
+    '''Слабое сравнение If-None-Match с текущим ETag (RFC 9110, 13.1.2).'''
+    if if_none_match is None:
+        return False
+    opaque_tag = tag.removeprefix('W/')
+    return any(candidate.strip().removeprefix('W/') == opaque_tag for candidate in if_none_match.split(','))
+
+
+def not_modified(tag: str) -> Response:
+    return Response(status_code=304, headers={'ETag': tag})
@@ -0,0 +1,58 @@
+from fastapi import APIRouter, Depends, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.database import get_read_db_connection
+from src.middleware import query_budget
+from src.schemas.base import ErrorDetailSchema, ErrorResponseSchema
+from src.schemas.stats import TeamReviewStatsSchema, UserReviewStatsSchema
+from src.services.exceptions import TeamDoesNotExistError, UserDoesNotExistError
+from src.services.stats import StatsService
+from src.type_defs import ErrorCode
+
+from .exceptions import NotFoundError
+from .tags import APITags
+
+
+router = APIRouter(prefix='/stats', tags=[APITags.STATS])
+
+
+@router.get(
+    '/user',
+    summary='Счетчики назначенных, открытых и смерженных ревью пользователя',
+    responses={
+        status.HTTP_404_NOT_FOUND: {
+            'description': 'User not found',
+            'model': ErrorResponseSchema
+        }
+    }
+)
+@query_budget(1)
+async def get_user_stats(user_id: str, db: AsyncSession = Depends(get_read_db_connection)) -> UserReviewStatsSchema:
+    try:
+        return await StatsService(db).get_user_stats(user_id)
+    except UserDoesNotExistError as e:
+        raise NotFoundError(detail=ErrorDetailSchema(
+            code=ErrorCode.NOT_FOUND,
+            message=str(e)
+        )) from e
+
+
+@router.get(
+    '/team',
+    summary='Счетчики назначенных, открытых и смерженных ревью команды',
+    responses={
+        status.HTTP_404_NOT_FOUND: {
+            'description': 'Team not found',
+            'model': ErrorResponseSchema
+        }
+    }
+)
+@query_budget(1)
+async def get_team_stats(team_name: str, db: AsyncSession = Depends(get_read_db_connection)) -> TeamReviewStatsSchema:
+    try:
+        return await StatsService(db).get_team_stats(team_name)
+    except TeamDoesNotExistError as e:
+        raise NotFoundError(detail=ErrorDetailSchema(
+            code=ErrorCode.TEAM_DOES_NOT_EXIST,
+            message=str(e)
+        )) from e
@@ -2,4 +2,7 @@ class APITags:
     TEAMS = 'Teams'
     USERS = 'Users'
     PULL_REQUESTS = 'PullRequests'
+    STATS = 'Stats'
     HEALTH = 'Health'
+    EXPORT = 'Export'
+    DEBUG = 'Debug'
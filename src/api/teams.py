@@ -1,23 +1,60 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header
+from pydantic import TypeAdapter
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.responses import Response
 
-from src.db.database import get_db_connection
+from src.config import SINGLE_FLIGHT_READS, SQL_JSON_READS
+from src.db.database import get_db_connection, get_read_db_connection, reads_own_writes
+from src.db.models import Team
+from src.middleware import query_budget
 from src.schemas.base import ErrorDetailSchema, ErrorResponseSchema
-from src.schemas.teams import TeamSchema
+from src.schemas.teams import TeamMemberData, TeamSchema
 from src.services.exceptions import TeamAlreadyExistsError
 from src.services.teams import TeamService
+from src.singleflight import SingleFlight
 from type_defs import ErrorCode
 
 from .exceptions import BadRequestError, NotFoundError
+from .responses import JSON_MEDIA_TYPE, NOT_MODIFIED_RESPONSE, ORJSONResponse, etag, etag_matches, not_modified
 from .tags import APITags
 
 
 router = APIRouter(prefix='/teams', tags=[APITags.TEAMS])
 
+TEAM_MEMBERS = TypeAdapter(list[TeamMemberData])
+TEAM_READS: SingleFlight[bytes | None] = SingleFlight('teams_get', enabled=SINGLE_FLIGHT_READS)
+
+
+def _team(team: Team) -> dict:
+    '''Команда в форме TeamSchema; участники проверяются одним вызовом TypeAdapter.'''
+    members = TEAM_MEMBERS.validate_python([
+        {'user_id': member.user_id, 'username': member.username, 'is_active': member.is_active}
+        for member in team.members
+    ])
+    return {'name': team.name, 'members': members}
+
+
+async def _team_body(team_service: TeamService, team_name: str) -> bytes | None:
+    if SQL_JSON_READS:
+        return await team_service.get_team_json(team_name)
+
+    team = await team_service.get_team_with_members(team_name)
+    return ORJSONResponse(_team(team)).body if team is not None else None
+
+
+def _team_not_found(team_name: str) -> NotFoundError:
+    return NotFoundError(
+        detail=ErrorDetailSchema(
+            code=ErrorCode.TEAM_DOES_NOT_EXIST,
+            message=f'Team {team_name} does not exist'
+        )
+    )
+
 
 @router.post(
     '/add',
     summary='Создать команду с участниками (создаёт/обновляет пользователей)',  # noqa: RUF001
+    response_model=TeamSchema,
     responses={
         400: {
             'model': ErrorResponseSchema,
@@ -25,7 +62,9 @@ router = APIRouter(prefix='/teams', tags=[APITags.TEAMS])
         }
     }
 )
-async def add_team(request: TeamSchema, db: AsyncSession = Depends(get_db_connection)) -> TeamSchema:
+# Five statements plus one upsert per UPSERT_CHUNK_SIZE members: teams of up to 60k members fit.
+@query_budget(8)
+async def add_team(request: TeamSchema, db: AsyncSession = Depends(get_db_connection)) -> Response:
     try:
         team = await TeamService(db).create_team_with_members(request)
     except TeamAlreadyExistsError as e:
@@ -33,26 +72,40 @@ async def add_team(request: TeamSchema, db: AsyncSession = Depends(get_db_connec
             code=ErrorCode.TEAM_EXISTS,
             message='team_name already exists'
         )) from e
-    return TeamSchema.model_validate(team)
+    return ORJSONResponse(_team(team))
 
 
 @router.get(
     '/get',
     summary='Получить команду с участниками',  # noqa: RUF001
+    response_model=TeamSchema,
     responses={
+        304: NOT_MODIFIED_RESPONSE,
         404: {
             'model': ErrorResponseSchema,
             'description': 'Team not found'
         }
     }
 )
-async def get_team(team_name: str, db: AsyncSession = Depends(get_db_connection)) -> TeamSchema:
-    team = await TeamService(db).get_team_with_members(team_name)
-    if team is None:
-        raise NotFoundError(
-            detail=ErrorDetailSchema(
-                code=ErrorCode.TEAM_DOES_NOT_EXIST,
-                message=f'Team {team_name} does not exist'
-            )
-        )
-    return TeamSchema.model_validate(team)
+@query_budget(2)
+async def get_team(
+        team_name: str,
+        if_none_match: str | None = Header(None),
+        db: AsyncSession = Depends(get_read_db_connection),
+        ) -> Response:
+    team_service = TeamService(db)
+    # The version is read before the body, so the ETag is never newer than the data it is sent with.
+    version = await team_service.get_team_version(team_name)
+    if version == 0:
+        raise _team_not_found(team_name)
+    tag = etag(version)
+    if etag_matches(if_none_match, tag):
+        return not_modified(tag)
+
+    # Keyed by version too: a read that started before a write must not be shared with a request that saw the write's version.
+    body = await TEAM_READS.do(
+        (team_name, version), lambda: _team_body(team_service, team_name), share=not reads_own_writes(db),
+    )
+    if body is None:
+        raise _team_not_found(team_name)
+    return Response(content=body, media_type=JSON_MEDIA_TYPE, headers={'ETag': tag})
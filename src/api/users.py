@@ -1,18 +1,86 @@
-from fastapi import APIRouter, Depends, status
+from collections.abc import AsyncIterator, Sequence
+
+from fastapi import APIRouter, Depends, Header, Query, status
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from sqlalchemy import Row
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.responses import Response
 
 from src.api.tags import APITags
-from src.db.database import get_db_connection
+from src.config import SINGLE_FLIGHT_READS, SQL_JSON_READS
+from src.db.database import get_db_connection, get_read_db_connection, reads_own_writes
+from src.middleware import query_budget
 from src.schemas.base import ErrorDetailSchema, ErrorResponseSchema
-from src.schemas.users import UserGetReviewResponse, UserSchema, UserSetActiveRequestSchema
+from src.schemas.pull_requests import PullRequestShortData, PullRequestShortSchema
+from src.schemas.users import (
+    UserBulkDeactivateRequestSchema,
+    UserBulkDeactivateResponse,
+    UserBulkSetActiveRequestSchema,
+    UserBulkSetActiveResponse,
+    UserGetReviewResponse,
+    UserSchema,
+    UserSetActiveRequestSchema,
+)
+from src.services.exceptions import InvalidCursorError, TeamDoesNotExistError
 from src.services.users import UserService
+from src.singleflight import SingleFlight
 from type_defs import ErrorCode
 
-from .exceptions import NotFoundError
+from .exceptions import BadRequestError, NotFoundError
+from .responses import JSON_MEDIA_TYPE, NOT_MODIFIED_RESPONSE, ORJSONResponse, etag, etag_matches, not_modified, schema_response
 
 
 router = APIRouter(prefix='/users', tags=[APITags.USERS])
 
+DEFAULT_REVIEW_PAGE_SIZE = 100
+MAX_REVIEW_PAGE_SIZE = 1000
+
+
+USER = TypeAdapter(UserSchema)
+BULK_SET_ACTIVE_RESPONSE = TypeAdapter(UserBulkSetActiveResponse)
+BULK_DEACTIVATE_RESPONSE = TypeAdapter(UserBulkDeactivateResponse)
+SHORT_PULL_REQUESTS = TypeAdapter(list[PullRequestShortData])
+REVIEW_READS: SingleFlight[bytes] = SingleFlight('users_get_review', enabled=SINGLE_FLIGHT_READS)
+
+
+def _short_pull_request(row: Row) -> PullRequestShortSchema:
+    return PullRequestShortSchema(
+        pull_request_id=row.id,
+        pull_request_name=row.name,
+        author_id=row.author_id,
+        status=row.status
+    )
+
+
+def _short_pull_requests(rows: Sequence[Row]) -> list[PullRequestShortData]:
+    return SHORT_PULL_REQUESTS.validate_python([
+        {
+            'pull_request_id': row.id,
+            'pull_request_name': row.name,
+            'author_id': row.author_id,
+            'status': row.status
+        }
+        for row in rows
+    ])
+
+
+async def _ndjson_reviews(rows: AsyncIterator[Row]) -> AsyncIterator[str]:
+    async for row in rows:
+        yield _short_pull_request(row).model_dump_json() + '\n'
+
+
+async def _review_page_body(user_service: UserService, user_id: str, limit: int, cursor: str | None) -> bytes:
+    if SQL_JSON_READS:
+        return await user_service.get_user_pull_requests_to_review_json(user_id, limit, cursor)
+
+    page = await user_service.get_user_pull_requests_to_review(user_id, limit, cursor)
+    return ORJSONResponse({
+        'user_id': user_id,
+        'pull_requests': _short_pull_requests(page.pull_requests),
+        'next_cursor': page.next_cursor
+    }).body
+
 
 @router.post(
     '/setIsActive',
@@ -25,7 +93,8 @@ router = APIRouter(prefix='/users', tags=[APITags.USERS])
         }
     }
 )
-async def set_is_active(request: UserSetActiveRequestSchema, db: AsyncSession = Depends(get_db_connection)) -> UserSchema:
+@query_budget(3)
+async def set_is_active(request: UserSetActiveRequestSchema, db: AsyncSession = Depends(get_db_connection)) -> Response:
     user = await UserService(db).set_is_active(request)
 
     if user is None:
@@ -33,15 +102,115 @@ async def set_is_active(request: UserSetActiveRequestSchema, db: AsyncSession =
             code=ErrorCode.NOT_FOUND,
             message='User not found'
         ))
-    return UserSchema.model_validate(user)
+    return schema_response(USER, USER.validate_python(user, from_attributes=True))
+
+
+@router.post(
+    '/bulkSetIsActive',
+    summary='Установить флаги активности пачке пользователей одной транзакцией',
+    description='Незнакомые `user_id` не прерывают пачку и перечисляются в `unknown_user_ids`.',
+    response_model=UserBulkSetActiveResponse,
+)
+@query_budget(3)
+async def bulk_set_is_active(
+        request: UserBulkSetActiveRequestSchema,
+        db: AsyncSession = Depends(get_db_connection),
+        ) -> Response:
+    result = await UserService(db).set_is_active_many(request.users)
+    response = BULK_SET_ACTIVE_RESPONSE.validate_python(
+        {
+            'users': result.users,
+            'unknown_user_ids': result.unknown_user_ids
+        },
+        from_attributes=True
+    )
+    return schema_response(BULK_SET_ACTIVE_RESPONSE, response)
+
+
+@router.post(
+    '/bulkDeactivate',
+    summary='Деактивировать пользователей или всю команду и переназначить их открытые ревью',
+    response_model=UserBulkDeactivateResponse,
+    responses={
+        status.HTTP_404_NOT_FOUND: {
+            'description': 'Team not found',
+            'model': ErrorResponseSchema
+        }
+    }
+)
+@query_budget(8)
+async def bulk_deactivate(
+        request: UserBulkDeactivateRequestSchema,
+        db: AsyncSession = Depends(get_db_connection),
+        ) -> Response:
+    try:
+        result = await UserService(db).deactivate_users(request.user_ids, request.team_name)
+    except TeamDoesNotExistError as e:
+        raise NotFoundError(detail=ErrorDetailSchema(
+            code=ErrorCode.TEAM_DOES_NOT_EXIST,
+            message=str(e)
+        )) from e
+    response = BULK_DEACTIVATE_RESPONSE.validate_python(
+        {
+            'users': result.users,
+            'released_reviews': len(result.released),
+            'reassigned_reviews': len(result.reassigned)
+        },
+        from_attributes=True
+    )
+    return schema_response(BULK_DEACTIVATE_RESPONSE, response)
 
 
 @router.get(
     '/getReview',
     summary="Получить PR'ы, где пользователь назначен ревьювером",
+    description=(
+        'Постраничная выдача от новых PR к старым: следующую страницу можно получить, передав `next_cursor` '
+        'из ответа в параметр `cursor`. С `stream=true` все PR отдаются одним потоком в формате NDJSON.'  # noqa: RUF001
+    ),
+    response_model=UserGetReviewResponse,
+    responses={
+        200: {'content': {'application/x-ndjson': {}}},
+        status.HTTP_304_NOT_MODIFIED: NOT_MODIFIED_RESPONSE,
+        status.HTTP_400_BAD_REQUEST: {
+            'description': 'Invalid cursor',
+            'model': ErrorResponseSchema
+        }
+    }
 )
-async def get_review(user_id: str, db: AsyncSession = Depends(get_db_connection)) -> UserGetReviewResponse:
-    return UserGetReviewResponse(
-        user_id=user_id,
-        pull_requests=await UserService(db).get_user_pull_requests_to_review(user_id)
-    )
+# A stream is one server-side cursor: fetching more rows runs no new statements, so its chunks get no allowance.
+@query_budget(2, per_chunk=0)
+async def get_review(
+        user_id: str,
+        limit: int = Query(DEFAULT_REVIEW_PAGE_SIZE, ge=1, le=MAX_REVIEW_PAGE_SIZE),
+        cursor: str | None = None,
+        stream: bool = False,
+        if_none_match: str | None = Header(None),
+        db: AsyncSession = Depends(get_read_db_connection),
+        ) -> Response:
+    user_service = UserService(db)
+    if stream:
+        return StreamingResponse(
+            _ndjson_reviews(user_service.stream_user_pull_requests_to_review(user_id)),
+            media_type='application/x-ndjson'
+        )
+
+    # The version is read before the page, so the ETag is never newer than the data it is sent with.
+    version = await user_service.get_reviews_version(user_id)
+    tag = etag(version)
+    if etag_matches(if_none_match, tag):
+        return not_modified(tag)
+
+    try:
+        # Keyed by version too: a read that started before a write must not be shared with a request that saw the write's version.
+        body = await REVIEW_READS.do(
+            (user_id, limit, cursor, version),
+            lambda: _review_page_body(user_service, user_id, limit, cursor),
+            share=not reads_own_writes(db)
+        )
+    except InvalidCursorError as e:
+        raise BadRequestError(detail=ErrorDetailSchema(
+            code=ErrorCode.INVALID_CURSOR,
+            message=str(e)
+        )) from e
+    return Response(content=body, media_type=JSON_MEDIA_TYPE, headers={'ETag': tag})
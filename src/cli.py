@@ -0,0 +1,82 @@
+'''
+Служебные команды сервиса.
+
+    python -m src.cli rebuild-stats
+    python -m src.cli archive-merged [--older-than-days N] [--batch-size N]
+    python -m src.cli export [--dataset NAME] [--format ndjson|csv] [--output-dir DIR]
+'''
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from src.config import ARCHIVE_BATCH_SIZE, ARCHIVE_MERGED_AFTER_DAYS
+from src.db.database import init_db, stop_db
+from src.services.export import ExportService
+from src.services.pull_requests import PullRequestService
+from src.services.stats import StatsService
+from src.type_defs import ExportDataset, ExportFormat
+
+
+async def rebuild_stats(_args: argparse.Namespace) -> None:
+    session_factory, engine = await init_db()
+    try:
+        async with session_factory() as db:
+            await StatsService(db).rebuild()
+    finally:
+        await stop_db(engine)
+    print('Review stats rebuilt')
+
+
+async def archive_merged(args: argparse.Namespace) -> None:
+    merged_before = datetime.now(timezone.utc) - timedelta(days=args.older_than_days)
+    session_factory, engine = await init_db()
+    try:
+        async with session_factory() as db:
+            archived = await PullRequestService(db).archive_merged(merged_before, args.batch_size)
+    finally:
+        await stop_db(engine)
+    print(f'Archived {archived} pull requests merged before {merged_before.isoformat()}')
+
+
+async def export(args: argparse.Namespace) -> None:
+    datasets = [ExportDataset(args.dataset)] if args.dataset else list(ExportDataset)
+    export_format = ExportFormat(args.format)
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    session_factory, engine = await init_db()
+    try:
+        async with session_factory() as db:
+            for dataset in datasets:
+                path = output_dir / f'{dataset.value}.{export_format.value}'
+                with path.open('w', encoding='utf-8', newline='') as file:
+                    async for text in ExportService(db).stream(dataset, export_format):
+                        file.write(text)
+                print(f'Exported {dataset.value} to {path}')
+    finally:
+        await stop_db(engine)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('rebuild-stats', help='recompute review counters from pr_reviewers').set_defaults(handler=rebuild_stats)
+
+    archive = commands.add_parser('archive-merged', help='move old merged pull requests into the archive tables')
+    archive.add_argument('--older-than-days', type=int, default=ARCHIVE_MERGED_AFTER_DAYS)
+    archive.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+    archive.set_defaults(handler=archive_merged)
+
+    export_parser = commands.add_parser('export', help='stream teams, users, pull requests and reviewer assignments into files')
+    export_parser.add_argument('--dataset', choices=[dataset.value for dataset in ExportDataset], help='only this dataset (default: all)')
+    export_parser.add_argument('--format', choices=[export_format.value for export_format in ExportFormat], default=ExportFormat.NDJSON)
+    export_parser.add_argument('--output-dir', default='.')
+    export_parser.set_defaults(handler=export)
+
+    args = parser.parse_args()
+    asyncio.run(args.handler(args))
+
+
+if __name__ == '__main__':
+    main()
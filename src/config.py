@@ -0,0 +1,113 @@
+import os
+from typing import Literal
+from dataclasses import dataclass
+
+from src.type_defs import OutboxSinkKind, QueryBudgetMode, ReviewerSelectionStrategy
+
+
+REVIEWER_SELECTION_STRATEGY = os.getenv('REVIEWER_SELECTION_STRATEGY', ReviewerSelectionStrategy.LEAST_LOADED.value)
+
+ROSTER_CACHE_MAXSIZE = int(os.getenv('ROSTER_CACHE_MAXSIZE', '1024'))
+ROSTER_CACHE_TTL = float(os.getenv('ROSTER_CACHE_TTL', '60'))
+ROSTER_INVALIDATION_CHANNEL = os.getenv('ROSTER_INVALIDATION_CHANNEL', 'team_roster_invalidated')
+
+# Rows per statement in bulk upserts. Columns go as arrays, so this bounds statement size, not bind parameters.
+UPSERT_CHUNK_SIZE = int(os.getenv('UPSERT_CHUNK_SIZE', '20000'))
+
+
+def env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in {'1', 'true', 'yes', 'on'}
+
+
+@dataclass(frozen=True)
+class DatabaseSettings:
+    '''
+    Настройки движка и пула соединений.
+
+    `echo`: False, True (SQL) или 'debug' (SQL и строки результатов).
+    `pgbouncer`: режим для PgBouncer в transaction pooling - без кэша
+    подготовленных выражений и с уникальными именами выражений.
+    `replica_urls`: реплики для чтения, у каждой свой пул с теми же настройками.
+    `prewarm_connections`: сколько соединений каждого пула открыть при старте.
+    '''
+    url: str | None
+    echo: bool | Literal['debug'] = False
+    pool_size: int = 20
+    max_overflow: int = 40
+    pool_timeout: float = 30.0
+    pool_recycle: int = 3600
+    pool_pre_ping: bool = True
+    statement_cache_size: int = 100
+    pgbouncer: bool = False
+    replica_urls: tuple[str, ...] = ()
+    prewarm_connections: int = 5
+
+    @classmethod
+    def from_env(cls) -> 'DatabaseSettings':
+        echo = os.getenv('DATABASE_ECHO', 'false').strip().lower()
+        return cls(
+            url=os.getenv('DATABASE_URL'),
+            echo='debug' if echo == 'debug' else env_bool('DATABASE_ECHO', default=False),
+            pool_size=int(os.getenv('DATABASE_POOL_SIZE', str(cls.pool_size))),
+            max_overflow=int(os.getenv('DATABASE_MAX_OVERFLOW', str(cls.max_overflow))),
+            pool_timeout=float(os.getenv('DATABASE_POOL_TIMEOUT', str(cls.pool_timeout))),
+            pool_recycle=int(os.getenv('DATABASE_POOL_RECYCLE', str(cls.pool_recycle))),
+            pool_pre_ping=env_bool('DATABASE_POOL_PRE_PING', default=cls.pool_pre_ping),
+            statement_cache_size=int(os.getenv('DATABASE_STATEMENT_CACHE_SIZE', str(cls.statement_cache_size))),
+            pgbouncer=env_bool('DATABASE_PGBOUNCER', default=cls.pgbouncer),
+            prewarm_connections=int(os.getenv('DATABASE_PREWARM_CONNECTIONS', str(cls.prewarm_connections))),
+            replica_urls=tuple(url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()),
+        )
+
+
+DATABASE = DatabaseSettings.from_env()
+
+# After a commit on the primary the client reads from the primary for this many seconds; should exceed replica lag.
+READ_YOUR_WRITES_WINDOW = int(os.getenv('READ_YOUR_WRITES_WINDOW', '5'))
+READ_YOUR_WRITES_COOKIE = os.getenv('READ_YOUR_WRITES_COOKIE', 'db_primary_until')
+# The same deadline as a response header; clients without a cookie jar echo it back in the request header of that name.
+READ_YOUR_WRITES_HEADER = os.getenv('READ_YOUR_WRITES_HEADER', 'X-DB-Primary-Until')
+
+# Mount /debug/* (connection pool internals of the worker); keep off where the API is reachable from outside.
+DEBUG_ENDPOINTS = env_bool('DEBUG_ENDPOINTS', default=False)
+
+# /readyz serves the result of a background SELECT 1 run this often instead of querying on every probe.
+READINESS_CHECK_INTERVAL = float(os.getenv('READINESS_CHECK_INTERVAL', '5'))
+READINESS_CHECK_TIMEOUT = float(os.getenv('READINESS_CHECK_TIMEOUT', '2'))
+
+# off - only count, warn - log budget overruns and N+1 patterns, enforce - fail such requests with 500 (for tests and CI).
+QUERY_BUDGET_MODE = QueryBudgetMode(os.getenv('QUERY_BUDGET_MODE', QueryBudgetMode.WARN.value))
+QUERY_COUNT_HEADER = os.getenv('QUERY_COUNT_HEADER', 'X-Query-Count')
+EXPOSE_QUERY_COUNT = env_bool('EXPOSE_QUERY_COUNT', default=False)
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', '5'))
+
+# Serve /teams/get and /users/getReview from JSON built by Postgres instead of ORM objects.
+SQL_JSON_READS = env_bool('SQL_JSON_READS', default=True)
+
+# Let concurrent identical /teams/get and /users/getReview requests share one database read.
+SINGLE_FLIGHT_READS = env_bool('SINGLE_FLIGHT_READS', default=True)
+
+# PR events are written to the outbox table with the change and delivered to the sink by a background dispatcher.
+OUTBOX_DISPATCHER = env_bool('OUTBOX_DISPATCHER', default=True)
+OUTBOX_SINK = OutboxSinkKind(os.getenv('OUTBOX_SINK', OutboxSinkKind.LOG.value))
+OUTBOX_FILE_PATH = os.getenv('OUTBOX_FILE_PATH', 'outbox-events.ndjson')
+OUTBOX_WEBHOOK_URL = os.getenv('OUTBOX_WEBHOOK_URL')
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '100'))
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', '1.0'))
+OUTBOX_WEBHOOK_TIMEOUT = float(os.getenv('OUTBOX_WEBHOOK_TIMEOUT', '3.0'))
+# A claimed batch is hidden from other dispatchers this long; it must outlast a send, or events go out twice.
+OUTBOX_LEASE_SECONDS = float(os.getenv('OUTBOX_LEASE_SECONDS', '30'))
+
+# A PR change that loses the optimistic version check is attempted at most this many times, with jittered exponential backoff.
+CONFLICT_RETRY_ATTEMPTS = int(os.getenv('CONFLICT_RETRY_ATTEMPTS', '3'))
+CONFLICT_RETRY_BASE_DELAY = float(os.getenv('CONFLICT_RETRY_BASE_DELAY', '0.01'))
+
+# `python -m src.cli archive-merged` moves PRs merged longer ago than this into the archive tables, in batches.
+ARCHIVE_MERGED_AFTER_DAYS = int(os.getenv('ARCHIVE_MERGED_AFTER_DAYS', '30'))
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', '1000'))
+
+# Export reads each table in windows of this many rows, each in its own transaction, so no transaction lasts the whole export.
+EXPORT_TRANSACTION_ROWS = int(os.getenv('EXPORT_TRANSACTION_ROWS', '50000'))
@@ -1,89 +1,70 @@
-import os
+import asyncio
+import contextlib
+import itertools
+import logging
+import time
 from collections.abc import AsyncIterator
+from dataclasses import replace
+from uuid import uuid4
 
 from fastapi import Request
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
 
+from src.config import DATABASE, READ_YOUR_WRITES_COOKIE, READ_YOUR_WRITES_HEADER, DatabaseSettings
 from src.db.exceptions import DatabaseURLIsNotProvidedError
+from src.db.pool import InstrumentedQueuePool
+from src.db.query_stats import instrument_engine
 
 
-DATABASE_URL = os.getenv('DATABASE_URL', None)
+logger = logging.getLogger(__name__)
+
+DATABASE_URL = DATABASE.url
 if not DATABASE_URL:
     raise DatabaseURLIsNotProvidedError
 
-# engine = create_async_engine(
-#     DATABASE_URL,
-#     poolclass=AsyncAdaptedQueuePool,
-#     pool_pre_ping=True,
-#     pool_size=20
-# )
-# session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
-
-# async def get_db() -> AsyncGenerator[AsyncSession]:
-#     if not session_factory:
-#         raise Exception
-
-#     async with session_factory() as session:
-#         yield session
-
-
-# async def init_db() -> asyncpg.Pool:
-#     engine = create_async_engine(
-#         DATABASE_URL,
-#         pool_size=5,
-#         max_overflow=10,
-#         # echo=True
-#     )
-
-#     return async_sessionmaker(
-#         engine,
-#         expire_on_commit=False,
-#         class_=AsyncSession
-#     ), engine
-# async def init_db() -> asyncpg.Pool:
-#     return asyncpg.create_pool(
-#         dsn=DATABASE_URL,
-#         min_size=1,
-#         max_size=10,
-#         max_inactive_connection_lifetime=300,
-#         command_timeout=60,
-#     )
-
-
-# async def stop_db(engine: AsyncEngine) -> None:
-#     await engine.dispose()
-# async def stop_db(pool) -> None:
-#     await pool.close()
-
-
-# async def get_db_connection(request: Request) -> AsyncIterator[AsyncSession]:
-#     async with request.app.state.db_pool() as session:
-#         try:
-#             yield session
-#             await session.commit()
-#         except Exception:
-#             await session.rollback()
-#             raise
-#         finally:
-#             await session.close()
-# async def get_db_connection(request: Request) -> AsyncIterator[asyncpg.Connection]:
-#     pool = request.app.state.db_pool
-#     async with pool.acquire() as connection:
-#         try:
-#             yield connection
-#         finally:
-#             pass
-
-
-async def init_db() -> tuple[AsyncSession, AsyncEngine]:
-    engine = create_async_engine(
-        DATABASE_URL,
-        echo=True,
-        pool_size=20,
-        max_overflow=40,
-        pool_pre_ping=True,
-        pool_recycle=3600,
-    )
+# request.state flag set when a request commits on the primary; ReadYourWritesMiddleware turns it into a cookie.
+PRIMARY_COMMIT_STATE = 'committed_to_primary'
+REQUEST_STATE_INFO = 'request_state'
+PINNED_TO_PRIMARY_INFO = 'pinned_to_primary'
+
+_replica_turns = itertools.count()
+
+
+@event.listens_for(Session, 'after_commit')
+def _remember_primary_commit(session: Session) -> None:
+    state = session.info.get(REQUEST_STATE_INFO)
+    if state is not None:
+        setattr(state, PRIMARY_COMMIT_STATE, True)
+
+
+def engine_options(settings: DatabaseSettings) -> dict:
+    connect_args = {'prepared_statement_cache_size': settings.statement_cache_size}
+    if settings.pgbouncer:
+        # PgBouncer in transaction mode may hand every transaction a different server
+        # connection, so neither asyncpg nor SQLAlchemy may rely on named prepared statements.
+        connect_args = {
+            'prepared_statement_cache_size': 0,
+            'statement_cache_size': 0,
+            'prepared_statement_name_func': lambda: f'__asyncpg_{uuid4()}__',
+        }
+
+    return {
+        'echo': settings.echo,
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': settings.pool_size,
+        'max_overflow': settings.max_overflow,
+        'pool_timeout': settings.pool_timeout,
+        'pool_recycle': settings.pool_recycle,
+        'pool_pre_ping': settings.pool_pre_ping,
+        'connect_args': connect_args,
+    }
+
+
+async def init_db(settings: DatabaseSettings = DATABASE) -> tuple[AsyncSession, AsyncEngine]:
+    engine = create_async_engine(settings.url, **engine_options(settings))
+    instrument_engine(engine)
 
     session_factory = async_sessionmaker(
         engine,
@@ -93,12 +74,81 @@ async def init_db() -> tuple[AsyncSession, AsyncEngine]:
 
     return session_factory, engine
 
+async def init_replica_dbs(settings: DatabaseSettings = DATABASE) -> list[tuple[AsyncSession, AsyncEngine]]:
+    return [await init_db(replace(settings, url=url)) for url in settings.replica_urls]
+
+async def prewarm_pool(engine: AsyncEngine, connections: int) -> int:
+    '''
+    Заранее открывает до `connections` соединений пула, но не больше его `pool_size`.
+
+    Соединения сразу возвращаются в пул, и первые запросы воркера не ждут
+    установку соединения. Недоступная база не мешает старту: это покажет
+    `/readyz`. Возвращает число открытых соединений.
+    '''
+    connections = min(connections, engine.pool.size())
+    async with contextlib.AsyncExitStack() as stack:
+        results = await asyncio.gather(
+            *(stack.enter_async_context(engine.connect()) for _ in range(connections)),
+            return_exceptions=True,
+        )
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        logger.warning(
+            'Opened %d of %d connections to %s: %s',
+            connections - len(errors), connections, engine.url.render_as_string(hide_password=True), errors[0],
+        )
+    return connections - len(errors)
+
 async def stop_db(engine: AsyncEngine) -> None:
     await engine.dispose()
 
 async def get_db_connection(request: Request) -> AsyncIterator[AsyncSession]:
     async_session = request.app.state.db_pool
     async with async_session() as session:
+        # Lets the after_commit hook pin this client to the primary for its next reads.
+        session.info[REQUEST_STATE_INFO] = request.state
+        try:
+            yield session
+        finally:
+            await session.close()
+
+def _primary_until(value: str | None) -> float:
+    try:
+        return float(value or 0)
+    except ValueError:
+        return 0
+
+def pinned_to_primary(request: Request) -> bool:
+    '''Клиент недавно писал, и реплики могут еще не видеть его изменений; срок берется из cookie или заголовка.'''
+    primary_until = max(
+        _primary_until(request.cookies.get(READ_YOUR_WRITES_COOKIE)),
+        _primary_until(request.headers.get(READ_YOUR_WRITES_HEADER)),
+    )
+    return primary_until > time.time()
+
+def reads_own_writes(session: AsyncSession) -> bool:
+    '''
+    Сессия чтения закреплена за primary после записи этого же клиента.
+
+    Такое чтение нельзя объединять с чужими (single-flight): уже идущий
+    запрос мог начаться до записи клиента.
+    '''
+    return session.info.get(PINNED_TO_PRIMARY_INFO, False)
+
+async def get_read_db_connection(request: Request) -> AsyncIterator[AsyncSession]:
+    '''
+    Сессия для эндпоинтов, которые только читают.
+
+    Реплики выбираются по кругу среди прошедших последнюю проверку
+    `DatabaseHealthCheck`. Без здоровых реплик и для клиента, закрепленного за
+    primary после своей записи (read-your-writes), это обычная сессия primary.
+    '''
+    health_check = request.app.state.db_health
+    replicas = [session_factory for name, session_factory in request.app.state.db_replica_pools.items() if health_check.healthy(name)]
+    pinned = pinned_to_primary(request)
+    async_session = request.app.state.db_pool if not replicas or pinned else replicas[next(_replica_turns) % len(replicas)]
+    async with async_session() as session:
+        session.info[PINNED_TO_PRIMARY_INFO] = pinned
         try:
             yield session
         finally:
@@ -0,0 +1,92 @@
+import asyncio
+import contextlib
+import logging
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.config import READINESS_CHECK_INTERVAL, READINESS_CHECK_TIMEOUT
+from src.metrics import DATABASE_READY
+
+
+logger = logging.getLogger(__name__)
+
+PRIMARY_DATABASE = 'primary'
+
+
+@dataclass(frozen=True)
+class DatabaseStatus:
+    ok: bool
+    checked_at: float
+    error: str | None = None
+
+
+class DatabaseHealthCheck:
+    '''
+    Периодическая проверка баз (primary и реплик) для `/readyz` и выбора реплик.
+
+    Зонды оркестратора читают последний результат и не занимают соединения
+    пула; в базу ходит только эта задача, раз в `interval` секунд. Результат
+    старше трех интервалов считается сбоем: значит, проверка зависла.
+    Готовность воркера зависит только от primary: без реплики чтения идут на
+    primary, а недоступная реплика не должна снимать с трафика все воркеры.
+    '''
+
+    def __init__(
+        self,
+        engines: dict[str, AsyncEngine],
+        interval: float = READINESS_CHECK_INTERVAL,
+        timeout: float = READINESS_CHECK_TIMEOUT,
+    ) -> None:
+        self.engines = engines
+        self.interval = interval
+        self.timeout = timeout
+        self.statuses: dict[str, DatabaseStatus] = {}
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name='database-health-check')
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    def healthy(self, name: str) -> bool:
+        status = self.statuses.get(name)
+        return status is not None and status.ok and status.checked_at >= time.time() - 3 * self.interval
+
+    def ready(self) -> bool:
+        return self.healthy(PRIMARY_DATABASE)
+
+    async def check(self) -> None:
+        results = await asyncio.gather(*(self._check(engine) for engine in self.engines.values()))
+        for name, status in zip(self.engines, results, strict=True):
+            previous = self.statuses.get(name)
+            if not status.ok and (previous is None or previous.ok):
+                logger.warning('Database %s is not ready: %s', name, status.error)
+            self.statuses[name] = status
+            DATABASE_READY.labels(name).set(1 if status.ok else 0)
+
+    async def _check(self, engine: AsyncEngine) -> DatabaseStatus:
+        try:
+            async with asyncio.timeout(self.timeout), engine.connect() as connection:
+                await connection.execute(text('SELECT 1'))
+        except (OSError, SQLAlchemyError, TimeoutError) as e:
+            return DatabaseStatus(ok=False, checked_at=time.time(), error=repr(e))
+        return DatabaseStatus(ok=True, checked_at=time.time())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception:
+                logger.exception('Database health check failed')
@@ -1,6 +1,7 @@
 from datetime import datetime, timezone
 
-from sqlalchemy import Column, DateTime, ForeignKey, String, Table
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Index, String, Table, func, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 from type_defs import PRStatus
@@ -27,12 +28,19 @@ pr_reviewers = Table(
     'pr_reviewers',
     Base.metadata,
     Column('pr_id', String, ForeignKey('pull_requests.id'), primary_key=True),
-    Column('user_id', String, ForeignKey('users.user_id'), primary_key=True)
+    Column('user_id', String, ForeignKey('users.user_id'), primary_key=True),
+    # When the reviewer was put on the PR; user_review_stats.last_assigned_at is the latest of these.
+    Column('assigned_at', DateTime(timezone=True), nullable=False, server_default=func.now()),
+    Index('ix_pr_reviewers_user_id_pr_id', 'user_id', 'pr_id')
 )
 
 
 class User(Base):
     __tablename__ = 'users'
+    __table_args__ = (
+        Index('ix_users_team_name', 'team_name'),
+        Index('ix_users_team_name_active', 'team_name', 'user_id', postgresql_where=text('is_active')),
+    )
 
     user_id: Mapped[str] = mapped_column(primary_key=True)
     username: Mapped[str]
@@ -58,6 +66,11 @@ class User(Base):
 
 class PullRequest(Base):
     __tablename__ = 'pull_requests'
+    __table_args__ = (
+        Index('ix_pull_requests_author_id', 'author_id'),
+        # Merged rows waiting for `archive-merged`, oldest first.
+        Index('ix_pull_requests_merged_at', 'merged_at', postgresql_where=text("status = 'MERGED'")),
+    )
 
     id: Mapped[str] = mapped_column(primary_key=True)
     name: Mapped[str]
@@ -78,5 +91,78 @@ class PullRequest(Base):
         nullable=True,
         default=None
     )
+    # Incremented by every change of the PR or its reviewers; changes are applied only if it is still the version that was read.
+    version: Mapped[int] = mapped_column(default=1, server_default=text('1'))
 
     author: Mapped['User'] = relationship('User', back_populates='pull_requests')
+
+
+pr_reviewers_archive = Table(
+    'pr_reviewers_archive',
+    Base.metadata,
+    Column('pr_id', String, ForeignKey('pull_requests_archive.id'), primary_key=True),
+    Column('user_id', String, ForeignKey('users.user_id'), primary_key=True),
+    Column('assigned_at', DateTime(timezone=True), nullable=False, server_default=func.now()),
+    Index('ix_pr_reviewers_archive_user_id_pr_id', 'user_id', 'pr_id')
+)
+
+
+class ArchivedPullRequest(Base):
+    '''Смерженный PR, перенесенный из pull_requests командой `archive-merged`; строки только читаются.'''
+    __tablename__ = 'pull_requests_archive'
+    __table_args__ = (
+        Index('ix_pull_requests_archive_author_id', 'author_id'),
+    )
+
+    id: Mapped[str] = mapped_column(primary_key=True)
+    name: Mapped[str]
+    author_id: Mapped[str] = mapped_column(ForeignKey('users.user_id'))
+    status: Mapped[PRStatus] = mapped_column(String(6))
+    assigned_reviewers: Mapped[list['User']] = relationship('User', secondary=pr_reviewers_archive, viewonly=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    merged_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+class UserReviewStats(Base):
+    __tablename__ = 'user_review_stats'
+
+    user_id: Mapped[str] = mapped_column(ForeignKey('users.user_id'), primary_key=True)
+    assigned_count: Mapped[int] = mapped_column(default=0, server_default=text('0'))
+    open_count: Mapped[int] = mapped_column(default=0, server_default=text('0'))
+    merged_count: Mapped[int] = mapped_column(default=0, server_default=text('0'))
+    last_assigned_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True, default=None)
+
+
+class TeamReviewStats(Base):
+    __tablename__ = 'team_review_stats'
+
+    team_name: Mapped[str] = mapped_column(ForeignKey('teams.name'), primary_key=True)
+    assigned_count: Mapped[int] = mapped_column(default=0, server_default=text('0'))
+    open_count: Mapped[int] = mapped_column(default=0, server_default=text('0'))
+    merged_count: Mapped[int] = mapped_column(default=0, server_default=text('0'))
+
+
+class ResourceVersion(Base):
+    __tablename__ = 'resource_versions'
+
+    kind: Mapped[str] = mapped_column(primary_key=True)
+    key: Mapped[str] = mapped_column(primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, default=0, server_default=text('0'))
+
+
+class OutboxEvent(Base):
+    __tablename__ = 'outbox_events'
+    __table_args__ = (
+        # Dispatchers claim ready events in id order.
+        Index('ix_outbox_events_available_at_id', 'available_at', 'id'),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    event_type: Mapped[str]
+    aggregate_id: Mapped[str]
+    payload: Mapped[dict] = mapped_column(JSONB)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    available_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    attempts: Mapped[int] = mapped_column(default=0, server_default=text('0'))
+    last_error: Mapped[str | None] = mapped_column(nullable=True)
@@ -0,0 +1,92 @@
+import asyncio
+import contextlib
+import logging
+from collections.abc import Callable, Sequence
+
+import asyncpg
+from sqlalchemy import String, bindparam, func, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_DELAY = 1.0
+
+
+async def notify(db: AsyncSession, channel: str, payloads: Sequence[str]) -> None:
+    '''
+    Ставит NOTIFY в текущую транзакцию.
+
+    Postgres доставит уведомления слушателям только после COMMIT и не доставит
+    их вовсе, если транзакцию откатят.
+    '''
+    if not payloads:
+        return
+
+    payload = func.unnest(bindparam('payloads', list(payloads), type_=ARRAY(String)), type_=String)
+    await db.execute(select(func.pg_notify(channel, payload)))
+
+
+def asyncpg_dsn(database_url: str) -> str:
+    return make_url(database_url).set(drivername='postgresql').render_as_string(hide_password=False)
+
+
+class NotificationListener:
+    '''
+    Слушает канал Postgres на отдельном asyncpg-соединении вне пула.
+
+    Соединение переподключается в фоне. `on_connect` вызывается, когда LISTEN
+    уже активен, `on_disconnect` - при потере соединения: уведомления за время
+    простоя теряются, и подписчик должен сам сбросить зависящее от них состояние.
+    '''
+
+    def __init__(
+        self,
+        database_url: str,
+        channel: str,
+        on_notify: Callable[[str], None],
+        on_connect: Callable[[], None] = lambda: None,
+        on_disconnect: Callable[[], None] = lambda: None,
+    ) -> None:
+        self.dsn = asyncpg_dsn(database_url)
+        self.channel = channel
+        self.on_notify = on_notify
+        self.on_connect = on_connect
+        self.on_disconnect = on_disconnect
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name=f'listen:{self.channel}')
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    def _handle(self, _connection: object, _pid: int, _channel: str, payload: str) -> None:
+        self.on_notify(payload)
+
+    async def _run(self) -> None:
+        while True:
+            connection = None
+            closed = asyncio.Event()
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                connection.add_termination_listener(lambda _connection, closed=closed: closed.set())
+                await connection.add_listener(self.channel, self._handle)
+                self.on_connect()
+                await closed.wait()
+                logger.warning('Lost LISTEN connection for channel %s, reconnecting', self.channel)
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                logger.warning('Cannot LISTEN on channel %s: %s', self.channel, e)
+            finally:
+                self.on_disconnect()
+                if connection is not None and not connection.is_closed():
+                    connection.terminate()
+            await asyncio.sleep(RECONNECT_DELAY)
@@ -0,0 +1,65 @@
+import time
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry
+
+
+RECENT_WAITS = 1024
+
+# QueuePool._do_get calls itself again after losing a race for an overflow slot;
+# only the outermost call is a checkout worth timing.
+_in_checkout: ContextVar[bool] = ContextVar('_in_checkout', default=False)
+
+
+@dataclass
+class PoolWaitStats:
+    checkouts: int = 0
+    timeouts: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    recent_waits: deque[float] = field(default_factory=lambda: deque(maxlen=RECENT_WAITS))
+
+    def record(self, wait: float) -> None:
+        self.checkouts += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.recent_waits.append(wait)
+
+    def percentile(self, q: float) -> float:
+        waits = sorted(self.recent_waits)
+        if not waits:
+            return 0.0
+        return waits[min(len(waits) - 1, int(q / 100 * len(waits)))]
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    '''
+    AsyncAdaptedQueuePool, который замеряет время получения соединения.
+
+    Время включает ожидание свободного соединения и открытие нового в пределах
+    overflow, то есть ровно то, сколько запрос простоял перед первым SQL.
+    '''
+
+    def __init__(self, *args: object, **kwargs: object) -> None:
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        if _in_checkout.get():
+            return super()._do_get()
+
+        token = _in_checkout.set(True)
+        started = time.perf_counter()
+        try:
+            entry = super()._do_get()
+        except exc.TimeoutError:
+            self.wait_stats.timeouts += 1
+            raise
+        finally:
+            _in_checkout.reset(token)
+
+        self.wait_stats.record(time.perf_counter() - started)
+        return entry
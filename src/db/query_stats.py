@@ -0,0 +1,96 @@
+import time
+from collections import Counter
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+QueryObserver = Callable[[str, float], None]
+
+
+@dataclass
+class QueryStats:
+    queries: int = 0
+    sql_time: float = 0.0
+    statements: Counter[str] = field(default_factory=Counter)
+    # Times the request ran its transaction; a retry after a version conflict repeats the same statements.
+    attempts: int = 1
+
+    def repeated_statements(self, threshold: int) -> list[tuple[str, int]]:
+        '''Одинаковые SQL, выполненные не меньше `threshold` раз: типичный признак N+1.'''
+        return [(statement, count) for statement, count in self.statements.most_common() if count >= threshold]
+
+
+# SQLAlchemy runs cursor events in a greenlet that shares the caller's context,
+# so the stats object set by the caller is visible to the listeners below.
+_current: ContextVar[QueryStats | None] = ContextVar('query_stats', default=None)
+_observers: list[QueryObserver] = []
+
+
+def current_query_stats() -> QueryStats | None:
+    return _current.get()
+
+
+@contextmanager
+def track_queries(reset: bool = False) -> Iterator[QueryStats]:
+    '''
+    Считает SQL-запросы в текущем контексте; вложенные вызовы пишут в те же счетчики.
+
+    С `reset=True` счетчики всегда новые. Так начинается HTTP-запрос: после
+    чтения большого тела uvicorn может выполнить следующий запрос того же
+    соединения в контексте предыдущего, и без сброса его запросы посчитались бы
+    дважды.
+    '''
+    stats = _current.get()
+    if stats is not None and not reset:
+        yield stats
+        return
+
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def add_query_observer(observer: QueryObserver) -> None:
+    '''Регистрирует колбэк (statement, duration), вызываемый после каждого запроса.'''
+    _observers.append(observer)
+
+
+def _before_cursor_execute(conn: Connection, *_args: object) -> None:
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def record_query(statement: str, duration: float) -> None:
+    '''Учитывает выполненный запрос; запросы в обход движка (напрямую через драйвер) передают его сами.'''
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.sql_time += duration
+        stats.statements[statement] += 1
+    for observer in _observers:
+        observer(statement, duration)
+
+
+def _after_cursor_execute(conn: Connection, _cursor: object, statement: str, *_args: object) -> None:
+    record_query(statement, time.perf_counter() - conn.info['query_started'].pop())
+
+
+def _handle_error(context: object) -> None:
+    started = context.connection.info.get('query_started') if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    sync_engine = engine.sync_engine
+    event.listen(sync_engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(sync_engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(sync_engine, 'handle_error', _handle_error)
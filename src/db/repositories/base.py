@@ -1,87 +1,137 @@
-from typing import Generic, TypeVar
+import functools
+from typing import ClassVar, Generic, TypeVar
 from abc import ABC
+from collections.abc import Callable, Sequence
 
-from sqlalchemy import inspect, select, update
-from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import Executable, any_, bindparam, func, insert, inspect, select, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import QueryableAttribute, joinedload
 
+from src.config import UPSERT_CHUNK_SIZE
 from src.db.models import Base
 
 
 ModelType = TypeVar('ModelType', bound=Base)
 
 
+@functools.cache
+def conflict_columns(model: type[Base]) -> tuple[str, ...]:
+    '''Колонки, по которым upsert модели ловит конфликт: первичный ключ и unique.'''
+    return tuple(col.name for col in inspect(model).columns if col.unique or col.primary_key)
+
+
+def _join_key(join_: Sequence[QueryableAttribute]) -> tuple[str, ...]:
+    return tuple(attr.key for attr in join_)
+
+
 class BaseRepository(ABC, Generic[ModelType]):
     model: type[ModelType]
 
+    # Statement templates by model and query shape. Values go in as bind parameters,
+    # so one template keeps one cache key, one compiled form and, per connection,
+    # one asyncpg prepared statement however many different values it is run with.
+    _statements: ClassVar[dict[tuple, Executable]] = {}
+
     def __init__(self, db: AsyncSession) -> None:
         self.db = db
 
-    async def get_where(self, *conditions: list, join_: list | None = None) -> ModelType:
-        if not conditions:
-            return None
+    def _statement(self, shape: tuple, build: Callable[[], Executable]) -> Executable:
+        key = (self.model, *shape)
+        stmt = self._statements.get(key)
+        if stmt is None:
+            stmt = self._statements.setdefault(key, build())
+        return stmt
 
-        stmt = select(self.model) \
-            .where(*conditions)
-        if join_ is not None:
+    def _select_where(self, conditions: list, join_: Sequence[QueryableAttribute]) -> Executable:
+        stmt = select(self.model).where(*conditions)
+        if join_:
             stmt = stmt.options(joinedload(*join_))
-        result = await self.db.execute(stmt)
+        return stmt
+
+    async def get_by(self, join_: Sequence[QueryableAttribute] = (), **values: object) -> ModelType | None:
+        '''Строка, у которой колонки равны `values`; запрос строится один раз на набор колонок.'''
+        stmt = self._statement(
+            ('get_by', tuple(values), _join_key(join_)),
+            lambda: self._select_where([getattr(self.model, name) == bindparam(name) for name in values], join_),
+        )
+        result = await self.db.execute(stmt, values)
         return result.unique().scalar_one_or_none()
 
-    async def list_where(self, *conditions: list, join_: list | None = None) -> list[ModelType]:
-        if not conditions:
-            return await self.get_all()
-
-        stmt = select(self.model) \
-            .where(*conditions)
-        if join_ is not None:
-            stmt = stmt.options(joinedload(*join_))
-        result = await self.db.execute(stmt)
-        return result.unique().scalars().all()
+    async def list_in(self, column: str, values: Sequence, join_: Sequence[QueryableAttribute] = ()) -> list[ModelType]:
+        '''
+        Строки, у которых `column` входит в `values`.
 
-    async def get_all(self, join_: list | None = None) -> list[ModelType]:
-        if join_ is None:
-            join_ = []
+        Значения передаются одним массивом (`= ANY($1)`), а не через IN с
+        параметром на элемент, поэтому текст запроса не зависит от их числа.
+        '''
+        if not values:
+            return []
 
-        stmt = select(self.model) \
-            .options(joinedload(*join_))
-        result = await self.db.execute(stmt)
-        return result.scalars().all()
+        attr = getattr(self.model, column)
+        stmt = self._statement(
+            ('list_in', column, _join_key(join_)),
+            lambda: self._select_where([attr == any_(bindparam(column, type_=ARRAY(attr.type)))], join_),
+        )
+        result = await self.db.execute(stmt, {column: list(values)})
+        return list(result.unique().scalars().all())
 
     async def create(self, **kwargs: dict) -> ModelType:
-        stmt = insert(self.model).values(**kwargs).returning(self.model)
-        result = await self.db.execute(stmt)
-        return result.scalar_one()
-
-    async def update_one(self, *where_cond: list, **update_fields: dict) -> ModelType:
-        stmt = update(self.model).where(*where_cond).values(**update_fields).returning(self.model)
-        result = await self.db.execute(stmt)
+        # Core insert(): the postgresql dialect's Insert is not cacheable at all.
+        stmt = self._statement(
+            ('create', tuple(kwargs)),
+            lambda: insert(self.model).values({name: bindparam(name) for name in kwargs}).returning(self.model),
+        )
+        result = await self.db.execute(stmt, kwargs)
         return result.scalar_one()
 
-    async def update(self, *where_cond: list, **update_fields: dict) -> list[ModelType]:
-        stmt = update(self.model).where(*where_cond).values(**update_fields)
-        result = await self.db.execute(stmt)
-        return result.scalars().all()
-
-    async def upsert(self, instances: list[dict]) -> list[ModelType]:
+    async def update_one_by(self, key: dict[str, object], **update_fields: dict) -> ModelType | None:
+        '''UPDATE ... RETURNING одной строки, найденной по равенству колонок `key`; None, если строки нет.'''
+        stmt = self._statement(
+            ('update_one_by', tuple(key), tuple(update_fields)),
+            lambda: update(self.model)
+            .where(*[getattr(self.model, name) == bindparam(f'key_{name}') for name in key])
+            .values({name: bindparam(name) for name in update_fields})
+            .returning(self.model),
+        )
+        params = {f'key_{name}': value for name, value in key.items()}
+        result = await self.db.execute(stmt, {**params, **update_fields})
+        return result.scalar_one_or_none()
+
+    async def upsert(self, instances: list[dict], chunk_size: int = UPSERT_CHUNK_SIZE) -> list[ModelType]:
+        '''
+        INSERT ... ON CONFLICT DO UPDATE для пачки строк.
+
+        Каждая колонка уходит одним массивом и разворачивается через unnest, так
+        что параметров столько же, сколько колонок, при любом числе строк, а текст
+        SQL не меняется. Пачки больше `chunk_size` строк отправляются частями.
+        '''
         if not instances:
             return []
 
-        conflict_columns = [
-            col.name
-            for col in inspect(self.model).columns
-            if col.unique or col.primary_key
-        ]
-
-        stmt = insert(self.model).values(instances)
-        stmt = stmt.on_conflict_do_update(
-            index_elements=conflict_columns,
+        fields = list(instances[0])
+        upserted = []
+        for start in range(0, len(instances), chunk_size):
+            chunk = instances[start:start + chunk_size]
+            result = await self.db.execute(self._upsert_statement(fields, chunk))
+            upserted.extend(result.scalars().all())
+        return upserted
+
+    def _upsert_statement(self, fields: list[str], rows: list[dict]) -> Executable:
+        columns = self.model.__table__.c
+        source = select(*[
+            func.unnest(
+                bindparam(field, [row[field] for row in rows], type_=ARRAY(columns[field].type)),
+                type_=columns[field].type,
+            ).label(field)
+            for field in fields
+        ])
+        stmt = postgresql.insert(self.model).from_select(fields, source)
+        return stmt.on_conflict_do_update(
+            index_elements=conflict_columns(self.model),
             set_={
                 field: getattr(stmt.excluded, field)
-                for field in instances[0]
+                for field in fields
             }
         ).returning(self.model)
-
-        result = await self.db.execute(stmt)
-        return result.scalars().all()
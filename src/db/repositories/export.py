@@ -0,0 +1,68 @@
+from collections.abc import AsyncIterator, Sequence
+
+from sqlalchemy import Row, Subquery, select, tuple_, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.models import ArchivedPullRequest, PullRequest, Team, User, pr_reviewers, pr_reviewers_archive
+from src.type_defs import ExportDataset
+
+
+EXPORT_CHUNK_SIZE = 1000
+
+# Unique sort key of every dataset; windows continue after the key of the last exported row.
+EXPORT_KEYS = {
+    ExportDataset.TEAMS: ('name',),
+    ExportDataset.USERS: ('user_id',),
+    ExportDataset.PULL_REQUESTS: ('id',),
+    ExportDataset.PR_REVIEWERS: ('pr_id', 'user_id'),
+}
+
+
+def _rows(dataset: ExportDataset) -> Subquery:
+    if dataset is ExportDataset.TEAMS:
+        return select(Team.name).subquery('teams')
+    if dataset is ExportDataset.USERS:
+        return select(User.user_id, User.username, User.is_active, User.team_name).subquery('users')
+    if dataset is ExportDataset.PULL_REQUESTS:
+        return union_all(*(
+            select(pr.id, pr.name, pr.author_id, pr.status, pr.created_at, pr.merged_at)
+            for pr in (PullRequest, ArchivedPullRequest)
+        )).subquery('pull_requests')
+    return union_all(*(
+        select(reviewers.c.pr_id, reviewers.c.user_id)
+        for reviewers in (pr_reviewers, pr_reviewers_archive)
+    )).subquery('pr_reviewers')
+
+
+class ExportRepository:
+    '''
+    Чтение таблиц целиком для выгрузки.
+
+    PR и назначения ревьюверов отдаются вместе с архивом. Строки идут по
+    уникальному ключу через серверный курсор пачками по `EXPORT_CHUNK_SIZE`,
+    так что в памяти процесса одновременно только одна пачка.
+    '''
+
+    def __init__(self, db: AsyncSession) -> None:
+        self.db = db
+
+    @staticmethod
+    def columns(dataset: ExportDataset) -> list[str]:
+        return list(_rows(dataset).c.keys())
+
+    async def stream(
+        self,
+        dataset: ExportDataset,
+        limit: int,
+        after: tuple | None = None,
+    ) -> AsyncIterator[Sequence[Row]]:
+        '''До `limit` строк набора с ключом больше `after`, пачками по `EXPORT_CHUNK_SIZE`.'''
+        rows = _rows(dataset)
+        key = [rows.c[name] for name in EXPORT_KEYS[dataset]]
+        stmt = select(rows).order_by(*key).limit(limit)
+        if after is not None:
+            stmt = stmt.where(tuple_(*key) > tuple_(*after))
+
+        result = await self.db.stream(stmt.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+        async for chunk in result.partitions():
+            yield chunk
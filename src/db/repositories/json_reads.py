@@ -0,0 +1,118 @@
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+from asyncpg import Record
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.query_stats import record_query
+
+
+TEAM_JSON_SQL = '''
+SELECT json_build_object(
+    'name', t.name,
+    'members', coalesce(
+        (
+            SELECT json_agg(
+                json_build_object('user_id', u.user_id, 'username', u.username, 'is_active', u.is_active)
+                ORDER BY u.user_id
+            )
+            FROM users AS u
+            WHERE u.team_name = t.name
+        ),
+        '[]'
+    )
+)::text
+FROM teams AS t
+WHERE t.name = $1
+'''
+
+_REVIEWS_PAGE_SQL = '''
+WITH page AS (
+    SELECT latest.*, row_number() OVER (ORDER BY latest.created_at DESC, latest.id DESC) AS position
+    FROM (
+        (
+            SELECT pr.id, pr.name, pr.author_id, pr.status, pr.created_at
+            FROM pull_requests AS pr
+            JOIN pr_reviewers AS r ON r.pr_id = pr.id
+            WHERE r.user_id = $1 {after}
+            ORDER BY pr.created_at DESC, pr.id DESC
+            LIMIT $2 + 1
+        )
+        UNION ALL
+        (
+            SELECT pr.id, pr.name, pr.author_id, pr.status, pr.created_at
+            FROM pull_requests_archive AS pr
+            JOIN pr_reviewers_archive AS r ON r.pr_id = pr.id
+            WHERE r.user_id = $1 {after}
+            ORDER BY pr.created_at DESC, pr.id DESC
+            LIMIT $2 + 1
+        )
+        ORDER BY created_at DESC, id DESC
+        LIMIT $2 + 1
+    ) AS latest
+)
+SELECT
+    coalesce(
+        json_agg(
+            json_build_object(
+                'pull_request_id', id, 'pull_request_name', name, 'author_id', author_id, 'status', status
+            )
+            ORDER BY position
+        ) FILTER (WHERE position <= $2),
+        '[]'
+    )::text AS pull_requests,
+    count(*) > $2 AS has_more,
+    max(created_at) FILTER (WHERE position = $2) AS last_created_at,
+    max(id) FILTER (WHERE position = $2) AS last_id
+FROM page
+'''
+REVIEWS_FIRST_PAGE_SQL = _REVIEWS_PAGE_SQL.format(after='')
+REVIEWS_NEXT_PAGE_SQL = _REVIEWS_PAGE_SQL.format(after='AND (pr.created_at, pr.id) < ($3, $4)')
+
+
+@dataclass
+class ReviewsPageJson:
+    pull_requests: str
+    last_key: tuple[datetime, str] | None
+
+
+class JsonReadRepository:
+    '''
+    Чтения, для которых Postgres сам собирает JSON ответа.
+
+    Запросы идут напрямую через соединение asyncpg текущей сессии: без ORM,
+    без Pydantic и без разбора результата SQLAlchemy. Форма JSON совпадает
+    со схемами API, это проверяет `scripts/check_json_reads.py`.
+    '''
+
+    def __init__(self, db: AsyncSession) -> None:
+        self.db = db
+
+    async def _fetchrow(self, sql: str, *args: object) -> Record | None:
+        connection = await self.db.connection()
+        raw_connection = await connection.get_raw_connection()
+        started = time.perf_counter()
+        try:
+            return await raw_connection.driver_connection.fetchrow(sql, *args)
+        finally:
+            record_query(sql, time.perf_counter() - started)
+
+    async def team(self, team_name: str) -> str | None:
+        '''Команда с участниками в форме TeamSchema или None, если команды нет.'''
+        row = await self._fetchrow(TEAM_JSON_SQL, team_name)
+        return row[0] if row is not None else None
+
+    async def reviews_page(self, user_id: str, limit: int, after: tuple[datetime, str] | None = None) -> ReviewsPageJson:
+        '''
+        Страница PR на ревью пользователя - JSON-массив PullRequestShortSchema.
+
+        Порядок и keyset-пагинация те же, что у `PullRequestRepository.list_reviews_page`;
+        `last_key` заполнен, только если есть следующая страница.
+        '''
+        if after is None:
+            row = await self._fetchrow(REVIEWS_FIRST_PAGE_SQL, user_id, limit)
+        else:
+            row = await self._fetchrow(REVIEWS_NEXT_PAGE_SQL, user_id, limit, *after)
+        last_key = (row['last_created_at'], row['last_id']) if row['has_more'] else None
+        return ReviewsPageJson(pull_requests=row['pull_requests'], last_key=last_key)
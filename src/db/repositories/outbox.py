@@ -0,0 +1,71 @@
+from collections.abc import Iterable, Sequence
+
+from sqlalchemy import BigInteger, any_, bindparam, delete, func, literal_column, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from src.db.models import OutboxEvent
+
+from .base import BaseRepository
+
+
+MAX_RETRY_DELAY_SECONDS = 300
+
+
+class OutboxRepository(BaseRepository[OutboxEvent]):
+    model = OutboxEvent
+
+    async def add(self, events: Iterable[dict]) -> None:
+        '''Записывает события в outbox в текущей транзакции: они уйдут, только если она зафиксируется.'''
+        events = list(events)
+        if not events:
+            return
+        # The table insert skips the ORM bulk-insert bookkeeping, which is most of the Python cost of a large batch.
+        await self.db.execute(OutboxEvent.__table__.insert(), events)
+
+    async def claim(self, limit: int, lease_seconds: float) -> list[OutboxEvent]:
+        '''
+        Берет в аренду до `limit` готовых к отправке событий в порядке записи.
+
+        События сразу становятся недоступными на `lease_seconds` и получают
+        `attempts + 1`; после фиксации этой короткой транзакции их можно
+        отправлять без блокировок и без занятого соединения. Строки, занятые
+        другими диспетчерами, пропускаются (SKIP LOCKED), а если диспетчер
+        упал посреди отправки, события снова станут доступны после аренды.
+        '''
+        ready = select(OutboxEvent.id) \
+            .where(OutboxEvent.available_at <= func.now()) \
+            .order_by(OutboxEvent.id) \
+            .limit(limit) \
+            .with_for_update(skip_locked=True) \
+            .cte('ready')
+        # A CTE is evaluated once; inside `IN (...)` the LIMIT ... SKIP LOCKED subquery may be rescanned and claim more rows.
+        stmt = update(OutboxEvent) \
+            .where(OutboxEvent.id.in_(select(ready.c.id))) \
+            .values(
+                attempts=OutboxEvent.attempts + 1,
+                available_at=func.now() + literal_column("interval '1 second'") * lease_seconds,
+            ) \
+            .returning(OutboxEvent) \
+            .execution_options(synchronize_session=False)
+        result = await self.db.execute(stmt)
+        return sorted(result.scalars().all(), key=lambda event: event.id)
+
+    async def delete(self, ids: Sequence[int]) -> None:
+        stmt = delete(OutboxEvent).where(OutboxEvent.id == any_(bindparam('ids', list(ids), type_=ARRAY(BigInteger))))
+        await self.db.execute(stmt)
+
+    async def postpone(self, ids: Sequence[int], error: str) -> None:
+        '''
+        Откладывает неотправленные события с экспоненциальной задержкой: 1, 2, 4... секунд, не больше 5 минут.
+
+        `attempts` уже увеличен в `claim`, поэтому первая неудача дает задержку в 1 секунду.
+        '''
+        delay = func.least(func.power(2, OutboxEvent.attempts - 1), MAX_RETRY_DELAY_SECONDS)
+        stmt = update(OutboxEvent) \
+            .where(OutboxEvent.id == any_(bindparam('ids', list(ids), type_=ARRAY(BigInteger)))) \
+            .values(
+                last_error=error,
+                available_at=func.now() + literal_column("interval '1 second'") * delay,
+            ) \
+            .execution_options(synchronize_session=False)
+        await self.db.execute(stmt)
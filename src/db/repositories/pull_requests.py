@@ -1,7 +1,385 @@
-from src.db.models import PullRequest
+from collections.abc import AsyncIterator, Sequence
+from datetime import datetime
+
+from sqlalchemy import (
+    Integer,
+    Row,
+    Select,
+    String,
+    and_,
+    any_,
+    bindparam,
+    delete,
+    exists,
+    func,
+    select,
+    text,
+    true,
+    tuple_,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.orm import aliased, joinedload
+
+from src.db.models import ArchivedPullRequest, PullRequest, User, pr_reviewers, pr_reviewers_archive
+from src.type_defs import PRStatus
 
 from .base import BaseRepository
+from .users import ReviewerOrdering, review_load
+
+
+REVIEW_STREAM_CHUNK_SIZE = 500
+
+# Moves a batch of old merged PRs with their reviewers into the archive tables in one statement.
+# Foreign keys are checked at the end of the statement, when both pairs of tables are consistent again.
+ARCHIVE_MERGED_SQL = '''
+WITH batch AS (
+    SELECT id
+    FROM pull_requests
+    WHERE status = 'MERGED' AND merged_at < :merged_before
+    ORDER BY merged_at
+    LIMIT :limit
+    FOR UPDATE SKIP LOCKED
+),
+moved_reviewers AS (
+    DELETE FROM pr_reviewers AS r
+    USING batch
+    WHERE r.pr_id = batch.id
+    RETURNING r.pr_id, r.user_id, r.assigned_at
+),
+moved AS (
+    DELETE FROM pull_requests AS p
+    USING batch
+    WHERE p.id = batch.id
+    RETURNING p.id, p.name, p.author_id, p.status, p.created_at, p.merged_at
+),
+archived_reviewers AS (
+    INSERT INTO pr_reviewers_archive (pr_id, user_id, assigned_at)
+    SELECT pr_id, user_id, assigned_at FROM moved_reviewers
+),
+archived AS (
+    INSERT INTO pull_requests_archive (id, name, author_id, status, created_at, merged_at)
+    SELECT id, name, author_id, status, created_at, merged_at FROM moved
+    RETURNING id
+)
+SELECT count(*) FROM archived
+'''
 
 
 class PullRequestRepository(BaseRepository[PullRequest]):
     model = PullRequest
+
+    @staticmethod
+    def _reviews_of(user_id: str, after: tuple[datetime, str] | None = None, limit: int | None = None) -> Select:
+        '''
+        PR, на которые назначен пользователь, от новых к старым, включая архив.
+
+        Условие `after` и `limit` применяются и к каждой из двух частей, чтобы
+        каждая отдавала не больше страницы.
+        '''
+        parts = []
+        for pr, reviewers in ((PullRequest, pr_reviewers), (ArchivedPullRequest, pr_reviewers_archive)):
+            part = select(pr.id, pr.name, pr.author_id, pr.status, pr.created_at) \
+                .join(reviewers, reviewers.c.pr_id == pr.id) \
+                .where(reviewers.c.user_id == user_id)
+            if after is not None:
+                part = part.where(tuple_(pr.created_at, pr.id) < tuple_(*after))
+            if limit is not None:
+                part = part.order_by(pr.created_at.desc(), pr.id.desc()).limit(limit)
+            parts.append(part)
+
+        reviews = union_all(*parts).subquery('reviews')
+        stmt = select(reviews).order_by(reviews.c.created_at.desc(), reviews.c.id.desc())
+        return stmt.limit(limit) if limit is not None else stmt
+
+    async def list_reviews_page(
+        self,
+        user_id: str,
+        limit: int,
+        after: tuple[datetime, str] | None = None,
+    ) -> Sequence[Row]:
+        '''
+        Страница PR, на которые назначен пользователь, от новых к старым.
+
+        Keyset-пагинация по (created_at, id): `after` - ключ последней строки
+        предыдущей страницы.
+        '''
+        result = await self.db.execute(self._reviews_of(user_id, after, limit))
+        return result.all()
+
+    async def stream_reviews(self, user_id: str) -> AsyncIterator[Row]:
+        '''Все PR, на которые назначен пользователь, через серверный курсор.'''
+        result = await self.db.stream(self._reviews_of(user_id).execution_options(yield_per=REVIEW_STREAM_CHUNK_SIZE))
+        async for row in result:
+            yield row
+
+    async def get_archived(self, pr_id: str) -> ArchivedPullRequest | None:
+        '''PR из архива; нужен, только когда среди горячих PR такого id нет.'''
+        stmt = self._statement(
+            ('get_archived',),
+            lambda: select(ArchivedPullRequest)
+            .where(ArchivedPullRequest.id == bindparam('pr_id'))
+            .options(joinedload(ArchivedPullRequest.assigned_reviewers)),
+        )
+        result = await self.db.execute(stmt, {'pr_id': pr_id})
+        return result.unique().scalar_one_or_none()
+
+    async def is_archived(self, pr_id: str) -> bool:
+        stmt = self._statement(
+            ('is_archived',),
+            lambda: select(exists().where(ArchivedPullRequest.id == bindparam('pr_id'))),
+        )
+        return await self.db.scalar(stmt, {'pr_id': pr_id})
+
+    async def create_unless_archived(self, **values: object) -> bool:
+        '''
+        Вставляет PR, если его id не занят архивным PR; проверка идет в том же INSERT.
+
+        Возвращает, вставлен ли PR. Проверка - один поиск по первичному ключу
+        архива, так что вставка не замедляется с ростом истории.
+        '''
+        columns = PullRequest.__table__.c
+        stmt = self._statement(
+            ('create_unless_archived', tuple(values)),
+            # A Core insert into the table: the ORM would treat INSERT ... SELECT with parameters as a bulk insert.
+            lambda: PullRequest.__table__.insert().from_select(
+                list(values),
+                select(*[bindparam(name, type_=columns[name].type) for name in values])
+                .where(~exists().where(ArchivedPullRequest.id == bindparam('id', type_=String))),
+            ).returning(PullRequest.id),
+        )
+        result = await self.db.execute(stmt, values)
+        return result.scalar_one_or_none() is not None
+
+    async def archive_merged(self, merged_before: datetime, limit: int) -> int:
+        '''
+        Переносит до `limit` PR, слитых раньше `merged_before`, в архивные таблицы.
+
+        Строки пачки берутся FOR UPDATE SKIP LOCKED, поэтому параллельный
+        перенос и запросы к самим PR не ждут друг друга. Возвращает число
+        перенесенных PR.
+        '''
+        result = await self.db.execute(text(ARCHIVE_MERGED_SQL), {'merged_before': merged_before, 'limit': limit})
+        return result.scalar_one()
+
+    async def update_if_version(self, pr_id: str, version: int, **values: object) -> bool:
+        '''
+        Меняет `values` и увеличивает версию PR, только если она все еще `version`.
+
+        Версия проверяется в самом UPDATE, строка блокируется только с этого
+        момента до конца транзакции. False значит, что PR успел изменить (или
+        перенести в архив) параллельный запрос.
+        '''
+        stmt = update(PullRequest) \
+            .where(PullRequest.id == pr_id, PullRequest.version == version) \
+            .values(version=PullRequest.version + 1, **values) \
+            .returning(PullRequest.version)
+        result = await self.db.execute(stmt)
+        return result.scalar_one_or_none() is not None
+
+    async def swap_reviewer(
+        self,
+        pr_id: str,
+        author_id: str,
+        old_reviewer_id: str,
+        ordering: ReviewerOrdering,
+    ) -> str | None:
+        '''
+        Одним UPDATE заменяет ревьювера на лучшего по стратегии кандидата из его команды.
+
+        Кандидат активен, не автор PR и еще не назначен на него. Возвращает
+        user_id замены или None, если ревьювер не назначен или заменить некем.
+        '''
+        reviewer = aliased(User)
+        candidate = aliased(User)
+        current = pr_reviewers.alias('current_reviewers')
+        replacement = (
+            select(candidate.user_id)
+            .where(
+                candidate.team_name == select(reviewer.team_name).where(reviewer.user_id == old_reviewer_id).scalar_subquery(),
+                candidate.is_active.is_(True),
+                candidate.user_id != author_id,
+                ~exists().where(current.c.pr_id == pr_id, current.c.user_id == candidate.user_id),
+            )
+            .order_by(*ordering(review_load(candidate.user_id)))
+            .limit(1)
+            .cte('replacement')
+        )
+
+        # The replacement is never a current reviewer, so the last condition only ties the
+        # single-row CTE to the updated row instead of leaving a bare cartesian product.
+        stmt = update(pr_reviewers) \
+            .where(
+                pr_reviewers.c.pr_id == pr_id,
+                pr_reviewers.c.user_id == old_reviewer_id,
+                pr_reviewers.c.user_id != replacement.c.user_id,
+            ) \
+            .values(user_id=replacement.c.user_id, assigned_at=func.now()) \
+            .returning(pr_reviewers.c.user_id)
+        result = await self.db.execute(stmt)
+        return result.scalar_one_or_none()
+
+    async def create_many(self, instances: list[dict]) -> list[PullRequest]:
+        '''
+        Вставляет PR одним INSERT ... SELECT из массивов значений.
+
+        Id, уже занятые горячими или архивными PR, пропускаются и не попадают
+        в результат.
+        '''
+        if not instances:
+            return []
+
+        rows = select(
+            *(
+                func.unnest(bindparam(name, [instance[name] for instance in instances], type_=ARRAY(String)), type_=String).label(name)
+                for name in ('id', 'name', 'author_id')
+            ),
+        ).subquery('rows')
+        stmt = insert(PullRequest) \
+            .from_select(
+                ['id', 'name', 'author_id'],
+                select(rows).where(~exists().where(ArchivedPullRequest.id == rows.c.id)),
+            ) \
+            .on_conflict_do_nothing(index_elements=[PullRequest.id]) \
+            .returning(PullRequest)
+        result = await self.db.execute(stmt)
+        return list(result.scalars().all())
+
+    async def fill_reviewer_slots(
+        self,
+        pr_ids: list[str],
+        slots: list[int],
+        ordering: ReviewerOrdering,
+    ) -> list[tuple[str, str]]:
+        '''
+        Назначает ревьюверов сразу на пачку открытых PR одним INSERT ... SELECT.
+
+        Для каждого PR из `pr_ids` добавляется до `slots[i]` активных участников
+        команды автора, которые еще не назначены на этот PR. Кандидаты команды
+        ранжируются стратегией один раз, после чего PR внутри команды разбирают
+        их по кругу со сдвигом, поэтому нагрузка распределяется и внутри пачки.
+        Возвращает добавленные пары (pr_id, user_id).
+        '''
+        if not pr_ids:
+            return []
+
+        batch = select(
+            func.unnest(bindparam('pr_ids', pr_ids, type_=ARRAY(String)), type_=String).label('pr_id'),
+            func.unnest(bindparam('slots', slots, type_=ARRAY(Integer)), type_=Integer).label('slots'),
+        ).cte('batch')
+
+        author = aliased(User)
+        current = pr_reviewers.alias('current_reviewers')
+        targets = (
+            select(
+                batch.c.pr_id,
+                batch.c.slots,
+                PullRequest.author_id,
+                author.team_name,
+                (
+                    func.sum(batch.c.slots).over(partition_by=author.team_name, order_by=batch.c.pr_id) - batch.c.slots
+                ).label('offset'),
+                (
+                    select(func.count()).where(current.c.pr_id == batch.c.pr_id).scalar_subquery() + 1
+                ).label('reserved'),
+            )
+            .join(PullRequest, PullRequest.id == batch.c.pr_id)
+            .join(author, author.user_id == PullRequest.author_id)
+            .where(PullRequest.status == PRStatus.OPEN)
+            .cte('targets')
+        )
+
+        # Rank each target team's roster separately so the lookup goes through the (team_name, user_id) index.
+        target_teams = select(targets.c.team_name).distinct().cte('target_teams')
+        candidate = aliased(User)
+        roster = (
+            select(
+                candidate.user_id,
+                (func.row_number().over(order_by=ordering(review_load(candidate.user_id))) - 1).label('rank'),
+            )
+            .where(candidate.team_name == target_teams.c.team_name, candidate.is_active.is_(True))
+            .lateral('roster')
+        )
+        candidates = (
+            select(roster.c.user_id, target_teams.c.team_name, roster.c.rank)
+            .select_from(target_teams)
+            .join(roster, true())
+            .cte('candidates')
+        )
+        team_sizes = select(candidates.c.team_name, func.count().label('size')) \
+            .group_by(candidates.c.team_name) \
+            .cte('team_sizes')
+
+        # Each PR walks the ranked roster starting at its offset. It only needs `slots`
+        # candidates plus room for the ones it must skip (author and current reviewers),
+        # so the join stays linear in the batch size instead of batch x team size.
+        step = func.generate_series(
+            0,
+            func.least(team_sizes.c.size, targets.c.slots + targets.c.reserved) - 1,
+        ).table_valued('value').render_derived(name='step')
+        walk = (
+            select(
+                targets.c.pr_id,
+                targets.c.slots,
+                targets.c.author_id,
+                targets.c.team_name,
+                step.c.value.label('step'),
+                ((targets.c.offset + step.c.value) % team_sizes.c.size).label('position'),
+            )
+            .join(team_sizes, team_sizes.c.team_name == targets.c.team_name)
+            .join(step, true())
+            .cte('walk')
+            .prefix_with('MATERIALIZED')
+        )
+        ranked = (
+            select(
+                walk.c.pr_id,
+                candidates.c.user_id,
+                walk.c.slots,
+                func.row_number().over(partition_by=walk.c.pr_id, order_by=walk.c.step).label('pick'),
+            )
+            .join(
+                candidates,
+                and_(candidates.c.team_name == walk.c.team_name, candidates.c.rank == walk.c.position),
+            )
+            .where(
+                candidates.c.user_id != walk.c.author_id,
+                ~exists().where(current.c.pr_id == walk.c.pr_id, current.c.user_id == candidates.c.user_id),
+            )
+            .cte('ranked')
+        )
+
+        stmt = insert(pr_reviewers) \
+            .from_select(['pr_id', 'user_id'], select(ranked.c.pr_id, ranked.c.user_id).where(ranked.c.pick <= ranked.c.slots)) \
+            .on_conflict_do_nothing() \
+            .returning(pr_reviewers.c.pr_id, pr_reviewers.c.user_id)
+        result = await self.db.execute(stmt)
+        return [(row.pr_id, row.user_id) for row in result]
+
+    async def release_open_reviews(self, user_ids: list[str]) -> list[tuple[str, str]]:
+        '''
+        Снимает пользователей со всех открытых PR, возвращает освободившиеся пары (pr_id, user_id).
+
+        Версии затронутых PR увеличиваются тем же запросом, поэтому параллельные
+        изменения этих PR, прочитавшие старых ревьюверов, будут повторены.
+        '''
+        if not user_ids:
+            return []
+
+        # A per-row primary key lookup of the status: joined, the planner hashes every open PR with a scan of pull_requests.
+        status = select(PullRequest.status).where(PullRequest.id == pr_reviewers.c.pr_id).scalar_subquery()
+        released = delete(pr_reviewers) \
+            .where(
+                pr_reviewers.c.user_id == any_(bindparam('user_ids', user_ids, type_=ARRAY(String))),
+                status == PRStatus.OPEN,
+            ) \
+            .returning(pr_reviewers.c.pr_id, pr_reviewers.c.user_id) \
+            .cte('released')
+        bumped = update(PullRequest.__table__) \
+            .where(PullRequest.id.in_(select(released.c.pr_id))) \
+            .values(version=PullRequest.version + 1) \
+            .cte('bumped')
+        stmt = select(released.c.pr_id, released.c.user_id).add_cte(bumped)
+        result = await self.db.execute(stmt)
+        return [(row.pr_id, row.user_id) for row in result]
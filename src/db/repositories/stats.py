@@ -0,0 +1,232 @@
+from collections.abc import Iterable
+from datetime import datetime
+
+from sqlalchemy import ColumnElement, DateTime, Integer, String, bindparam, case, func, literal_column, select, text
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+
+from src.db.models import Team, TeamReviewStats, User, UserReviewStats, pr_reviewers, pr_reviewers_archive
+
+from .base import BaseRepository
+
+
+ReviewStatsDelta = tuple[str, int, int, int]
+
+REBUILD_USER_STATS_SQL = '''
+INSERT INTO user_review_stats (user_id, assigned_count, open_count, merged_count, last_assigned_at)
+SELECT
+    reviews.user_id,
+    count(*),
+    count(*) FILTER (WHERE reviews.status = 'OPEN'),
+    count(*) FILTER (WHERE reviews.status = 'MERGED'),
+    max(reviews.assigned_at)
+FROM (
+    SELECT r.user_id, p.status, r.assigned_at
+    FROM pr_reviewers AS r
+    JOIN pull_requests AS p ON p.id = r.pr_id
+    UNION ALL
+    SELECT r.user_id, p.status, r.assigned_at
+    FROM pr_reviewers_archive AS r
+    JOIN pull_requests_archive AS p ON p.id = r.pr_id
+) AS reviews
+GROUP BY reviews.user_id
+'''
+
+REBUILD_TEAM_STATS_SQL = '''
+INSERT INTO team_review_stats (team_name, assigned_count, open_count, merged_count)
+SELECT u.team_name, sum(s.assigned_count), sum(s.open_count), sum(s.merged_count)
+FROM user_review_stats AS s
+JOIN users AS u ON u.user_id = s.user_id
+GROUP BY u.team_name
+'''
+
+
+def latest_assignment(user_id: ColumnElement[str]) -> ColumnElement[datetime]:
+    '''Время последнего назначения пользователя среди горячих и архивных ревью; NULL, если назначений нет.'''
+    return func.greatest(*(
+        select(func.max(reviewers.c.assigned_at)).where(reviewers.c.user_id == user_id).scalar_subquery()
+        for reviewers in (pr_reviewers, pr_reviewers_archive)
+    ))
+
+
+class ReviewStatsRepository(BaseRepository[UserReviewStats]):
+    model = UserReviewStats
+
+    async def get_user_stats(self, user_id: str) -> tuple[str, int, int, int] | None:
+        stmt = select(
+            User.user_id,
+            func.coalesce(UserReviewStats.assigned_count, 0),
+            func.coalesce(UserReviewStats.open_count, 0),
+            func.coalesce(UserReviewStats.merged_count, 0),
+        ) \
+            .outerjoin(UserReviewStats, UserReviewStats.user_id == User.user_id) \
+            .where(User.user_id == user_id)
+        result = await self.db.execute(stmt)
+        return result.one_or_none()
+
+    async def get_team_stats(self, team_name: str) -> tuple[str, int, int, int] | None:
+        stmt = select(
+            Team.name,
+            func.coalesce(TeamReviewStats.assigned_count, 0),
+            func.coalesce(TeamReviewStats.open_count, 0),
+            func.coalesce(TeamReviewStats.merged_count, 0),
+        ) \
+            .outerjoin(TeamReviewStats, TeamReviewStats.team_name == Team.name) \
+            .where(Team.name == team_name)
+        result = await self.db.execute(stmt)
+        return result.one_or_none()
+
+    async def apply_review_changes(
+        self,
+        assigned: Iterable[str] = (),
+        unassigned: Iterable[str] = (),
+        merged: Iterable[str] = (),
+    ) -> None:
+        '''
+        Применяет изменения назначений к счетчикам пользователей и их команд.
+
+        `assigned`/`unassigned` - ревьюверы, добавленные на открытый PR или снятые
+        с него, `merged` - ревьюверы PR, который только что смержили. Один и тот
+        же user_id может встречаться несколько раз.
+        '''
+        deltas = [(user_id, 1, 1, 0) for user_id in assigned]
+        deltas += [(user_id, -1, -1, 0) for user_id in unassigned]
+        deltas += [(user_id, 0, -1, 1) for user_id in merged]
+        await self.apply_deltas(deltas)
+
+    async def apply_deltas(self, deltas: list[ReviewStatsDelta]) -> None:
+        '''
+        Одним запросом прибавляет дельты к user_review_stats и team_review_stats.
+
+        Строки блокируются в порядке ключей, поэтому параллельные транзакции
+        не взаимоблокируются на горячих счетчиках.
+        '''
+        if not deltas:
+            return
+
+        user_ids, assigned, opened, merged = (list(column) for column in zip(*deltas, strict=True))
+        batch = select(
+            func.unnest(bindparam('user_ids', user_ids, type_=ARRAY(String)), type_=String).label('user_id'),
+            func.unnest(bindparam('assigned', assigned, type_=ARRAY(Integer)), type_=Integer).label('assigned'),
+            func.unnest(bindparam('opened', opened, type_=ARRAY(Integer)), type_=Integer).label('opened'),
+            func.unnest(bindparam('merged', merged, type_=ARRAY(Integer)), type_=Integer).label('merged'),
+        ).cte('batch')
+        per_user = select(
+            batch.c.user_id,
+            func.sum(batch.c.assigned).label('assigned'),
+            func.sum(batch.c.opened).label('opened'),
+            func.sum(batch.c.merged).label('merged'),
+            func.bool_or(batch.c.assigned > 0).label('added'),
+            func.bool_or(batch.c.assigned < 0).label('released'),
+        ) \
+            .group_by(batch.c.user_id) \
+            .cte('per_user')
+
+        # last_assigned_at is the latest pr_reviewers.assigned_at of the user, as in `rebuild`. A new
+        # assignment gets now() as its assigned_at, so it is the latest; after a release the latest
+        # remaining assignment is looked up, and NULL (keep the stored value) means nothing changed.
+        new_user_stats = select(
+            per_user.c.user_id,
+            per_user.c.assigned,
+            per_user.c.opened,
+            per_user.c.merged,
+            case(
+                (per_user.c.added, func.now()),
+                (per_user.c.released, latest_assignment(per_user.c.user_id)),
+                else_=None,
+            ).cast(DateTime(timezone=True)),
+        ).order_by(per_user.c.user_id)
+        upsert_user_stats = insert(UserReviewStats).from_select(
+            ['user_id', 'assigned_count', 'open_count', 'merged_count', 'last_assigned_at'],
+            new_user_stats,
+        )
+        upsert_user_stats = upsert_user_stats.on_conflict_do_update(
+            index_elements=[UserReviewStats.user_id],
+            set_={
+                'assigned_count': UserReviewStats.assigned_count + upsert_user_stats.excluded.assigned_count,
+                'open_count': UserReviewStats.open_count + upsert_user_stats.excluded.open_count,
+                'merged_count': UserReviewStats.merged_count + upsert_user_stats.excluded.merged_count,
+                # No assignments left at all: `rebuild` has no row, so there is no last assignment either.
+                'last_assigned_at': case(
+                    (UserReviewStats.assigned_count + upsert_user_stats.excluded.assigned_count == 0, None),
+                    else_=func.coalesce(upsert_user_stats.excluded.last_assigned_at, UserReviewStats.last_assigned_at),
+                ),
+            },
+        ).returning(literal_column('1')).cte('upsert_user_stats')
+
+        new_team_stats = select(
+            User.team_name,
+            func.sum(per_user.c.assigned),
+            func.sum(per_user.c.opened),
+            func.sum(per_user.c.merged),
+        ) \
+            .join(User, User.user_id == per_user.c.user_id) \
+            .group_by(User.team_name) \
+            .order_by(User.team_name)
+        upsert_team_stats = insert(TeamReviewStats).from_select(
+            ['team_name', 'assigned_count', 'open_count', 'merged_count'],
+            new_team_stats,
+        )
+        upsert_team_stats = upsert_team_stats.on_conflict_do_update(
+            index_elements=[TeamReviewStats.team_name],
+            set_={
+                'assigned_count': TeamReviewStats.assigned_count + upsert_team_stats.excluded.assigned_count,
+                'open_count': TeamReviewStats.open_count + upsert_team_stats.excluded.open_count,
+                'merged_count': TeamReviewStats.merged_count + upsert_team_stats.excluded.merged_count,
+            },
+        ).add_cte(upsert_user_stats)
+
+        await self.db.execute(upsert_team_stats)
+
+    async def move_users_between_teams(self, moves: list[tuple[str, str, str]]) -> None:
+        '''Переносит накопленные счетчики пользователей (user_id, old_team, new_team) в новые команды.'''
+        if not moves:
+            return
+
+        user_ids, old_teams, new_teams = (list(column) for column in zip(*moves, strict=True))
+        batch = select(
+            func.unnest(bindparam('user_ids', user_ids, type_=ARRAY(String)), type_=String).label('user_id'),
+            func.unnest(bindparam('old_teams', old_teams, type_=ARRAY(String)), type_=String).label('old_team'),
+            func.unnest(bindparam('new_teams', new_teams, type_=ARRAY(String)), type_=String).label('new_team'),
+        ).cte('moves')
+        stats = UserReviewStats
+        deltas = select(
+            batch.c.old_team.label('team_name'),
+            (-stats.assigned_count).label('assigned'),
+            (-stats.open_count).label('opened'),
+            (-stats.merged_count).label('merged'),
+        ) \
+            .join(stats, stats.user_id == batch.c.user_id) \
+            .union_all(
+                select(batch.c.new_team, stats.assigned_count, stats.open_count, stats.merged_count)
+                .join(stats, stats.user_id == batch.c.user_id)
+            ) \
+            .subquery('deltas')
+
+        stmt = insert(TeamReviewStats).from_select(
+            ['team_name', 'assigned_count', 'open_count', 'merged_count'],
+            select(deltas.c.team_name, func.sum(deltas.c.assigned), func.sum(deltas.c.opened), func.sum(deltas.c.merged))
+            .group_by(deltas.c.team_name)
+            .order_by(deltas.c.team_name),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[TeamReviewStats.team_name],
+            set_={
+                'assigned_count': TeamReviewStats.assigned_count + stmt.excluded.assigned_count,
+                'open_count': TeamReviewStats.open_count + stmt.excluded.open_count,
+                'merged_count': TeamReviewStats.merged_count + stmt.excluded.merged_count,
+            },
+        )
+        await self.db.execute(stmt)
+
+    async def rebuild(self) -> None:
+        '''
+        Пересчитывает все счетчики с нуля по pr_reviewers и архиву ревью.
+
+        EXCLUSIVE-блокировка ждет транзакции, уже изменившие счетчики, и не дает
+        новым изменить их до конца пересчета; чтение при этом не блокируется.
+        '''
+        await self.db.execute(text('LOCK TABLE user_review_stats, team_review_stats IN EXCLUSIVE MODE'))
+        await self.db.execute(text('DELETE FROM team_review_stats'))
+        await self.db.execute(text('DELETE FROM user_review_stats'))
+        await self.db.execute(text(REBUILD_USER_STATS_SQL))
+        await self.db.execute(text(REBUILD_TEAM_STATS_SQL))
@@ -1,7 +1,127 @@
-from src.db.models import User
+from typing import NamedTuple
+from collections.abc import Callable, Sequence
+from datetime import datetime
+
+from sqlalchemy import Boolean, ColumnElement, ScalarSelect, String, any_, bindparam, func, or_, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import aliased
+
+from src.db.models import User, UserReviewStats
 
 from .base import BaseRepository
 
 
+class ReviewLoad(NamedTuple):
+    '''Выражения нагрузки кандидата, из которых стратегия строит ORDER BY.'''
+    user_id: ColumnElement[str]
+    open_reviews: ColumnElement[int]
+    last_assigned_at: ColumnElement[datetime]
+
+
+ReviewerOrdering = Callable[[ReviewLoad], list[ColumnElement]]
+
+
+def open_reviews_count(user_id: ColumnElement[str]) -> ColumnElement[int]:
+    return func.coalesce(
+        select(UserReviewStats.open_count).where(UserReviewStats.user_id == user_id).scalar_subquery(),
+        0,
+    )
+
+
+def last_assigned_at(user_id: ColumnElement[str]) -> ScalarSelect[datetime]:
+    return select(UserReviewStats.last_assigned_at).where(UserReviewStats.user_id == user_id).scalar_subquery()
+
+
+def review_load(user_id: ColumnElement[str]) -> ReviewLoad:
+    return ReviewLoad(user_id, open_reviews_count(user_id), last_assigned_at(user_id))
+
+
 class UserRepository(BaseRepository[User]):
     model = User
+
+    @staticmethod
+    def team_of(user_id: str) -> ScalarSelect[str]:
+        member = aliased(User)
+        return select(member.team_name).where(member.user_id == user_id).scalar_subquery()
+
+    async def pick_review_candidates_among(
+        self,
+        user_ids: Sequence[str],
+        ordering: ReviewerOrdering,
+        limit: int,
+    ) -> list[User]:
+        '''
+        Одним запросом выбирает `limit` активных пользователей среди `user_ids` (например, из кэша состава команды).
+
+        Кандидаты ранжируются стратегией по текущей нагрузке открытыми ревью,
+        в Python возвращаются только победители.
+        '''
+        if not user_ids:
+            return []
+
+        stmt = select(User) \
+            .where(User.user_id == any_(bindparam('user_ids', list(user_ids), type_=ARRAY(String))), User.is_active.is_(True)) \
+            .order_by(*ordering(review_load(User.user_id))) \
+            .limit(limit)
+        result = await self.db.execute(stmt)
+        return list(result.scalars().all())
+
+    async def team_roster(self, team_name: str | ScalarSelect[str]) -> list[tuple[str, str, bool]]:
+        '''Участники команды в виде (team_name, user_id, is_active).'''
+        stmt = select(User.team_name, User.user_id, User.is_active) \
+            .where(User.team_name == team_name) \
+            .order_by(User.user_id)
+        result = await self.db.execute(stmt)
+        return [tuple(row) for row in result]
+
+    async def existing_ids(self, user_ids: Sequence[str]) -> set[str]:
+        if not user_ids:
+            return set()
+
+        stmt = select(User.user_id).where(User.user_id == any_(bindparam('user_ids', list(user_ids), type_=ARRAY(String))))
+        result = await self.db.execute(stmt)
+        return set(result.scalars().all())
+
+    async def teams_of(self, user_ids: Sequence[str]) -> dict[str, str]:
+        '''Текущие команды уже существующих пользователей из `user_ids`.'''
+        if not user_ids:
+            return {}
+
+        stmt = select(User.user_id, User.team_name) \
+            .where(User.user_id == any_(bindparam('user_ids', list(user_ids), type_=ARRAY(String))))
+        result = await self.db.execute(stmt)
+        return {row.user_id: row.team_name for row in result}
+
+    async def deactivate(self, user_ids: Sequence[str] = (), team_name: str | None = None) -> list[User]:
+        conditions = []
+        if user_ids:
+            conditions.append(User.user_id == any_(bindparam('user_ids', list(user_ids), type_=ARRAY(String))))
+        if team_name is not None:
+            conditions.append(User.team_name == team_name)
+        if not conditions:
+            return []
+
+        stmt = update(User).where(or_(*conditions)).values(is_active=False).returning(User)
+        result = await self.db.execute(stmt)
+        return list(result.scalars().all())
+
+    async def set_is_active_many(self, changes: Sequence[tuple[str, bool]]) -> list[User]:
+        '''
+        Одним UPDATE ... FROM unnest выставляет флаг активности парам (user_id, is_active).
+
+        Возвращает только найденных пользователей; id в `changes` должны быть уникальны.
+        '''
+        if not changes:
+            return []
+
+        user_ids, flags = (list(column) for column in zip(*changes, strict=True))
+        values = select(
+            func.unnest(bindparam('user_ids', user_ids, type_=ARRAY(String)), type_=String).label('user_id'),
+            func.unnest(bindparam('flags', flags, type_=ARRAY(Boolean)), type_=Boolean).label('is_active'),
+        ).subquery('changes')
+        stmt = update(User) \
+            .where(User.user_id == values.c.user_id) \
+            .values(is_active=values.c.is_active) \
+            .returning(User)
+        result = await self.db.execute(stmt)
+        return list(result.scalars().all())
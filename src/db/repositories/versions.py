@@ -0,0 +1,52 @@
+from collections.abc import Iterable
+
+from sqlalchemy import String, bindparam, func, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+
+from src.db.models import ResourceVersion
+from src.type_defs import ResourceKind
+
+from .base import BaseRepository
+
+
+class ResourceVersionRepository(BaseRepository[ResourceVersion]):
+    model = ResourceVersion
+
+    async def get_version(self, kind: ResourceKind, key: str) -> int:
+        stmt = self._statement(
+            ('get_version',),
+            lambda: select(ResourceVersion.version)
+            .where(ResourceVersion.kind == bindparam('kind'), ResourceVersion.key == bindparam('key')),
+        )
+        version = await self.db.scalar(stmt, {'kind': kind.value, 'key': key})
+        return version or 0
+
+    async def bump(self, teams: Iterable[str] = (), user_reviews: Iterable[str] = ()) -> None:
+        '''
+        Одним запросом увеличивает версии команд и очередей ревью пользователей.
+
+        Вызывается в транзакции изменения, поэтому новая версия видна вместе с
+        данными. Ключи отсортированы, и строки блокируются в одном порядке:
+        параллельные транзакции не взаимоблокируются на одной команде.
+        '''
+        resources = sorted(
+            {(ResourceKind.TEAM.value, team_name) for team_name in teams}
+            | {(ResourceKind.USER_REVIEWS.value, user_id) for user_id in user_reviews}
+        )
+        if not resources:
+            return
+
+        kinds, keys = (list(column) for column in zip(*resources, strict=True))
+        stmt = insert(ResourceVersion).from_select(
+            ['kind', 'key', 'version'],
+            select(
+                func.unnest(bindparam('kinds', kinds, type_=ARRAY(String)), type_=String),
+                func.unnest(bindparam('keys', keys, type_=ARRAY(String)), type_=String),
+                literal(1),
+            ),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ResourceVersion.kind, ResourceVersion.key],
+            set_={'version': ResourceVersion.version + 1},
+        )
+        await self.db.execute(stmt)
@@ -1,43 +1,81 @@
+import asyncio
+import time
 from typing import Any
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
 
-from fastapi import Depends, FastAPI, HTTPException
-from sqlalchemy import text
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import FastAPI, HTTPException
 from starlette.requests import Request
-from starlette.responses import JSONResponse
 
-from src.api import pull_requests, teams, users
-from src.db.database import get_db_connection, init_db, stop_db
+from src.api import debug, export, health, metrics, pull_requests, stats, teams, users
+from src.api.responses import ORJSONResponse
+from src.config import DATABASE, DEBUG_ENDPOINTS
+from src.db.database import DATABASE_URL, init_db, init_replica_dbs, prewarm_pool, stop_db
+from src.db.health import PRIMARY_DATABASE, DatabaseHealthCheck
+from src.metrics import APP_STARTUP_DURATION
+from src.middleware import MetricsMiddleware, QueryBudgetMiddleware, ReadYourWritesMiddleware
 from src.schemas.base import ErrorResponseSchema
+from src.services.outbox import outbox_dispatcher
+from src.services.roster_cache import roster_invalidation_listener
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[Any, Any, Any]:
-    print('Application started')
+    started = time.perf_counter()
     app.state.db_pool, app.state.db_engine = await init_db()
+    replicas = await init_replica_dbs()
+    # Keyed by the health check name, so reads can skip replicas that fail it.
+    app.state.db_replica_pools = {f'replica-{i}': session_factory for i, (session_factory, _) in enumerate(replicas)}
+    app.state.db_replica_engines = {f'replica-{i}': engine for i, (_, engine) in enumerate(replicas)}
+    engines = {PRIMARY_DATABASE: app.state.db_engine} | app.state.db_replica_engines
+
+    # Connections open concurrently, so a cold worker pays one round of connection setup instead of one per early request.
+    prewarm_started = time.perf_counter()
+    await asyncio.gather(*(prewarm_pool(engine, DATABASE.prewarm_connections) for engine in engines.values()))
+    APP_STARTUP_DURATION.labels('prewarm').set(time.perf_counter() - prewarm_started)
+
+    app.state.db_health = DatabaseHealthCheck(engines)
+    await app.state.db_health.check()
+    app.state.db_health.start()
+    app.state.roster_listener = roster_invalidation_listener(DATABASE_URL)
+    app.state.roster_listener.start()
+    app.state.outbox_dispatcher = outbox_dispatcher(app.state.db_pool)
+    app.state.outbox_dispatcher.start()
+
+    app.state.startup_seconds = time.perf_counter() - started
+    APP_STARTUP_DURATION.labels('total').set(app.state.startup_seconds)
+    print(f'Application started in {app.state.startup_seconds:.3f}s')
     yield
 
+    await app.state.outbox_dispatcher.stop()
+    await app.state.db_health.stop()
+    await app.state.roster_listener.stop()
+
+    for engine in app.state.db_replica_engines.values():
+        await stop_db(engine)
     if app.state.db_engine:
         await stop_db(app.state.db_engine)
     print('Application stopped')
 
 
-async def httpexception_handler(_request: Request, exc: type[HTTPException]) -> JSONResponse:
+async def httpexception_handler(_request: Request, exc: type[HTTPException]) -> ORJSONResponse:
     content = ErrorResponseSchema(error=exc.detail).model_dump()
-    return JSONResponse(content=content, status_code=exc.status_code)
+    return ORJSONResponse(content=content, status_code=exc.status_code)
 
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 app.add_exception_handler(HTTPException, httpexception_handler)
+app.add_middleware(QueryBudgetMiddleware)
+if DATABASE.replica_urls:
+    app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(MetricsMiddleware)
 
+app.include_router(health.router)
 app.include_router(users.router)
 app.include_router(teams.router)
 app.include_router(pull_requests.router)
-
-
-@app.get('/health')
-async def health_check(conn: AsyncSession = Depends(get_db_connection)) -> dict:
-    await conn.execute(text('SELECT 1'))
-    return {'status': 'healthy'}
+app.include_router(stats.router)
+app.include_router(export.router)
+if DEBUG_ENDPOINTS:
+    app.include_router(debug.router)
+app.include_router(metrics.router)
@@ -0,0 +1,259 @@
+'''
+Метрики в текстовом формате Prometheus без внешних зависимостей.
+
+Каждый процесс (воркер uvicorn) хранит свои значения: при нескольких
+воркерах Prometheus должен опрашивать их по отдельности.
+'''
+import bisect
+import functools
+import inspect
+import math
+import threading
+import time
+from typing import TypeVar
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterable, Sequence
+
+from src.db.query_stats import add_query_observer, track_queries
+
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+T = TypeVar('T')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values, strict=True)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric(ABC):
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _new_child(self) -> object:
+        ...
+
+    def labels(self, *values: str, **labels: str) -> object:
+        key = tuple(str(value) for value in values) if values else tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    @abstractmethod
+    def samples(self) -> Iterable[str]:
+        ...
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class _Value:
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(Metric):
+    type_name = 'counter'
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def samples(self) -> Iterable[str]:
+        for key, child in sorted(self._children.items()):
+            yield f'{self.name}_total{_format_labels(self.labelnames, key)} {_format_value(child.value)}'
+
+
+class Gauge(Counter):
+    type_name = 'gauge'
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def samples(self) -> Iterable[str]:
+        for key, child in sorted(self._children.items()):
+            yield f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}'
+
+
+class _HistogramValue:
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Histogram(Metric):
+    type_name = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self) -> Iterable[str]:
+        for key, child in sorted(self._children.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), child.counts, strict=True):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(child.sum)}'
+            yield f'{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}'
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: T) -> T:
+        if metric.name in self._metrics:
+            raise ValueError(f'Metric {metric.name} is already registered')  # noqa: TRY003
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return '\n'.join(metric.render() for metric in self._metrics.values()) + '\n'
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    'http_requests', 'HTTP requests by route template and status code.', ['method', 'route', 'status'],
+))
+HTTP_REQUEST_DURATION = REGISTRY.register(Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route template.', ['method', 'route'],
+))
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    'http_requests_in_flight', 'HTTP requests currently being served by this worker.',
+))
+DB_QUERIES_PER_REQUEST = REGISTRY.register(Histogram(
+    'db_queries_per_request', 'SQL statements executed while serving one HTTP request.', ['method', 'route'],
+    buckets=QUERY_COUNT_BUCKETS,
+))
+DB_TIME_PER_REQUEST = REGISTRY.register(Histogram(
+    'db_time_per_request_seconds', 'Time spent in SQL statements while serving one HTTP request.', ['method', 'route'],
+))
+DB_QUERY_DURATION = REGISTRY.register(Histogram(
+    'db_query_duration_seconds', 'Latency of single SQL statements.',
+))
+SERVICE_CALL_DURATION = REGISTRY.register(Histogram(
+    'service_call_duration_seconds', 'Wall time of service-layer calls.', ['service', 'method'],
+))
+SERVICE_CALL_DB_TIME = REGISTRY.register(Histogram(
+    'service_call_db_seconds', 'Part of service-layer call time spent in SQL statements.', ['service', 'method'],
+))
+SINGLE_FLIGHT_CALLS = REGISTRY.register(Counter(
+    'single_flight_calls', 'Coalescable reads: executed by the request itself or served from an identical read in flight.',
+    ['group', 'outcome'],
+))
+SINGLE_FLIGHT_IN_FLIGHT = REGISTRY.register(Gauge(
+    'single_flight_in_flight', 'Distinct keys whose leading read is running now; followers wait on these.', ['group'],
+))
+OUTBOX_EVENTS_DISPATCHED = REGISTRY.register(Counter(
+    'outbox_events_dispatched', 'Outbox events delivered to the sink by this worker.', ['event_type'],
+))
+OUTBOX_DISPATCH_FAILURES = REGISTRY.register(Counter(
+    'outbox_dispatch_failures', 'Outbox batches the sink did not accept; their events are retried with backoff.',
+))
+APP_STARTUP_DURATION = REGISTRY.register(Gauge(
+    'app_startup_seconds', 'Duration of the lifespan startup of this worker by phase.', ['phase'],
+))
+DATABASE_READY = REGISTRY.register(Gauge(
+    'database_ready', 'Result of the last background readiness check: 1 if the database answered.', ['database'],
+))
+PR_VERSION_CONFLICTS = REGISTRY.register(Counter(
+    'pull_request_version_conflicts', 'Attempts of a service call that found the pull request changed by a concurrent request.', ['method'],
+))
+PR_CONFLICT_RETRIES = REGISTRY.register(Counter(
+    'pull_request_conflict_retries', 'Attempts repeated after a version conflict; conflicts minus retries failed with 409.', ['method'],
+))
+
+add_query_observer(lambda _statement, duration: DB_QUERY_DURATION.observe(duration))
+
+
+def _timed(service: str, method: str, fn: Callable) -> Callable:
+    duration = SERVICE_CALL_DURATION.labels(service, method)
+    db_time = SERVICE_CALL_DB_TIME.labels(service, method)
+
+    @functools.wraps(fn)
+    async def wrapper(*args: object, **kwargs: object) -> object:
+        with track_queries() as stats:
+            sql_time_before = stats.sql_time
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                duration.observe(time.perf_counter() - started)
+                db_time.observe(stats.sql_time - sql_time_before)
+
+    return wrapper
+
+
+def timed(cls: type[T]) -> type[T]:
+    '''
+    Декоратор класса сервиса: замеряет каждый публичный async-метод.
+
+    Для вызова пишутся полное время и доля, ушедшая на SQL, поэтому разница
+    между ними - время в Python.
+    '''
+    for name, fn in list(vars(cls).items()):
+        if not name.startswith('_') and inspect.iscoroutinefunction(fn):
+            setattr(cls, name, _timed(cls.__name__, name, fn))
+    return cls
@@ -0,0 +1,251 @@
+import logging
+import textwrap
+import time
+from typing import TypeVar
+from collections.abc import Callable
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.config import (
+    EXPOSE_QUERY_COUNT,
+    N_PLUS_ONE_THRESHOLD,
+    QUERY_BUDGET_MODE,
+    QUERY_COUNT_HEADER,
+    READ_YOUR_WRITES_COOKIE,
+    READ_YOUR_WRITES_HEADER,
+    READ_YOUR_WRITES_WINDOW,
+)
+from src.db.database import PRIMARY_COMMIT_STATE
+from src.db.query_stats import QueryStats, track_queries
+from src.metrics import (
+    DB_QUERIES_PER_REQUEST,
+    DB_TIME_PER_REQUEST,
+    HTTP_REQUEST_DURATION,
+    HTTP_REQUESTS,
+    HTTP_REQUESTS_IN_FLIGHT,
+)
+from src.schemas.base import ErrorDetailSchema, ErrorResponseSchema
+from src.type_defs import ErrorCode, QueryBudgetMode
+
+
+logger = logging.getLogger(__name__)
+
+UNMATCHED_ROUTE = '<unmatched>'
+QUERY_BUDGET_ATTRIBUTE = '__query_budget__'
+QUERY_BUDGET_PER_CHUNK_ATTRIBUTE = '__query_budget_per_chunk__'
+LOGGED_STATEMENT_WIDTH = 200
+
+F = TypeVar('F', bound=Callable)
+
+
+def query_budget(limit: int, per_chunk: int = 0) -> Callable[[F], F]:
+    '''
+    Объявляет, сколько SQL-запросов может выполнить эндпоинт за один HTTP-запрос.
+
+    `per_chunk` - сколько запросов добавляется к бюджету на каждую часть
+    потокового ответа (`StreamingResponse`), чьи запросы идут уже во время
+    отправки тела. Ставится под декоратором роутера; проверку делает
+    `QueryBudgetMiddleware`.
+    '''
+    def decorator(endpoint: F) -> F:
+        setattr(endpoint, QUERY_BUDGET_ATTRIBUTE, limit)
+        setattr(endpoint, QUERY_BUDGET_PER_CHUNK_ATTRIBUTE, per_chunk)
+        return endpoint
+
+    return decorator
+
+
+def _route_path(scope: Scope) -> str:
+    route = scope.get('route')
+    return route.path if route is not None else UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    '''
+    ASGI-middleware с метриками запросов.
+
+    Маршрут берется из шаблона пути (`/users/getReview`), а не из URL, чтобы
+    параметры не раздували число рядов. SQL-запросы считаются через
+    `track_queries`, который видят слушатели событий движка.
+    '''
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            with track_queries(reset=True) as stats:
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+
+            labels = (scope['method'], _route_path(scope))
+            HTTP_REQUESTS.labels(*labels, str(status)).inc()
+            HTTP_REQUEST_DURATION.labels(*labels).observe(duration)
+            DB_QUERIES_PER_REQUEST.labels(*labels).observe(stats.queries)
+            DB_TIME_PER_REQUEST.labels(*labels).observe(stats.sql_time)
+
+
+class QueryBudgetMiddleware:
+    '''
+    ASGI-middleware, проверяющее число SQL-запросов на HTTP-запрос.
+
+    Нарушения - превышение бюджета из `query_budget` и одинаковые запросы,
+    повторенные не меньше `n_plus_one_threshold` раз (N+1 через ленивые связи).
+    В режиме warn они пишутся в лог, в режиме enforce ответ заменяется на 500
+    с кодом QUERY_BUDGET_EXCEEDED, чтобы регрессию было видно в тестах.
+
+    Первая проверка идет на старте ответа, когда обычный обработчик уже
+    выполнил все запросы. Потоковый ответ выполняет запросы и во время отправки
+    тела, поэтому он проверяется еще раз на последней части тела, с бюджетом,
+    увеличенным на `per_chunk` за каждую отправленную часть. Заголовки к этому
+    моменту уже ушли, так что в режиме enforce ответ обрывается исключением, и
+    клиент получает незавершенное тело вместо 500. Заголовок с числом запросов
+    у потокового ответа считает только запросы до старта ответа.
+    '''
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        mode: QueryBudgetMode = QUERY_BUDGET_MODE,
+        expose_header: bool = EXPOSE_QUERY_COUNT,
+        header_name: str = QUERY_COUNT_HEADER,
+        n_plus_one_threshold: int = N_PLUS_ONE_THRESHOLD,
+    ) -> None:
+        self.app = app
+        self.mode = mode
+        self.expose_header = expose_header
+        self.header_name = header_name.lower().encode('latin-1')
+        self.n_plus_one_threshold = n_plus_one_threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http' or (self.mode is QueryBudgetMode.OFF and not self.expose_header):
+            await self.app(scope, receive, send)
+            return
+
+        replaced = False
+        chunks = 0
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal replaced, chunks
+            if replaced:
+                return
+
+            if message['type'] == 'http.response.body':
+                if message.get('more_body', False):
+                    chunks += 1
+                elif chunks:
+                    self._check_stream(scope, stats, chunks)
+            elif message['type'] == 'http.response.start':
+                violations = self._check_start(scope, stats)
+                if violations and self.mode is QueryBudgetMode.ENFORCE:
+                    replaced = True
+                    await self._error_response(stats, violations)(scope, receive, send)
+                    return
+                if self.expose_header:
+                    message['headers'] = [*message.get('headers', []), (self.header_name, str(stats.queries).encode())]
+            await send(message)
+
+        with track_queries() as stats:
+            await self.app(scope, receive, send_wrapper)
+
+    def _check_start(self, scope: Scope, stats: QueryStats) -> list[str]:
+        violations = self._violations(scope, stats)
+        if violations:
+            logger.warning('Query budget violated by %s %s: %s', scope['method'], _route_path(scope), '; '.join(violations))
+        return violations
+
+    def _check_stream(self, scope: Scope, stats: QueryStats, chunks: int) -> None:
+        violations = self._violations(scope, stats, chunks)
+        if not violations:
+            return
+        logger.warning(
+            'Query budget violated by streamed %s %s (%d chunks): %s',
+            scope['method'], _route_path(scope), chunks, '; '.join(violations),
+        )
+        if self.mode is QueryBudgetMode.ENFORCE:
+            raise RuntimeError(f'Query budget exceeded while streaming: {"; ".join(violations)}')  # noqa: TRY003
+
+    def _violations(self, scope: Scope, stats: QueryStats, chunks: int = 0) -> list[str]:
+        if self.mode is QueryBudgetMode.OFF:
+            return []
+
+        violations = []
+        endpoint = getattr(scope.get('route'), 'endpoint', None)
+        budget = getattr(endpoint, QUERY_BUDGET_ATTRIBUTE, None)
+        # A streamed body may repeat its per-chunk statement, e.g. the window query of an export.
+        per_chunk = getattr(endpoint, QUERY_BUDGET_PER_CHUNK_ATTRIBUTE, 0) * chunks
+        # The budget is per attempt: a retried transaction runs its statements again.
+        if budget is not None and stats.queries > (budget + per_chunk) * stats.attempts:
+            violations.append(f'{stats.queries} SQL statements, budget is {(budget + per_chunk) * stats.attempts}')
+        for statement, count in stats.repeated_statements((self.n_plus_one_threshold + per_chunk) * stats.attempts):
+            shortened = textwrap.shorten(statement, LOGGED_STATEMENT_WIDTH)
+            violations.append(f'statement executed {count} times, possible N+1: {shortened}')
+        return violations
+
+    def _error_response(self, stats: QueryStats, violations: list[str]) -> JSONResponse:
+        error = ErrorDetailSchema(code=ErrorCode.QUERY_BUDGET_EXCEEDED, message='; '.join(violations))
+        headers = {self.header_name.decode('latin-1'): str(stats.queries)} if self.expose_header else None
+        return JSONResponse(content=ErrorResponseSchema(error=error).model_dump(), status_code=500, headers=headers)
+
+
+class ReadYourWritesMiddleware:
+    '''
+    ASGI-middleware, закрепляющее клиента за primary после его записи.
+
+    Если запрос зафиксировал транзакцию на primary, ответ ставит cookie со
+    временем, до которого `get_read_db_connection` отдает этому клиенту сессии
+    primary, а не реплик: реплика с отставанием не покажет клиенту данные
+    старше его же записи. Окно должно быть больше обычного отставания реплик.
+
+    То же время приходит в заголовке ответа `READ_YOUR_WRITES_HEADER`. Клиенты
+    без cookie (curl, сервисы, SDK) должны передавать его значение в
+    одноименном заголовке следующих запросов; если не передают ни cookie, ни
+    заголовок, их чтения могут уйти на отстающую реплику и не увидеть записи.
+    '''
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        cookie_name: str = READ_YOUR_WRITES_COOKIE,
+        header_name: str = READ_YOUR_WRITES_HEADER,
+        window: int = READ_YOUR_WRITES_WINDOW,
+    ) -> None:
+        self.app = app
+        self.cookie_name = cookie_name
+        self.header_name = header_name.lower().encode('latin-1')
+        self.window = window
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            if message['type'] == 'http.response.start' and scope.get('state', {}).get(PRIMARY_COMMIT_STATE):
+                primary_until = f'{time.time() + self.window:.3f}'
+                cookie = f'{self.cookie_name}={primary_until}; Max-Age={self.window}; Path=/; HttpOnly; SameSite=Lax'
+                message['headers'] = [
+                    *message.get('headers', []),
+                    (b'set-cookie', cookie.encode('latin-1')),
+                    (self.header_name, primary_until.encode('latin-1')),
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
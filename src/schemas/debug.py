@@ -0,0 +1,22 @@
+from pydantic import BaseModel
+
+
+class PoolWaitSchema(BaseModel):
+    checkouts: int
+    timeouts: int
+    mean_ms: float
+    p50_ms: float
+    p99_ms: float
+    max_ms: float
+
+
+class PoolStatsSchema(BaseModel):
+    pid: int
+    pool_class: str
+    size: int
+    checked_in: int
+    checked_out: int
+    overflow: int
+    max_overflow: int
+    timeout: float
+    wait: PoolWaitSchema | None = None
@@ -1,9 +1,16 @@
+from collections.abc import Iterable
 from datetime import datetime
 
-from pydantic import BaseModel, ConfigDict, field_serializer
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field
+from typing_extensions import TypedDict
 
 from type_defs import PRStatus
 
+from .base import ErrorDetailSchema
+
+
+MAX_BULK_CREATE_SIZE = 1000
+
 
 class PullRequestShortSchema(BaseModel):
     pull_request_id: str
@@ -16,16 +23,36 @@ class PullRequest(PullRequestShortSchema):
     model_config = ConfigDict(from_attributes=True)
 
     assigned_reviewers: list[str]
-    created_at: datetime | None = None
-    merged_at: datetime | None = None
+    # datetime.ctime() strings, see format_ctimes
+    created_at: str | None = None
+    merged_at: str | None = None
+
+
+class PullRequestShortData(TypedDict):
+    '''Строка PullRequestShortSchema в виде dict: списки таких строк валидируются без создания моделей.'''
+
+    pull_request_id: str
+    pull_request_name: str
+    author_id: str
+    status: PRStatus
+
+
+class PullRequestData(PullRequestShortData):
+    '''Строка PullRequest в виде dict, поля в том же порядке.'''
+
+    assigned_reviewers: list[str]
+    created_at: str | None
+    merged_at: str | None
 
-    @field_serializer('created_at')
-    def serialize_created_at(self, created_at: datetime | None) -> str | None:
-        return created_at.ctime() if created_at else None
 
-    @field_serializer('merged_at')
-    def serialize_merged_at(self, merged_at: datetime | None) -> str | None:
-        return merged_at.ctime() if merged_at else None
+def format_ctimes(values: Iterable[datetime | None]) -> list[str | None]:
+    '''
+    Даты в формате datetime.ctime() для полей PullRequest.
+
+    Вся выдача форматируется одним проходом до валидации, а не колбэком
+    сериализатора на каждое поле каждой строки.
+    '''
+    return [value.ctime() if value is not None else None for value in values]
 
 
 class PullRequestCreateRequestSchema(BaseModel):
@@ -34,5 +61,30 @@ class PullRequestCreateRequestSchema(BaseModel):
     author_id: str
 
 
+class PullRequestBulkCreateRequestSchema(BaseModel):
+    pull_requests: list[PullRequestCreateRequestSchema] = Field(min_length=1, max_length=MAX_BULK_CREATE_SIZE)
+
+
+class PullRequestBulkCreateError(BaseModel):
+    pull_request_id: str
+    error: ErrorDetailSchema
+
+
+class PullRequestBulkCreateResponse(BaseModel):
+    created: list[PullRequest]
+    errors: list[PullRequestBulkCreateError]
+
+
 class MergePRRequest(BaseModel):
     pull_request_id: str
+
+
+class PullRequestReassignRequestSchema(BaseModel):
+    pull_request_id: str
+    # The openapi example spells the field old_reviewer_id, so accept both names.
+    old_user_id: str = Field(validation_alias=AliasChoices('old_user_id', 'old_reviewer_id'))
+
+
+class PullRequestReassignResponse(BaseModel):
+    pr: PullRequest
+    replaced_by: str
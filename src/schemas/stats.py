@@ -0,0 +1,17 @@
+from pydantic import BaseModel
+
+
+class ReviewStatsSchema(BaseModel):
+    assigned: int
+    open: int
+    merged: int
+
+
+class UserReviewStatsSchema(BaseModel):
+    user_id: str
+    reviews: ReviewStatsSchema
+
+
+class TeamReviewStatsSchema(BaseModel):
+    team_name: str
+    reviews: ReviewStatsSchema
@@ -1,4 +1,5 @@
 from pydantic import BaseModel, ConfigDict
+from typing_extensions import TypedDict
 
 
 class TeamMemberSchema(BaseModel):
@@ -9,6 +10,14 @@ class TeamMemberSchema(BaseModel):
     is_active: bool
 
 
+class TeamMemberData(TypedDict):
+    '''Участник TeamSchema в виде dict, поля в том же порядке.'''
+
+    user_id: str
+    username: str
+    is_active: bool
+
+
 class TeamSchema(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
@@ -1,8 +1,13 @@
-from pydantic import BaseModel, ConfigDict
+from typing import Self
+
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 
 from .pull_requests import PullRequestShortSchema
 
 
+MAX_BULK_SET_ACTIVE_SIZE = 10000
+
+
 class UserSchema(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
@@ -25,8 +30,53 @@ class UserSetActiveRequestSchema(BaseModel):
     is_active: bool
 
 
+class UserBulkSetActiveRequestSchema(BaseModel):
+    model_config = ConfigDict(
+        json_schema_extra={
+            'example': {
+                'users': [
+                    {'user_id': 'u2', 'is_active': False},
+                    {'user_id': 'u3', 'is_active': True}
+                ]
+            }
+        }
+    )
+    users: list[UserSetActiveRequestSchema] = Field(min_length=1, max_length=MAX_BULK_SET_ACTIVE_SIZE)
+
+
+class UserBulkSetActiveResponse(BaseModel):
+    users: list[UserSchema]
+    unknown_user_ids: list[str]
+
+
+class UserBulkDeactivateRequestSchema(BaseModel):
+    model_config = ConfigDict(
+        json_schema_extra={
+            'example': {
+                'user_ids': ['u2', 'u3'],
+                'team_name': None
+            }
+        }
+    )
+    user_ids: list[str] = Field(default_factory=list)
+    team_name: str | None = None
+
+    @model_validator(mode='after')
+    def check_target(self) -> Self:
+        if not self.user_ids and self.team_name is None:
+            raise ValueError('Either user_ids or team_name must be provided')  # noqa: TRY003
+        return self
+
+
+class UserBulkDeactivateResponse(BaseModel):
+    users: list[UserSchema]
+    released_reviews: int
+    reassigned_reviews: int
+
+
 class UserGetReviewResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
     user_id: str
     pull_requests: list[PullRequestShortSchema]
+    next_cursor: str | None = None
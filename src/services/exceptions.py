@@ -59,3 +59,23 @@ class CannotAssignMoreReviewersError(Exception):
 class PRAlreadyExistsError(Exception):
     def __init__(self, pr_id: str) -> None:
         super().__init__(f'PR with id {pr_id} already exists')
+
+
+class UnknownReviewerSelectionStrategyError(Exception):
+    def __init__(self, strategy: str) -> None:
+        super().__init__(f'Unknown reviewer selection strategy {strategy}')
+
+
+class InvalidCursorError(Exception):
+    def __init__(self, cursor: str) -> None:
+        super().__init__(f'Invalid pagination cursor {cursor}')
+
+
+class NoReplacementCandidateError(Exception):
+    def __init__(self, reviewer_id: str, pr_id: str) -> None:
+        super().__init__(f'No active replacement candidate for reviewer {reviewer_id} on PR {pr_id}')
+
+
+class ConcurrentModificationError(Exception):
+    def __init__(self, pr_id: str) -> None:
+        super().__init__(f'PR {pr_id} was modified by a concurrent request, retry the request')
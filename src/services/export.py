@@ -0,0 +1,74 @@
+'''
+Выгрузка всех команд, пользователей, PR и назначений ревьюверов.
+
+Каждый набор читается окнами по `EXPORT_TRANSACTION_ROWS` строк: окно идет
+через серверный курсор в своей транзакции, следующее продолжает после ключа
+последней строки. Поэтому память не зависит от размера таблицы, а выгрузка
+миллионов строк не держит одну долгую транзакцию (и снимок) на базе. Цена -
+выгрузка не является одним снимком: строки, измененные во время выгрузки,
+попадают в нее в состоянии на момент чтения своего окна.
+'''
+import csv
+import io
+import json
+from collections.abc import AsyncIterator, Sequence
+from datetime import datetime
+
+from sqlalchemy import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import EXPORT_TRANSACTION_ROWS
+from src.db.repositories.export import EXPORT_KEYS, ExportRepository
+from src.type_defs import ExportDataset, ExportFormat
+
+
+def _value(value: object) -> object:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _ndjson(columns: list[str], rows: Sequence[Row]) -> str:
+    return ''.join(
+        json.dumps(
+            {column: _value(value) for column, value in zip(columns, row, strict=True)}, ensure_ascii=False, separators=(',', ':'),
+        ) + '\n'
+        for row in rows
+    )
+
+
+def _csv(rows: Sequence[Sequence[object]]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows([_value(value) for value in row] for row in rows)
+    return buffer.getvalue()
+
+
+class ExportService:
+    def __init__(self, db: AsyncSession, transaction_rows: int = EXPORT_TRANSACTION_ROWS) -> None:
+        self.db = db
+        self.transaction_rows = transaction_rows
+        self.export_repo = ExportRepository(db)
+
+    async def rows(self, dataset: ExportDataset) -> AsyncIterator[Sequence[Row]]:
+        '''Все строки набора пачками; между окнами транзакция завершается.'''
+        key = EXPORT_KEYS[dataset]
+        after = None
+        while True:
+            exported = 0
+            async for chunk in self.export_repo.stream(dataset, self.transaction_rows, after):
+                exported += len(chunk)
+                last = chunk[-1]
+                yield chunk
+            # Nothing is written, so ending the read transaction only releases its snapshot.
+            await self.db.rollback()
+            if exported < self.transaction_rows:
+                return
+            after = tuple(last._mapping[name] for name in key)
+
+    async def stream(self, dataset: ExportDataset, export_format: ExportFormat) -> AsyncIterator[str]:
+        '''Набор в NDJSON (объект на строку) или CSV с заголовком.'''
+        columns = self.export_repo.columns(dataset)
+        if export_format is ExportFormat.CSV:
+            yield _csv([columns])
+        async for chunk in self.rows(dataset):
+            yield _csv(chunk) if export_format is ExportFormat.CSV else _ndjson(columns, chunk)
@@ -0,0 +1,229 @@
+'''
+События PR через transactional outbox.
+
+Сервисы пишут события в таблицу outbox_events в той же транзакции, что и само
+изменение, поэтому событие есть ровно тогда, когда изменение зафиксировано, а
+запрос не ждет внешние системы. `OutboxDispatcher` в фоне забирает события
+пачками и отдает их в sink; доставка "хотя бы один раз": если sink принял
+пачку, а удалить ее не удалось, она уйдет повторно, и получатель
+дедуплицирует события по `id`.
+'''
+import asyncio
+import contextlib
+import json
+import logging
+import urllib.request
+from typing import Protocol
+from collections import defaultdict
+from collections.abc import Iterable, Sequence
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.config import (
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_DISPATCHER,
+    OUTBOX_FILE_PATH,
+    OUTBOX_LEASE_SECONDS,
+    OUTBOX_POLL_INTERVAL,
+    OUTBOX_SINK,
+    OUTBOX_WEBHOOK_TIMEOUT,
+    OUTBOX_WEBHOOK_URL,
+)
+from src.db.models import OutboxEvent, PullRequest
+from src.db.repositories.outbox import OutboxRepository
+from src.metrics import OUTBOX_DISPATCH_FAILURES, OUTBOX_EVENTS_DISPATCHED
+from src.type_defs import OutboxEventType, OutboxSinkKind
+
+
+logger = logging.getLogger(__name__)
+
+
+def pull_request_created(pr: PullRequest, reviewer_ids: Sequence[str]) -> dict:
+    return {
+        'event_type': OutboxEventType.PR_CREATED.value,
+        'aggregate_id': pr.id,
+        'payload': {
+            'pull_request_id': pr.id,
+            'pull_request_name': pr.name,
+            'author_id': pr.author_id,
+            'assigned_reviewers': list(reviewer_ids),
+        },
+    }
+
+
+def pull_requests_reassigned(removed: Iterable[tuple[str, str]], added: Iterable[tuple[str, str]]) -> list[dict]:
+    '''По событию на каждый PR из пар (pr_id, user_id) снятых и назначенных ревьюверов.'''
+    changes: dict[str, dict[str, list[str]]] = defaultdict(lambda: {'removed_reviewers': [], 'added_reviewers': []})
+    for pr_id, user_id in removed:
+        changes[pr_id]['removed_reviewers'].append(user_id)
+    for pr_id, user_id in added:
+        changes[pr_id]['added_reviewers'].append(user_id)
+    return [
+        {
+            'event_type': OutboxEventType.PR_REASSIGNED.value,
+            'aggregate_id': pr_id,
+            'payload': {'pull_request_id': pr_id, **change},
+        }
+        for pr_id, change in sorted(changes.items())
+    ]
+
+
+def pull_request_merged(pr: PullRequest) -> dict:
+    return {
+        'event_type': OutboxEventType.PR_MERGED.value,
+        'aggregate_id': pr.id,
+        'payload': {
+            'pull_request_id': pr.id,
+            'merged_at': pr.merged_at.isoformat(),
+            'assigned_reviewers': [reviewer.user_id for reviewer in pr.assigned_reviewers],
+        },
+    }
+
+
+def _message(event: OutboxEvent) -> dict:
+    return {
+        'id': event.id,
+        'type': event.event_type,
+        'aggregate_id': event.aggregate_id,
+        'created_at': event.created_at.isoformat(),
+        'payload': event.payload,
+    }
+
+
+class OutboxSink(Protocol):
+    async def send(self, messages: list[dict]) -> None:
+        '''Принимает пачку событий целиком или бросает исключение.'''
+
+
+class LogSink:
+    async def send(self, messages: list[dict]) -> None:
+        for message in messages:
+            logger.info('outbox event %s', json.dumps(message, ensure_ascii=False))
+
+
+class FileSink:
+    '''Дописывает события в NDJSON-файл; удобно для локальной проверки.'''
+
+    def __init__(self, path: str) -> None:
+        self.path = Path(path)
+
+    def _write(self, lines: str) -> None:
+        with self.path.open('a', encoding='utf-8') as file:
+            file.write(lines)
+
+    async def send(self, messages: list[dict]) -> None:
+        lines = ''.join(json.dumps(message, ensure_ascii=False) + '\n' for message in messages)
+        await asyncio.to_thread(self._write, lines)
+
+
+class WebhookSink:
+    '''POST пачки `{"events": [...]}` на URL; любой ответ кроме 2xx - ошибка, пачка уйдет повторно.'''
+
+    def __init__(self, url: str, timeout: float = OUTBOX_WEBHOOK_TIMEOUT) -> None:
+        if not url.startswith(('http://', 'https://')):
+            raise ValueError(f'Outbox webhook URL must be http(s): {url}')  # noqa: TRY003
+        self.url = url
+        self.timeout = timeout
+
+    def _post(self, body: bytes) -> None:
+        # The scheme is checked in __init__.
+        request = urllib.request.Request(self.url, data=body, headers={'Content-Type': 'application/json'}, method='POST')  # noqa: S310
+        with urllib.request.urlopen(request, timeout=self.timeout):  # noqa: S310
+            pass
+
+    async def send(self, messages: list[dict]) -> None:
+        await asyncio.to_thread(self._post, json.dumps({'events': messages}, ensure_ascii=False).encode())
+
+
+class OutboxDispatcher:
+    '''
+    Фоновая задача, которая разбирает outbox пачками.
+
+    Пачка берется в аренду короткой транзакцией (SKIP LOCKED, так что воркеры
+    uvicorn не мешают друг другу), отдается в sink вне транзакции и без
+    занятого соединения, а затем удаляется второй короткой транзакцией. Пока
+    пачки полные, следующая берется сразу, иначе диспетчер ждет `poll_interval`.
+    Пачка, которую sink не принял, откладывается с нарастающей задержкой.
+    '''
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        sink: OutboxSink,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        poll_interval: float = OUTBOX_POLL_INTERVAL,
+        lease_seconds: float = OUTBOX_LEASE_SECONDS,
+        enabled: bool = True,
+    ) -> None:
+        self.session_factory = session_factory
+        self.sink = sink
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.enabled = enabled
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self.enabled:
+            self._task = asyncio.create_task(self._run(), name='outbox-dispatcher')
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def dispatch_batch(self) -> int:
+        '''Отправляет одну пачку и возвращает число доставленных событий.'''
+        async with self.session_factory() as db:
+            outbox_repo = OutboxRepository(db)
+            events = await outbox_repo.claim(self.batch_size, self.lease_seconds)
+            # Commit the lease right away: the session gives its connection back to the pool until the batch is sent.
+            await db.commit()
+            if not events:
+                return 0
+
+            ids = [event.id for event in events]
+            try:
+                await self.sink.send([_message(event) for event in events])
+            except Exception as e:  # noqa: BLE001
+                logger.warning('Outbox sink rejected %d events: %s', len(events), e)
+                OUTBOX_DISPATCH_FAILURES.inc()
+                await outbox_repo.postpone(ids, error=repr(e))
+                await db.commit()
+                return 0
+
+            await outbox_repo.delete(ids)
+            await db.commit()
+
+        for event in events:
+            OUTBOX_EVENTS_DISPATCHED.labels(event.event_type).inc()
+        return len(events)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                dispatched = await self.dispatch_batch()
+            except Exception:
+                logger.exception('Outbox dispatch failed')
+                dispatched = 0
+            if dispatched < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+
+def outbox_sink(kind: OutboxSinkKind = OUTBOX_SINK) -> OutboxSink:
+    if kind == OutboxSinkKind.FILE:
+        return FileSink(OUTBOX_FILE_PATH)
+    if kind == OutboxSinkKind.WEBHOOK:
+        if not OUTBOX_WEBHOOK_URL:
+            raise ValueError('OUTBOX_WEBHOOK_URL is required for the webhook outbox sink')  # noqa: TRY003
+        return WebhookSink(OUTBOX_WEBHOOK_URL)
+    return LogSink()
+
+
+def outbox_dispatcher(session_factory: async_sessionmaker[AsyncSession]) -> OutboxDispatcher:
+    return OutboxDispatcher(session_factory, outbox_sink(), enabled=OUTBOX_DISPATCHER)
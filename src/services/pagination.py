@@ -0,0 +1,20 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from .exceptions import InvalidCursorError
+
+
+def encode_cursor(created_at: datetime, pr_id: str) -> str:
+    raw = json.dumps([created_at.isoformat(), pr_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, pr_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(pr_id)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise InvalidCursorError(cursor) from e
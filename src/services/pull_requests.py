@@ -1,16 +1,24 @@
+from collections.abc import Iterable
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.db.models import PullRequest, User
+from src.db.models import ArchivedPullRequest, PullRequest
+from src.db.repositories.outbox import OutboxRepository
 from src.db.repositories.pull_requests import PullRequestRepository
+from src.db.repositories.stats import ReviewStatsRepository
 from src.db.repositories.users import UserRepository
+from src.db.repositories.versions import ResourceVersionRepository
+from src.metrics import timed
 from type_defs import PRStatus
 
 from .exceptions import (
     AuthorCannotBeAReviewerError,
     CannotAssignMoreReviewersError,
+    ConcurrentModificationError,
+    NoReplacementCandidateError,
     PRAlreadyExistsError,
     PRDoesNotExistError,
     PRNotModifiableError,
@@ -19,48 +27,92 @@ from .exceptions import (
     UserDoesNotExistError,
     UserIsNotActiveError,
 )
+from .outbox import pull_request_created, pull_request_merged, pull_requests_reassigned
+from .retry import retry_on_conflict
+from .reviewer_selection import ReviewerSelector
 
 
 MAX_REVIEWERS_COUNT = 2
 
 
+@dataclass
+class BulkCreateResult:
+    created: list[PullRequest] = field(default_factory=list)
+    reviewers: dict[str, list[str]] = field(default_factory=dict)
+    failed: list[tuple[str, Exception]] = field(default_factory=list)
+
+
+@dataclass
+class ReassignResult:
+    pull_request: PullRequest
+    reviewer_ids: list[str]
+    replaced_by: str
+
+
+@timed
 class PullRequestService:
     def __init__(self, db: AsyncSession) -> None:
         self.db = db
         self.pull_request_repo = PullRequestRepository(db)
         self.user_repo = UserRepository(db)
+        self.stats_repo = ReviewStatsRepository(db)
+        self.version_repo = ResourceVersionRepository(db)
+        self.outbox_repo = OutboxRepository(db)
+        self.reviewer_selector = ReviewerSelector(db)
 
-    async def auto_assign_reviewers(self, pr_id: str) -> PullRequest:
-        pr = await self.pull_request_repo.get_where(
-            PullRequest.id == pr_id,
-            join_=[PullRequest.assigned_reviewers]
-        )
+    async def _apply_review_changes(
+        self,
+        assigned: Iterable[str] = (),
+        unassigned: Iterable[str] = (),
+        merged: Iterable[str] = (),
+    ) -> None:
+        '''Обновляет счетчики ревью и версии очередей ревью всех затронутых пользователей.'''
+        assigned, unassigned, merged = list(assigned), list(unassigned), list(merged)
+        await self.stats_repo.apply_review_changes(assigned=assigned, unassigned=unassigned, merged=merged)
+        await self.version_repo.bump(user_reviews=[*assigned, *unassigned, *merged])
+
+    async def _missing_pr_error(self, pr_id: str) -> Exception:
+        '''Ошибка для PR, которого нет среди горячих: PR из архива слиты и не изменяются.'''
+        if await self.pull_request_repo.is_archived(pr_id):
+            return PRNotModifiableError()
+        return PRDoesNotExistError(pr_id)
+
+    async def _claim_version(self, pr: PullRequest, **values: object) -> None:
+        '''Увеличивает версию прочитанного PR (и меняет `values`) или бросает ConcurrentModificationError.'''
+        if not await self.pull_request_repo.update_if_version(pr.id, pr.version, **values):
+            raise ConcurrentModificationError(pr.id)
+
+    async def _auto_assign(self, pr_id: str) -> tuple[PullRequest, set[str], set[str]]:
+        '''Назначает ревьюверов без коммита и возвращает PR, снятых и назначенных ревьюверов.'''
+        pr = await self.pull_request_repo.get_by(id=pr_id, join_=[PullRequest.assigned_reviewers])
         if not pr:
-            raise PRDoesNotExistError(pr_id)
+            raise await self._missing_pr_error(pr_id)
 
         if pr.status != PRStatus.OPEN:
             raise PRNotModifiableError
 
-        author = await self.user_repo.get_where(User.user_id == pr.author_id)
-        if not author:
-            raise UserDoesNotExistError(pr.author_id)
-
-        available_reviewers = await self.user_repo.list_where(
-            User.team_name == author.team_name,
-            User.is_active is True,
-            User.user_id != author.user_id
-        )
+        old_reviewer_ids = {reviewer.user_id for reviewer in pr.assigned_reviewers}
+        pr.assigned_reviewers = await self.reviewer_selector.select(pr.author_id, MAX_REVIEWERS_COUNT)
+        new_reviewer_ids = {reviewer.user_id for reviewer in pr.assigned_reviewers}
+        removed, added = old_reviewer_ids - new_reviewer_ids, new_reviewer_ids - old_reviewer_ids
+        await self._apply_review_changes(assigned=added, unassigned=removed)
+        return pr, removed, added
 
-        reviewers_to_assign = available_reviewers[:2]
-        pr.assigned_reviewers = reviewers_to_assign
+    @retry_on_conflict()
+    async def auto_assign_reviewers(self, pr_id: str) -> PullRequest:
+        pr, removed, added = await self._auto_assign(pr_id)
+        await self._claim_version(pr)
+        await self.outbox_repo.add(pull_requests_reassigned(
+            [(pr_id, user_id) for user_id in sorted(removed)],
+            [(pr_id, user_id) for user_id in sorted(added)],
+        ))
 
         await self.db.commit()
         return pr
 
     async def create_pr_with_auto_reviewers(self, **pr_data: dict) -> PullRequest:
         try:
-            pr = await self.pull_request_repo.create(**pr_data)
-            return await self.auto_assign_reviewers(pr.id)
+            created = await self.pull_request_repo.create_unless_archived(**pr_data)
         except IntegrityError as e:
             error_msg = str(e.orig).lower()
 
@@ -69,53 +121,105 @@ class PullRequestService:
 
             raise
 
-    async def replace_reviewer(
-        self,
-        pr_id: str,
-        old_reviewer_id: str,
-        new_reviewer_id: str
-    ) -> PullRequest:
-        pr = await self.pull_request_repo.get_where(
-            PullRequest.id == pr_id,
-            join_=[PullRequest.assigned_reviewers]
-        )
-        if not pr:
-            raise PRDoesNotExistError(pr_id)
+        if not created:
+            # The id belongs to an archived PR.
+            raise PRAlreadyExistsError(pr_data['id'])
 
-        if pr.status != PRStatus.OPEN:
-            raise PRNotModifiableError
+        pr, _, _ = await self._auto_assign(pr_data['id'])
 
-        old_reviewer = await self.user_repo.get_by_id(old_reviewer_id)
-        new_reviewer = await self.user_repo.get_by_id(new_reviewer_id)
+        await self.outbox_repo.add([pull_request_created(pr, [reviewer.user_id for reviewer in pr.assigned_reviewers])])
+        await self.db.commit()
+        return pr
 
-        if not old_reviewer:
-            raise UserDoesNotExistError(old_reviewer_id)
-        if not new_reviewer:
-            raise UserDoesNotExistError(new_reviewer_id)
+    async def bulk_create_prs_with_auto_reviewers(self, prs_data: list[dict]) -> BulkCreateResult:
+        '''
+        Создает пачку PR и назначает им ревьюверов в одной транзакции.
+
+        Ошибки отдельных PR (дубликат id, несуществующий автор) попадают в
+        `failed` и не прерывают создание остальных.
+        '''
+        result = BulkCreateResult()
+
+        seen_ids = set()
+        author_ids = await self.user_repo.existing_ids(list({pr_data['author_id'] for pr_data in prs_data}))
+        to_insert = []
+        for pr_data in prs_data:
+            if pr_data['id'] in seen_ids:
+                result.failed.append((pr_data['id'], PRAlreadyExistsError(pr_data['id'])))
+                continue
+            seen_ids.add(pr_data['id'])
+
+            if pr_data['author_id'] not in author_ids:
+                result.failed.append((pr_data['id'], UserDoesNotExistError(pr_data['author_id'])))
+                continue
+            to_insert.append(pr_data)
+
+        result.created = await self.pull_request_repo.create_many(to_insert)
+        created_ids = {pr.id for pr in result.created}
+        result.failed.extend(
+            (pr_data['id'], PRAlreadyExistsError(pr_data['id']))
+            for pr_data in to_insert
+            if pr_data['id'] not in created_ids
+        )
 
-        if not old_reviewer.is_active:
-            raise UserIsNotActiveError(old_reviewer_id)
-        if not new_reviewer.is_active:
-            raise UserIsNotActiveError(new_reviewer_id)
+        result.reviewers = {pr.id: [] for pr in result.created}
+        assigned = await self.pull_request_repo.fill_reviewer_slots(
+            pr_ids=[pr.id for pr in result.created],
+            slots=[MAX_REVIEWERS_COUNT] * len(result.created),
+            ordering=self.reviewer_selector.ordering,
+        )
+        for pr_id, user_id in assigned:
+            result.reviewers[pr_id].append(user_id)
+        await self._apply_review_changes(assigned=[user_id for _, user_id in assigned])
+        await self.outbox_repo.add(pull_request_created(pr, result.reviewers[pr.id]) for pr in result.created)
 
-        if old_reviewer not in pr.reviewers:
-            raise ReviewerNotAssignedError(old_reviewer_id, pr_id)
+        await self.db.commit()
+        return result
+
+    @retry_on_conflict()
+    async def replace_reviewer(self, pr_id: str, old_reviewer_id: str) -> ReassignResult:
+        '''
+        Заменяет ревьювера на автоматически выбранного участника его команды.
+
+        PR читается без блокировки, а перед заменой его версия увеличивается
+        с проверкой на прочитанную: из параллельных изменений одного PR
+        проходит одно, остальные повторяются на свежих данных и не назначают
+        одного кандидата дважды. Замена выбирается и записывается одним UPDATE.
+        '''
+        pr = await self.pull_request_repo.get_by(id=pr_id, join_=[PullRequest.assigned_reviewers])
+        if not pr:
+            raise await self._missing_pr_error(pr_id)
 
-        if new_reviewer_id == pr.author_id:
-            raise AuthorCannotBeAReviewerError
+        if pr.status != PRStatus.OPEN:
+            raise PRNotModifiableError
 
-        if pr.author.team_name != new_reviewer.team_name:
-            raise ReviewerFromWrongTeamError
+        reviewer_ids = [reviewer.user_id for reviewer in pr.assigned_reviewers]
+        if old_reviewer_id not in reviewer_ids:
+            if not await self.user_repo.existing_ids([old_reviewer_id]):
+                raise UserDoesNotExistError(old_reviewer_id)
+            raise ReviewerNotAssignedError(old_reviewer_id, pr_id)
 
-        pr.reviewers = [
-            new_reviewer if reviewer.id == old_reviewer_id else reviewer
-            for reviewer in pr.reviewers
-        ]
+        await self._claim_version(pr)
+        new_reviewer_id = await self.pull_request_repo.swap_reviewer(
+            pr_id=pr_id,
+            author_id=pr.author_id,
+            old_reviewer_id=old_reviewer_id,
+            ordering=self.reviewer_selector.ordering,
+        )
+        if new_reviewer_id is None:
+            await self.db.rollback()
+            raise NoReplacementCandidateError(old_reviewer_id, pr_id)
 
+        await self._apply_review_changes(assigned=[new_reviewer_id], unassigned=[old_reviewer_id])
+        await self.outbox_repo.add(pull_requests_reassigned([(pr_id, old_reviewer_id)], [(pr_id, new_reviewer_id)]))
         await self.db.commit()
-        await self.db.refresh(pr)
-        return pr
+        return ReassignResult(
+            pull_request=pr,
+            reviewer_ids=[new_reviewer_id if user_id == old_reviewer_id else user_id for user_id in reviewer_ids],
+            replaced_by=new_reviewer_id,
+        )
 
+    @retry_on_conflict()
     async def set_reviewers(
         self,
         pr_id: str,
@@ -124,21 +228,18 @@ class PullRequestService:
         if len(reviewer_ids) > MAX_REVIEWERS_COUNT:
             raise CannotAssignMoreReviewersError(MAX_REVIEWERS_COUNT)
 
-        pr = await self.pull_request_repo.get_where(
-            PullRequest.id == pr_id,
-            join_=[PullRequest.author]
-        )
+        pr = await self.pull_request_repo.get_by(id=pr_id, join_=[PullRequest.assigned_reviewers])
         if not pr:
-            raise PRDoesNotExistError(pr_id)
+            raise await self._missing_pr_error(pr_id)
 
         if pr.status != PRStatus.OPEN:
             raise PRNotModifiableError
 
-        reviewers = await self.user_repo.get_by_ids(reviewer_ids)
-        reviewer_dict = {reviewer.id: reviewer for reviewer in reviewers}
+        reviewers = await self.user_repo.list_in('user_id', reviewer_ids)
+        reviewer_dict = {reviewer.user_id: reviewer for reviewer in reviewers}
 
         valid_reviewers = []
-        for reviewer_id in reviewer_ids:
+        for reviewer_id in dict.fromkeys(reviewer_ids):
             reviewer = reviewer_dict.get(reviewer_id)
             if not reviewer:
                 raise UserDoesNotExistError(reviewer_id)
@@ -148,31 +249,59 @@ class PullRequestService:
                 raise AuthorCannotBeAReviewerError
             valid_reviewers.append(reviewer)
 
-        author = await self.user_repo.get_by_id(pr.author_id)
+        author = await self.user_repo.get_by(user_id=pr.author_id)
         for reviewer in valid_reviewers:
             if reviewer.team_name != author.team_name:
-                ReviewerFromWrongTeamError(reviewer_id)
-
-        pr.reviewers = valid_reviewers
+                raise ReviewerFromWrongTeamError(reviewer.user_id)
+
+        await self._claim_version(pr)
+        old_reviewer_ids = {reviewer.user_id for reviewer in pr.assigned_reviewers}
+        new_reviewer_ids = {reviewer.user_id for reviewer in valid_reviewers}
+        pr.assigned_reviewers = valid_reviewers
+        removed, added = old_reviewer_ids - new_reviewer_ids, new_reviewer_ids - old_reviewer_ids
+        await self._apply_review_changes(assigned=added, unassigned=removed)
+        await self.outbox_repo.add(pull_requests_reassigned(
+            [(pr_id, user_id) for user_id in sorted(removed)],
+            [(pr_id, user_id) for user_id in sorted(added)],
+        ))
 
         await self.db.commit()
-        await self.db.refresh(pr)
         return pr
 
-    async def merge_pr(self, pr_id: str) -> PullRequest:
-        pr = await self.pull_request_repo.get_where(
-            PullRequest.id == pr_id,
-            join_=[PullRequest.assigned_reviewers]
-        )
+    @retry_on_conflict()
+    async def merge_pr(self, pr_id: str) -> PullRequest | ArchivedPullRequest:
+        pr = await self.pull_request_repo.get_by(id=pr_id, join_=[PullRequest.assigned_reviewers])
         if not pr:
-            raise PRDoesNotExistError(pr_id)
+            # Merging is idempotent, and archived PRs are always merged.
+            archived = await self.pull_request_repo.get_archived(pr_id)
+            if not archived:
+                raise PRDoesNotExistError(pr_id)
+            return archived
 
         if pr.status == PRStatus.MERGED:
             return pr
 
-        pr.status = PRStatus.MERGED
-        pr.merged_at = datetime.now(timezone.utc)
+        await self._claim_version(pr, status=PRStatus.MERGED, merged_at=datetime.now(timezone.utc))
+        await self._apply_review_changes(merged=[reviewer.user_id for reviewer in pr.assigned_reviewers])
+        await self.outbox_repo.add([pull_request_merged(pr)])
 
         await self.db.commit()
         await self.db.refresh(pr)
         return pr
+
+    async def archive_merged(self, merged_before: datetime, batch_size: int) -> int:
+        '''
+        Переносит PR, слитые раньше `merged_before`, в архив пачками по `batch_size`.
+
+        Каждая пачка - отдельная транзакция, поэтому блокировки держатся
+        недолго, а прерванный перенос можно просто запустить снова. Счетчики
+        ревью и версии очередей не меняются: содержимое getReview то же.
+        Возвращает число перенесенных PR.
+        '''
+        archived = 0
+        while True:
+            moved = await self.pull_request_repo.archive_merged(merged_before, batch_size)
+            await self.db.commit()
+            archived += moved
+            if moved < batch_size:
+                return archived
@@ -0,0 +1,62 @@
+'''
+Повтор изменений PR, проигравших проверку версии.
+
+Изменение PR читает строку без блокировки и применяется UPDATE с условием на
+прочитанную версию. Если параллельный запрос успел изменить PR, сервис бросает
+`ConcurrentModificationError`; декоратор откатывает транзакцию и выполняет
+метод заново на свежих данных, с паузой, которая растет с каждой попыткой и
+выбирается случайно, чтобы столкнувшиеся запросы не повторили друг друга.
+'''
+import asyncio
+import functools
+import random
+from typing import TypeVar
+from collections.abc import Awaitable, Callable
+
+from src.config import CONFLICT_RETRY_ATTEMPTS, CONFLICT_RETRY_BASE_DELAY
+from src.db.query_stats import current_query_stats
+from src.metrics import PR_CONFLICT_RETRIES, PR_VERSION_CONFLICTS
+
+from .exceptions import ConcurrentModificationError
+
+
+F = TypeVar('F', bound=Callable[..., Awaitable])
+
+
+def retry_on_conflict(
+    attempts: int = CONFLICT_RETRY_ATTEMPTS,
+    base_delay: float = CONFLICT_RETRY_BASE_DELAY,
+) -> Callable[[F], F]:
+    '''
+    Декоратор метода сервиса с сессией `self.db`: повторяет вызов при конфликте версий.
+
+    Метод должен сам читать все, что меняет, и коммитить в конце: повтор
+    начинается с пустой транзакции. После `attempts` попыток ошибка уходит
+    вызывающему.
+    '''
+    def decorator(fn: F) -> F:
+        conflicts = PR_VERSION_CONFLICTS.labels(fn.__name__)
+        retries = PR_CONFLICT_RETRIES.labels(fn.__name__)
+
+        @functools.wraps(fn)
+        async def wrapper(self: object, *args: object, **kwargs: object) -> object:
+            for attempt in range(1, attempts + 1):
+                try:
+                    return await fn(self, *args, **kwargs)
+                except ConcurrentModificationError:
+                    conflicts.inc()
+                    await self.db.rollback()
+                    if attempt == attempts:
+                        raise
+
+                retries.inc()
+                stats = current_query_stats()
+                if stats is not None:
+                    stats.attempts += 1
+                # Full jitter: a random pause up to the exponential backoff for this attempt.
+                await asyncio.sleep(random.uniform(0, base_delay * 2 ** (attempt - 1)))  # noqa: S311
+            return None
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,78 @@
+from collections.abc import Sequence
+
+from sqlalchemy import ColumnElement, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import REVIEWER_SELECTION_STRATEGY
+from src.db.models import User
+from src.db.repositories.users import ReviewerOrdering, ReviewLoad, UserRepository
+from src.type_defs import ReviewerSelectionStrategy
+
+from .exceptions import UnknownReviewerSelectionStrategyError
+from .roster_cache import TeamRoster, TeamRosterCache, roster_cache
+
+
+def least_loaded(load: ReviewLoad) -> list[ColumnElement]:
+    return [load.open_reviews.asc(), load.last_assigned_at.asc().nulls_first(), load.user_id.asc()]
+
+
+def weighted_random(load: ReviewLoad) -> list[ColumnElement]:
+    # Efraimidis-Spirakis weighted sampling: key = -ln(U) / w, where w = 1 / (open_reviews + 1)
+    return [(-func.ln(1 - func.random()) * (load.open_reviews + 1)).asc()]
+
+
+def round_robin(load: ReviewLoad) -> list[ColumnElement]:
+    return [load.last_assigned_at.asc().nulls_first(), load.user_id.asc()]
+
+
+STRATEGIES: dict[str, ReviewerOrdering] = {
+    ReviewerSelectionStrategy.LEAST_LOADED: least_loaded,
+    ReviewerSelectionStrategy.WEIGHTED_RANDOM: weighted_random,
+    ReviewerSelectionStrategy.ROUND_ROBIN: round_robin,
+}
+
+
+def get_strategy(name: str) -> ReviewerOrdering:
+    try:
+        return STRATEGIES[name]
+    except KeyError as e:
+        raise UnknownReviewerSelectionStrategyError(name) from e
+
+
+class ReviewerSelector:
+    def __init__(
+        self,
+        db: AsyncSession,
+        strategy: str = REVIEWER_SELECTION_STRATEGY,
+        rosters: TeamRosterCache = roster_cache,
+    ) -> None:
+        self.ordering = get_strategy(strategy)
+        self.user_repo = UserRepository(db)
+        self.rosters = rosters
+
+    async def roster_of(self, user_id: str) -> TeamRoster | None:
+        '''Состав команды пользователя: из кэша или одним запросом по индексу команды.'''
+        team_name = self.rosters.team_of(user_id)
+        if team_name is not None:
+            roster = self.rosters.get(team_name)
+            if roster is not None:
+                return roster
+
+        generation = self.rosters.generation
+        rows = await self.user_repo.team_roster(UserRepository.team_of(user_id))
+        if not rows:
+            return None
+        return self.rosters.put(rows[0][0], [(user_id, is_active) for _, user_id, is_active in rows], generation)
+
+    async def select(self, author_id: str, count: int, exclude_ids: Sequence[str] = ()) -> list[User]:
+        roster = await self.roster_of(author_id)
+        if roster is None:
+            return []
+
+        excluded = {author_id, *exclude_ids}
+        # is_active is still checked in SQL, so a roster that is a few moments stale cannot pick a deactivated user.
+        return await self.user_repo.pick_review_candidates_among(
+            user_ids=[user_id for user_id in roster.active_ids if user_id not in excluded],
+            ordering=self.ordering,
+            limit=count,
+        )
@@ -0,0 +1,137 @@
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import ROSTER_CACHE_MAXSIZE, ROSTER_CACHE_TTL, ROSTER_INVALIDATION_CHANNEL
+from src.db.notifications import NotificationListener, notify
+
+
+@dataclass(frozen=True)
+class TeamRoster:
+    team_name: str
+    member_ids: tuple[str, ...]
+    active_ids: tuple[str, ...]
+    expires_at: float
+
+
+class TeamRosterCache:
+    '''
+    LRU-кэш составов команд с TTL на процесс.
+
+    Хранит всех участников команды и отдельно активных, плюс индекс
+    user_id -> команда, чтобы найти команду автора PR без запроса в базу.
+    Пока кэш выключен (`enabled = False`), `get` всегда промахивается: так он
+    ведет себя, пока не подписан на межпроцессные инвалидации.
+    '''
+
+    def __init__(self, maxsize: int, ttl: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.enabled = False
+        self.generation = 0
+        self._rosters: OrderedDict[str, TeamRoster] = OrderedDict()
+        self._teams_by_user: dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._rosters)
+
+    def get(self, team_name: str) -> TeamRoster | None:
+        if not self.enabled:
+            return None
+
+        roster = self._rosters.get(team_name)
+        if roster is None:
+            return None
+        if roster.expires_at <= self.clock():
+            self._evict(team_name)
+            return None
+
+        self._rosters.move_to_end(team_name)
+        return roster
+
+    def team_of(self, user_id: str) -> str | None:
+        team_name = self._teams_by_user.get(user_id)
+        if team_name is None or self.get(team_name) is None:
+            return None
+        return team_name
+
+    def put(self, team_name: str, members: Iterable[tuple[str, bool]], generation: int) -> TeamRoster:
+        '''
+        Кладет состав команды, прочитанный из базы.
+
+        `generation` - значение `self.generation` до начала чтения: если за это
+        время пришла инвалидация, прочитанный состав мог устареть и не кэшируется.
+        '''
+        members = list(members)
+        roster = TeamRoster(
+            team_name=team_name,
+            member_ids=tuple(user_id for user_id, _ in members),
+            active_ids=tuple(user_id for user_id, is_active in members if is_active),
+            expires_at=self.clock() + self.ttl,
+        )
+        if not self.enabled or generation != self.generation:
+            return roster
+
+        self._evict(team_name)
+        self._rosters[team_name] = roster
+        for user_id in roster.member_ids:
+            self._teams_by_user[user_id] = team_name
+        while len(self._rosters) > self.maxsize:
+            self._evict(next(iter(self._rosters)))
+        return roster
+
+    def invalidate(self, team_names: Iterable[str]) -> None:
+        self.generation += 1
+        for team_name in team_names:
+            self._evict(team_name)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._rosters.clear()
+        self._teams_by_user.clear()
+
+    def _evict(self, team_name: str) -> None:
+        roster = self._rosters.pop(team_name, None)
+        if roster is None:
+            return
+        for user_id in roster.member_ids:
+            if self._teams_by_user.get(user_id) == team_name:
+                del self._teams_by_user[user_id]
+
+
+roster_cache = TeamRosterCache(maxsize=ROSTER_CACHE_MAXSIZE, ttl=ROSTER_CACHE_TTL)
+
+
+async def publish_roster_changes(db: AsyncSession, team_names: Iterable[str]) -> None:
+    '''Уведомляет все воркеры об изменении составов команд после COMMIT текущей транзакции.'''
+    await notify(db, ROSTER_INVALIDATION_CHANNEL, sorted(set(team_names)))
+
+
+def _enable() -> None:
+    roster_cache.clear()
+    roster_cache.enabled = True
+
+
+def _disable() -> None:
+    roster_cache.enabled = False
+    roster_cache.clear()
+
+
+def roster_invalidation_listener(database_url: str) -> NotificationListener:
+    '''
+    Слушатель инвалидаций для `roster_cache`.
+
+    Кэш включается, только когда LISTEN активен, и выключается при обрыве
+    соединения: пропущенные уведомления иначе оставили бы в нем устаревшие составы.
+    '''
+    return NotificationListener(
+        database_url,
+        channel=ROSTER_INVALIDATION_CHANNEL,
+        on_notify=lambda team_name: roster_cache.invalidate([team_name]),
+        on_connect=_enable,
+        on_disconnect=_disable,
+    )
@@ -0,0 +1,39 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.repositories.stats import ReviewStatsRepository
+from src.schemas.stats import ReviewStatsSchema, TeamReviewStatsSchema, UserReviewStatsSchema
+
+from .exceptions import TeamDoesNotExistError, UserDoesNotExistError
+
+
+class StatsService:
+    def __init__(self, db: AsyncSession) -> None:
+        self.db = db
+        self.stats_repo = ReviewStatsRepository(db)
+
+    async def get_user_stats(self, user_id: str) -> UserReviewStatsSchema:
+        row = await self.stats_repo.get_user_stats(user_id)
+        if row is None:
+            raise UserDoesNotExistError(user_id)
+
+        _, assigned, opened, merged = row
+        return UserReviewStatsSchema(
+            user_id=user_id,
+            reviews=ReviewStatsSchema(assigned=assigned, open=opened, merged=merged)
+        )
+
+    async def get_team_stats(self, team_name: str) -> TeamReviewStatsSchema:
+        row = await self.stats_repo.get_team_stats(team_name)
+        if row is None:
+            raise TeamDoesNotExistError(team_name)
+
+        _, assigned, opened, merged = row
+        return TeamReviewStatsSchema(
+            team_name=team_name,
+            reviews=ReviewStatsSchema(assigned=assigned, open=opened, merged=merged)
+        )
+
+    async def rebuild(self) -> None:
+        '''Пересчитывает счетчики ревью по текущим назначениям.'''
+        await self.stats_repo.rebuild()
+        await self.db.commit()
@@ -3,24 +3,40 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import attributes
 
 from src.db.models import Team
+from src.db.repositories.json_reads import JsonReadRepository
+from src.db.repositories.stats import ReviewStatsRepository
 from src.db.repositories.teams import TeamRepository
 from src.db.repositories.users import UserRepository
+from src.db.repositories.versions import ResourceVersionRepository
+from src.metrics import timed
 from src.schemas.teams import TeamSchema
+from src.type_defs import ResourceKind
 
 from .exceptions import TeamAlreadyExistsError
+from .roster_cache import publish_roster_changes, roster_cache
 
 
+@timed
 class TeamService:
     def __init__(self, db: AsyncSession) -> None:
         self.db = db
         self.user_repo = UserRepository(db)
         self.team_repo = TeamRepository(db)
+        self.stats_repo = ReviewStatsRepository(db)
+        self.json_repo = JsonReadRepository(db)
+        self.version_repo = ResourceVersionRepository(db)
 
     async def get_team_with_members(self, team_name: str) -> Team | None:
-        return await self.team_repo.get_where(
-            Team.name == team_name,
-            join_=[Team.members]
-        )
+        return await self.team_repo.get_by(name=team_name, join_=[Team.members])
+
+    async def get_team_version(self, team_name: str) -> int:
+        '''Версия команды для ETag; 0 - команды нет.'''
+        return await self.version_repo.get_version(ResourceKind.TEAM, team_name)
+
+    async def get_team_json(self, team_name: str) -> bytes | None:
+        '''Тело ответа /teams/get, собранное Postgres, или None, если команды нет.'''
+        team = await self.json_repo.team(team_name)
+        return team.encode() if team is not None else None
 
     async def create_team_with_members(self, request: TeamSchema) -> Team:
         '''
@@ -38,8 +54,20 @@ class TeamService:
                 raise TeamAlreadyExistsError(request.name) from e
             raise
         else:
-            upsert_data = [{**member.model_dump(), 'team_name': request.name} for member in request.members]
+            # A repeated user_id would hit the same row twice in one upsert; the last entry wins.
+            members = {member.user_id: member for member in request.members}
+            upsert_data = [{**member.model_dump(), 'team_name': request.name} for member in members.values()]
+            previous_teams = await self.user_repo.teams_of(list(members))
             users = await self.user_repo.upsert(upsert_data)
+            await self.stats_repo.move_users_between_teams([
+                (user_id, team_name, request.name)
+                for user_id, team_name in previous_teams.items()
+            ])
             attributes.set_committed_value(team, 'members', users)
+
+            changed_teams = {request.name, *previous_teams.values()}
+            await self.version_repo.bump(teams=changed_teams)
+            await publish_roster_changes(self.db, changed_teams)
             await self.db.commit()
+            roster_cache.invalidate(changed_teams)
             return team
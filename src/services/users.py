@@ -1,10 +1,46 @@
+import json
+from collections import Counter
+from collections.abc import AsyncIterator, Sequence
+from dataclasses import dataclass
+
+from sqlalchemy import Row
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.db.models import PullRequest, User
+from src.db.models import User
+from src.db.repositories.json_reads import JsonReadRepository
+from src.db.repositories.outbox import OutboxRepository
 from src.db.repositories.pull_requests import PullRequestRepository
+from src.db.repositories.stats import ReviewStatsRepository
 from src.db.repositories.teams import TeamRepository
 from src.db.repositories.users import UserRepository
+from src.db.repositories.versions import ResourceVersionRepository
 from src.schemas.users import UserSetActiveRequestSchema
+from src.type_defs import ResourceKind
+
+from .exceptions import TeamDoesNotExistError
+from .outbox import pull_requests_reassigned
+from .pagination import decode_cursor, encode_cursor
+from .reviewer_selection import ReviewerSelector
+from .roster_cache import publish_roster_changes, roster_cache
+
+
+@dataclass
+class DeactivationResult:
+    users: list[User]
+    released: list[tuple[str, str]]
+    reassigned: list[tuple[str, str]]
+
+
+@dataclass
+class BulkSetActiveResult:
+    users: list[User]
+    unknown_user_ids: list[str]
+
+
+@dataclass
+class ReviewPage:
+    pull_requests: Sequence[Row]
+    next_cursor: str | None
 
 
 class UserService:
@@ -13,11 +49,101 @@ class UserService:
         self.user_repo = UserRepository(db)
         self.team_repo = TeamRepository(db)
         self.pull_request_repo = PullRequestRepository(db)
+        self.stats_repo = ReviewStatsRepository(db)
+        self.json_repo = JsonReadRepository(db)
+        self.version_repo = ResourceVersionRepository(db)
+        self.outbox_repo = OutboxRepository(db)
+        self.reviewer_selector = ReviewerSelector(db)
 
     async def set_is_active(self, schema: UserSetActiveRequestSchema) -> User | None:
-        result = await self.user_repo.update_one(User.user_id == schema.user_id, is_active=schema.is_active)
+        result = await self.user_repo.update_one_by({'user_id': schema.user_id}, is_active=schema.is_active)
+        if result is None:
+            return None
+
+        await self.version_repo.bump(teams=[result.team_name])
+        await publish_roster_changes(self.db, [result.team_name])
         await self.db.commit()
+        roster_cache.invalidate([result.team_name])
         return result
 
-    async def get_user_pull_requests_to_review(self, user_id: str) -> list[PullRequest]:
-        return await self.pull_request_repo.list_where(PullRequest.author_id == user_id)
+    async def set_is_active_many(self, schemas: Sequence[UserSetActiveRequestSchema]) -> BulkSetActiveResult:
+        '''
+        Применяет пачку флагов активности одним UPDATE в одной транзакции.
+
+        Если id повторяется, действует последнее значение. Незнакомые id не
+        прерывают пачку, а возвращаются в `unknown_user_ids` в порядке запроса.
+        '''
+        changes = {schema.user_id: schema.is_active for schema in schemas}
+        users = await self.user_repo.set_is_active_many(sorted(changes.items()))
+
+        changed_teams = {user.team_name for user in users}
+        await self.version_repo.bump(teams=changed_teams)
+        await publish_roster_changes(self.db, changed_teams)
+        await self.db.commit()
+        roster_cache.invalidate(changed_teams)
+
+        updated_ids = {user.user_id for user in users}
+        return BulkSetActiveResult(
+            users=users,
+            unknown_user_ids=[user_id for user_id in changes if user_id not in updated_ids],
+        )
+
+    async def deactivate_users(self, user_ids: list[str], team_name: str | None = None) -> DeactivationResult:
+        '''
+        Деактивирует пользователей (и/или всю команду) и переназначает их открытые ревью.
+
+        Все делается в одной транзакции тремя set-based запросами: UPDATE users,
+        DELETE освободившихся мест в pr_reviewers и INSERT ... SELECT замен
+        из активных участников команды автора PR.
+        '''
+        if team_name is not None and await self.team_repo.get_by(name=team_name) is None:
+            raise TeamDoesNotExistError(team_name)
+
+        users = await self.user_repo.deactivate(user_ids, team_name)
+        released = await self.pull_request_repo.release_open_reviews([user.user_id for user in users])
+
+        slots = Counter(pr_id for pr_id, _ in released)
+        reassigned = await self.pull_request_repo.fill_reviewer_slots(
+            pr_ids=list(slots),
+            slots=list(slots.values()),
+            ordering=self.reviewer_selector.ordering,
+        )
+        await self.stats_repo.apply_review_changes(
+            assigned=[user_id for _, user_id in reassigned],
+            unassigned=[user_id for _, user_id in released],
+        )
+
+        changed_teams = {user.team_name for user in users}
+        await self.version_repo.bump(
+            teams=changed_teams,
+            user_reviews=[user_id for _, user_id in released + reassigned],
+        )
+        await self.outbox_repo.add(pull_requests_reassigned(released, reassigned))
+        await publish_roster_changes(self.db, changed_teams)
+        await self.db.commit()
+        roster_cache.invalidate(changed_teams)
+        return DeactivationResult(users=users, released=released, reassigned=reassigned)
+
+    async def get_reviews_version(self, user_id: str) -> int:
+        return await self.version_repo.get_version(ResourceKind.USER_REVIEWS, user_id)
+
+    async def get_user_pull_requests_to_review(self, user_id: str, limit: int, cursor: str | None = None) -> ReviewPage:
+        after = decode_cursor(cursor) if cursor is not None else None
+        rows = await self.pull_request_repo.list_reviews_page(user_id, limit + 1, after)
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+        return ReviewPage(pull_requests=rows, next_cursor=next_cursor)
+
+    async def get_user_pull_requests_to_review_json(self, user_id: str, limit: int, cursor: str | None = None) -> bytes:
+        '''Тело ответа /users/getReview: массив PR собирает Postgres, здесь к нему дописываются user_id и курсор.'''
+        after = decode_cursor(cursor) if cursor is not None else None
+        page = await self.json_repo.reviews_page(user_id, limit, after)
+
+        next_cursor = encode_cursor(*page.last_key) if page.last_key is not None else None
+        return f'{{"user_id":{json.dumps(user_id)},"pull_requests":{page.pull_requests},"next_cursor":{json.dumps(next_cursor)}}}'.encode()
+
+    def stream_user_pull_requests_to_review(self, user_id: str) -> AsyncIterator[Row]:
+        return self.pull_request_repo.stream_reviews(user_id)
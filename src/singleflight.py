@@ -0,0 +1,75 @@
+'''
+Объединение одинаковых конкурентных чтений (single-flight).
+
+Пока по ключу выполняется вызов, остальные запросы с тем же ключом не идут
+в базу, а ждут его результат. Ничего не кешируется: как только вызов
+завершился, следующий запрос выполняется заново, так что присоединившийся
+запрос видит данные не старше начала уже идущего чтения. Группа живет в
+процессе, поэтому воркеры uvicorn объединяют запросы каждый у себя.
+'''
+import asyncio
+from typing import Generic, TypeVar
+from collections.abc import Awaitable, Callable, Hashable
+
+from src.metrics import SINGLE_FLIGHT_CALLS, SINGLE_FLIGHT_IN_FLIGHT
+
+
+T = TypeVar('T')
+
+
+def _consume_exception(future: asyncio.Future) -> None:
+    # Nobody may be waiting for the shared result; the leader has already raised the error.
+    if not future.cancelled():
+        future.exception()
+
+
+class SingleFlight(Generic[T]):
+    '''
+    Группа вызовов с общим результатом для одинаковых ключей.
+
+    Первый запрос по ключу (ведущий) выполняет `fn`, остальные получают его
+    результат или исключение. Если ведущего отменили (клиент ушел), ожидающие
+    не падают, а выполняют вызов сами.
+    '''
+
+    def __init__(self, name: str, enabled: bool = True) -> None:
+        self.name = name
+        self.enabled = enabled
+        self._calls: dict[Hashable, asyncio.Future[T]] = {}
+        self._executed = SINGLE_FLIGHT_CALLS.labels(name, 'executed')
+        self._coalesced = SINGLE_FLIGHT_CALLS.labels(name, 'coalesced')
+        self._in_flight = SINGLE_FLIGHT_IN_FLIGHT.labels(name)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]], share: bool = True) -> T:
+        '''Выполняет `fn` или ждет уже идущий вызов по `key`; с `share=False` всегда выполняет сам и не ждет других.'''
+        if not self.enabled or not share:
+            return await fn()
+
+        while (call := self._calls.get(key)) is not None:
+            self._coalesced.inc()
+            try:
+                return await asyncio.shield(call)
+            except asyncio.CancelledError:
+                if not call.cancelled():
+                    raise
+            # The leader was cancelled; whoever gets here first leads the retry.
+
+        call = asyncio.get_running_loop().create_future()
+        call.add_done_callback(_consume_exception)
+        self._calls[key] = call
+        self._executed.inc()
+        self._in_flight.inc()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            call.cancel()
+            raise
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+            self._in_flight.dec()
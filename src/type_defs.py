@@ -10,8 +10,52 @@ class ErrorCode(str, Enum):
     NOT_ASSIGNED = 'NOT_ASSIGNED'
     NO_CANDIDATE = 'NO_CANDIDATE'
     NOT_FOUND = 'NOT_FOUND'
+    INVALID_CURSOR = 'INVALID_CURSOR'
+    QUERY_BUDGET_EXCEEDED = 'QUERY_BUDGET_EXCEEDED'
+    CONCURRENT_MODIFICATION = 'CONCURRENT_MODIFICATION'
 
 
 class PRStatus(str, Enum):
     OPEN = 'OPEN'
     MERGED = 'MERGED'
+
+
+class ReviewerSelectionStrategy(str, Enum):
+    LEAST_LOADED = 'least_loaded'
+    WEIGHTED_RANDOM = 'weighted_random'
+    ROUND_ROBIN = 'round_robin'
+
+
+class QueryBudgetMode(str, Enum):
+    OFF = 'off'
+    WARN = 'warn'
+    ENFORCE = 'enforce'
+
+
+class ResourceKind(str, Enum):
+    TEAM = 'team'
+    USER_REVIEWS = 'user_reviews'
+
+
+class OutboxEventType(str, Enum):
+    PR_CREATED = 'pull_request.created'
+    PR_REASSIGNED = 'pull_request.reassigned'
+    PR_MERGED = 'pull_request.merged'
+
+
+class OutboxSinkKind(str, Enum):
+    LOG = 'log'
+    FILE = 'file'
+    WEBHOOK = 'webhook'
+
+
+class ExportDataset(str, Enum):
+    TEAMS = 'teams'
+    USERS = 'users'
+    PULL_REQUESTS = 'pull_requests'
+    PR_REVIEWERS = 'pr_reviewers'
+
+
+class ExportFormat(str, Enum):
+    NDJSON = 'ndjson'
+    CSV = 'csv'